@@ -1,48 +1,283 @@
 from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from concurrent.futures import ThreadPoolExecutor
+import hmac
 import json
+import threading
+import time
 from llm_router import LLMRouter
 from config import Config
+from utils.cancellation import CancelToken, DisconnectWatcher, get_client_socket
+from utils.metrics import diff_records
+from utils.profiler import SamplingProfiler
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 router = LLMRouter()
+# Open live stats streams in this process (each holds a worker thread)
+stats_stream_slots = threading.BoundedSemaphore(Config.STATS_STREAM_MAX_SUBSCRIBERS)
 
 @app.route('/')
 def index():
     """Serve the main application page"""
     return render_template('index.html')
 
+def request_tenant():
+    """
+    Identify the caller for fair sharing, budgets and usage
+    
+    Only trusted sources count: an X-API-Key listed in TENANT_API_KEYS,
+    the TENANT_HEADER set by a gateway, or else the client address. A
+    tenant named by the client itself would let it spend another tenant's
+    budget, or dodge fair sharing by rotating names.
+    
+    Returns:
+        Tenant name, or None if TENANT_API_KEYS is set and the request has
+        no listed key
+    """
+    if Config.TENANT_API_KEYS:
+        api_key = request.headers.get('X-API-Key', '').encode('utf-8')
+        tenant = None
+        # Compare against every key so the time taken does not reveal a match
+        for key, name in Config.TENANT_API_KEYS.items():
+            if hmac.compare_digest(api_key, key.encode('utf-8')):
+                tenant = name
+        return tenant
+    if Config.TENANT_HEADER and request.headers.get(Config.TENANT_HEADER):
+        return request.headers[Config.TENANT_HEADER]
+    return request.remote_addr or 'default'
+
+def has_debug_token():
+    """Whether the request carries the operator's DEBUG_PROFILE_TOKEN in X-Debug-Token"""
+    token = request.headers.get('X-Debug-Token', '')
+    return bool(Config.DEBUG_PROFILE_TOKEN) and hmac.compare_digest(
+        token.encode('utf-8'), Config.DEBUG_PROFILE_TOKEN.encode('utf-8')
+    )
+
+def query_options(data, tenant):
+    """
+    Validate a query request body
+    
+    Args:
+        data: Request body
+        tenant: Caller identity from request_tenant()
+    
+    Returns:
+        Tuple of (query_with_fallback keyword arguments, error message)
+    """
+    max_tokens = data.get('max_tokens')
+    cascade = data.get('cascade')
+    if not data.get('query'):
+        return None, 'Query is required'
+    if max_tokens is not None and (not isinstance(max_tokens, int) or max_tokens <= 0):
+        return None, 'max_tokens must be a positive integer'
+    if cascade is not None and cascade is not False and not isinstance(cascade, str):
+        return None, 'cascade must be a cascade name or false'
+    
+    return {
+        'query': data['query'],
+        'user_preference': data.get('provider', None),
+        'session_id': data.get('session_id', None),
+        'system': data.get('system', None),
+        'priority': data.get('priority') or request.headers.get('X-Priority'),
+        'tenant': tenant,
+        'max_tokens': max_tokens,
+        'cascade': cascade
+    }, None
+
+def wants_json(data):
+    """Non-streaming mode: "stream": false, or a client that only accepts JSON"""
+    if 'stream' in data:
+        return data['stream'] is False
+    accept = request.accept_mimetypes
+    return accept.best == 'application/json' and not accept['text/event-stream']
+
 @app.route('/api/query', methods=['POST'])
 def query():
-    """Handle query requests with streaming response"""
+    """
+    Handle query requests with a streaming (SSE) or single JSON response
+    
+    With "compare": [targets] the query goes to every target at once
+    instead of being routed (see LLMRouter.compare); "save": true appends
+    the results to COMPARE_RESULTS_FILE.
+    """
     data = request.json
-    user_query = data.get('query', '')
-    user_preference = data.get('provider', None)
+    tenant = request_tenant()
+    if tenant is None:
+        return jsonify({'error': 'Invalid or missing API key'}), 401
+    options, error = query_options(data, tenant)
+    if error:
+        return jsonify({'error': error}), 400
+    compare = data.get('compare')
+    if compare is not None:
+        targets, error = router.resolve_compare_targets(compare)
+        if error is None and options['session_id']:
+            error = 'compare mode does not support session_id'
+        if error:
+            return jsonify({'error': error}), 400
+        compare_options = {key: options[key] for key in ('system', 'priority', 'tenant', 'max_tokens')}
+        compare_options['save'] = data.get('save') is True
     
-    if not user_query:
-        return jsonify({'error': 'Query is required'}), 400
+    # Cancelled when the client disconnects, closing the upstream stream
+    cancel = CancelToken()
+    watcher = DisconnectWatcher(get_client_socket(request.environ), cancel)
+    trace = router.tracer.start(
+        'POST /api/query',
+        traceparent=request.headers.get('traceparent'),
+        tenant=options['tenant']
+    )
+    headers = {'X-Trace-Id': trace.trace_id} if trace.trace_id else {}
+    
+    if wants_json(data):
+        watcher.start()
+        try:
+            if compare is not None:
+                result = router.compare_once(options['query'], targets, cancel=cancel, trace=trace, **compare_options)
+            else:
+                result = router.query_once(cancel=cancel, trace=trace, **options)
+        finally:
+            watcher.stop()
+            trace.end()
+        if 'error' not in result:
+            return jsonify(result), 200, headers
+        status = 429 if result.get('queued') or result.get('budget_exceeded') else 502
+        return jsonify(result), status, headers
     
     def generate():
         """Generate streaming response"""
+        if compare is not None:
+            events = router.compare(options['query'], targets, cancel=cancel, trace=trace, **compare_options)
+        else:
+            events = router.query_with_fallback(stream=True, cancel=cancel, trace=trace, **options)
+        # SSE encoding is interleaved with streaming, so it is summed onto
+        # the request span rather than given spans of its own
+        encode_ns = 0
+        sent = 0
+        watcher.start()
         try:
-            for event in router.query_with_fallback(user_query, user_preference, stream=True):
+            for event in events:
                 # Send as server-sent event
-                yield f"data: {json.dumps(event)}\n\n"
+                began = time.perf_counter_ns()
+                message = f"data: {json.dumps(event)}\n\n"
+                encode_ns += time.perf_counter_ns() - began
+                sent += 1
+                yield message
         except Exception as e:
             error_event = {
                 'type': 'error',
                 'data': {'error': str(e)}
             }
             yield f"data: {json.dumps(error_event)}\n\n"
+        finally:
+            # Runs on normal completion and when the server closes this
+            # generator after a failed write (client gone)
+            watcher.stop()
+            events.close()
+            trace.set('sse.events', sent)
+            trace.set('sse.encode_ms', round(encode_ns / 1e6, 3))
+            trace.end()
     
     return Response(
         stream_with_context(generate()),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
-            'X-Accel-Buffering': 'no'
+            'X-Accel-Buffering': 'no',
+            **headers
         }
     )
 
+def serve_socket(ws):
+    """
+    Run queries sent over one WebSocket concurrently
+    
+    Each message is a query body plus a client-chosen "id"; every reply
+    carries that id. With "stream": true the reply is the same event
+    sequence /api/query streams, one message per event; otherwise a single
+    {"type": "result"} message holding the query_once() result.
+    {"id": ..., "type": "cancel"} cancels a query in flight. Up to
+    WS_MAX_IN_FLIGHT queries per connection run at once; further ones wait.
+    """
+    tenant = request_tenant()
+    if tenant is None:
+        ws.send(json.dumps({'id': None, 'type': 'error', 'data': {'error': 'Invalid or missing API key'}}))
+        return
+    send_lock = threading.Lock()
+    cancels = {}
+    pool = ThreadPoolExecutor(max_workers=Config.WS_MAX_IN_FLIGHT, thread_name_prefix='ws-query')
+    
+    def send(message):
+        with send_lock:
+            ws.send(json.dumps(message))
+    
+    def run(request_id, options, stream, cancel):
+        try:
+            if stream:
+                events = router.query_with_fallback(stream=True, cancel=cancel, **options)
+                try:
+                    for event in events:
+                        send({'id': request_id, **event})
+                finally:
+                    events.close()
+            else:
+                send({'id': request_id, 'type': 'result', 'data': router.query_once(cancel=cancel, **options)})
+        except ConnectionClosed:
+            cancel.cancel()
+        except Exception as e:
+            try:
+                send({'id': request_id, 'type': 'error', 'data': {'error': str(e)}})
+            except ConnectionClosed:
+                pass
+        finally:
+            cancels.pop(request_id, None)
+    
+    try:
+        while True:
+            try:
+                message = json.loads(ws.receive())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                send({'id': None, 'type': 'error', 'data': {'error': 'Messages must be JSON objects'}})
+                continue
+            request_id = message.get('id')
+            if message.get('type') == 'cancel':
+                if request_id in cancels:
+                    cancels[request_id].cancel()
+                continue
+            
+            options, error = query_options(message, tenant)
+            if request_id is None or request_id in cancels:
+                error = 'Each query needs an id not already in flight'
+            if error:
+                send({'id': request_id, 'type': 'error', 'data': {'error': error}})
+                continue
+            cancels[request_id] = CancelToken()
+            pool.submit(run, request_id, options, message.get('stream', False), cancels[request_id])
+    except ConnectionClosed:
+        pass
+    finally:
+        # The client is gone: stop every query it still had running
+        for cancel in list(cancels.values()):
+            cancel.cancel()
+        pool.shutdown(wait=False)
+
+if Sock is not None:
+    Sock(app).route('/api/ws')(serve_socket)
+else:
+    print("⚠ flask-sock not installed; /api/ws is disabled")
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    """Forget a conversation session"""
+    if not router.end_session(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    return jsonify({'deleted': session_id})
+
 @app.route('/api/providers', methods=['GET'])
 def get_providers():
     """Get available providers and their stats"""
@@ -52,9 +287,223 @@ def get_providers():
     return jsonify({
         'providers': available_providers,
         'stats': stats,
-        'routing_rules': router.routing_rules
+        'routing_rules': router.routing_rules,
+        'routing_rules_version': router.get_routing_rules_version()
     })
 
+@app.route('/api/stats/live', methods=['GET'])
+def live_stats():
+    """Current provider stats, for clients that poll instead of streaming
+
+    The routing rules are included when their version differs from the
+    client's ?rules_version=.
+    """
+    version = router.get_routing_rules_version()
+    data = {'providers': router.get_live_stats(), 'routing_rules_version': version}
+    if request.args.get('rules_version') != version:
+        data['routing_rules'] = router.routing_rules
+    return jsonify(data)
+
+@app.route('/api/stats/stream', methods=['GET'])
+def stats_stream():
+    """Push provider stats as server-sent events
+
+    The first 'stats' event holds every field; later ones only the fields
+    that changed. A 'rules' event carries the routing rules whenever their
+    version differs from the one the client already has (?rules_version=).
+    Updates are checked every STATS_STREAM_INTERVAL seconds (?interval=).
+
+    Each stream holds a worker thread, so a process serves at most
+    STATS_STREAM_MAX_SUBSCRIBERS of them (503 beyond that; poll
+    /api/stats/live instead) and ends each after STATS_STREAM_MAX_SECONDS,
+    after which EventSource reconnects.
+    """
+    try:
+        interval = float(request.args.get('interval', Config.STATS_STREAM_INTERVAL))
+    except ValueError:
+        return jsonify({'error': 'interval must be a number'}), 400
+    interval = min(max(interval, 0.25), 60.0)
+    client_rules_version = request.args.get('rules_version')
+    if not stats_stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many live stats subscribers; poll /api/stats/live'}), 503, {'Retry-After': '60'}
+    
+    def generate():
+        rules_version = client_rules_version
+        previous = {}
+        last_sent = 0.0
+        opened = time.time()
+        # Reconnect delay for EventSource once the stream ends
+        yield "retry: 2000\n\n"
+        while time.time() - opened < Config.STATS_STREAM_MAX_SECONDS:
+            version = router.get_routing_rules_version()
+            if version != rules_version:
+                rules_version = version
+                event = {'type': 'rules', 'data': {'version': version, 'routing_rules': router.routing_rules}}
+                yield f"data: {json.dumps(event)}\n\n"
+            
+            current = router.get_live_stats()
+            delta = diff_records(previous, current)
+            if delta:
+                event = {'type': 'stats', 'data': {'full': not previous, 'providers': delta}}
+                yield f"data: {json.dumps(event)}\n\n"
+                last_sent = time.time()
+            elif time.time() - last_sent >= 15:
+                # Comment line: keeps proxies from closing an idle stream and
+                # detects clients that went away
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            previous = current
+            time.sleep(interval)
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Runs when the response is closed, even if the stream never started
+    response.call_on_close(stats_stream_slots.release)
+    return response
+
+@app.route('/api/embed', methods=['POST'])
+def embed():
+    """Embed one text ("input": "...") or a list of texts"""
+    data = request.json or {}
+    texts = data.get('input')
+    if isinstance(texts, str):
+        texts = [texts]
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) and text for text in texts):
+        return jsonify({'error': 'input must be a non-empty string or list of non-empty strings'}), 400
+    if len(texts) > Config.EMBED_MAX_INPUTS:
+        return jsonify({'error': f'at most {Config.EMBED_MAX_INPUTS} inputs per request'}), 400
+    
+    result = router.embed(texts, provider=data.get('provider'), model=data.get('model'))
+    if 'error' in result:
+        return jsonify(result), 502
+    return jsonify(result)
+
+@app.route('/api/embed/stats', methods=['GET'])
+def embed_stats():
+    """Embedding cache and batching stats for this worker"""
+    return jsonify(router.get_embedding_stats())
+
+@app.route('/api/cascades', methods=['GET'])
+def cascade_stats():
+    """Acceptance rate, cost saved and added latency per cascade"""
+    return jsonify(router.get_cascade_stats())
+
+@app.route('/api/stream-buffers', methods=['GET'])
+def stream_buffer_stats():
+    """High-water marks, spills and reader stalls of upstream stream buffers per provider"""
+    return jsonify(router.get_stream_buffer_stats())
+
+@app.route('/api/shadows', methods=['GET'])
+def shadow_stats():
+    """Candidate vs primary latency, throughput, cost and similarity per shadow"""
+    return jsonify(router.get_shadow_stats())
+
+@app.route('/api/output-lengths', methods=['GET'])
+def output_length_stats():
+    """Answer length percentiles, predictions and prediction error per query type/complexity"""
+    return jsonify(router.get_output_length_stats())
+
+@app.route('/api/latency-baseline', methods=['GET'])
+def latency_baseline():
+    """Startup probe measurements the router was seeded with (this worker)"""
+    return jsonify(router.get_latency_baseline())
+
+@app.route('/api/compaction', methods=['GET'])
+def compaction_stats():
+    """Tokens saved by prompt compaction per routing rule"""
+    return jsonify(router.get_compaction_stats())
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """Queue depth and queue-time percentiles per priority class (this worker)"""
+    return jsonify(router.scheduler.get_stats())
+
+@app.route('/api/budgets/<tenant>', methods=['GET'])
+def get_budget(tenant):
+    """
+    Current spend and remaining budget of a tenant
+    
+    Callers may read their own tenant (as identified by request_tenant());
+    other tenants need the DEBUG_PROFILE_TOKEN in X-Debug-Token.
+    """
+    if tenant != request_tenant() and not has_debug_token():
+        return jsonify({'error': "Only the caller's own budget is visible"}), 403
+    return jsonify({
+        'tenant': tenant,
+        'limits': router.budgets.limits_for(tenant),
+        'usage': router.budgets.usage(tenant),
+        'remaining': router.budgets.remaining(tenant)
+    })
+
+@app.route('/api/usage', methods=['GET'])
+def get_usage():
+    """Usage totals per time bucket from the usage ledger
+
+    Query parameters: start/end (unix seconds, default the last 24 hours),
+    granularity (minute or hour), group_by (comma-separated tenant,
+    provider, model) and tenant.
+    """
+    if router.ledger is None:
+        return jsonify({'error': 'Usage ledger is disabled'}), 404
+    
+    now = time.time()
+    try:
+        start = float(request.args.get('start', now - 86400))
+        end = float(request.args.get('end', now))
+        group_by = [c for c in request.args.get('group_by', 'model').split(',') if c]
+        began = time.perf_counter()
+        rows = router.ledger.query(
+            start, end,
+            granularity=request.args.get('granularity', 'hour'),
+            group_by=group_by,
+            tenant=request.args.get('tenant')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'start': start,
+        'end': end,
+        'rows': rows,
+        'query_ms': round((time.perf_counter() - began) * 1000, 2)
+    })
+
+@app.route('/api/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    Sample this worker's stacks for ?seconds=N and return them folded
+    
+    Disabled (404) unless DEBUG_PROFILE_TOKEN is set; callers must send it
+    in X-Debug-Token. The default text output feeds flamegraph.pl or
+    speedscope directly; ?format=json returns the counts with sample stats.
+    ?idle=1 keeps threads parked in waits.
+    """
+    if not Config.DEBUG_PROFILE_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not has_debug_token():
+        return jsonify({'error': 'Invalid debug token'}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    seconds = min(max(seconds, 0.1), Config.PROFILE_MAX_SECONDS)
+    interval = min(max(interval, 0.001), 1.0)
+    
+    profiler = SamplingProfiler(interval=interval, include_idle=request.args.get('idle') == '1')
+    stacks = profiler.run(seconds)
+    if stacks is None:
+        return jsonify({'error': 'A profile is already running in this worker'}), 409
+    if request.args.get('format') == 'json':
+        return jsonify({'samples': profiler.samples, 'interval_ms': interval * 1000, 'stacks': stacks})
+    return Response(SamplingProfiler.to_folded(stacks), mimetype='text/plain')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Check health of all providers"""
@@ -94,6 +543,12 @@ if __name__ == '__main__':
         print("   Please add API keys to .env file")
         print("   Copy .env.example to .env and add your keys")
     
+    if Config.PREWARM_PROVIDERS:
+        router.prewarm()
+    
+    if Config.PROBE_ON_STARTUP:
+        router.probe_latency(samples=Config.PROBE_SAMPLES)
+    
     print(f"\n🌐 Server starting at http://localhost:{Config.PORT}")
     print("="*60 + "\n")
     
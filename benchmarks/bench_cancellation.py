@@ -0,0 +1,86 @@
+"""
+Measure how quickly an upstream stream is closed after the client disconnects
+
+Runs the app under gunicorn against a local fake provider that streams a
+long answer, opens /api/query, reads the first token, then drops the
+client connection. Reports the time until the fake provider sees its
+connection closed, and the cancelled count from /api/providers.
+
+Usage:
+    python -m benchmarks.bench_cancellation --trials 5 --max-seconds 2
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import time
+
+import requests
+
+from benchmarks.bench_workers import start_server
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def disconnect_after_first_token(port: int) -> float:
+    """Open a stream, wait for content, hang up; return the hang-up time"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('POST', '/api/query', body=json.dumps({'query': 'hello'}),
+                 headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    while True:
+        line = response.fp.readline()
+        if not line:
+            raise RuntimeError('stream ended before any content')
+        if line.startswith(b'data: ') and json.loads(line[6:])['type'] == 'content':
+            break
+    hung_up_at = time.time()
+    conn.sock.close()
+    conn.close()
+    return hung_up_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure upstream cancellation latency')
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--max-seconds', type=float, default=2.0,
+                        help='Fail if the upstream stays open longer than this')
+    args = parser.parse_args()
+
+    # ~30s answers: without cancellation the upstream would stay open that long
+    fake, base_url = start_fake_server(tokens=600, delay_ms=50)
+    disconnects = fake.RequestHandlerClass.disconnect_times
+    proc = start_server(args.port, workers=1, threads=8, base_url=base_url)
+
+    latencies = []
+    try:
+        for _ in range(args.trials):
+            seen = len(disconnects)
+            hung_up_at = disconnect_after_first_token(args.port)
+            deadline = hung_up_at + 30
+            while len(disconnects) == seen and time.time() < deadline:
+                time.sleep(0.01)
+            if len(disconnects) == seen:
+                latencies.append(float('inf'))
+            else:
+                latencies.append(disconnects[seen] - hung_up_at)
+
+        stats = requests.get(f"http://127.0.0.1:{args.port}/api/providers", timeout=10).json()['stats']
+        cancelled = sum(stat.get('cancelled_count', 0) for stat in stats)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        fake.shutdown()
+
+    print(f"Upstream close latency: median={statistics.median(latencies) * 1000:.0f}ms "
+          f"max={max(latencies) * 1000:.0f}ms over {args.trials} trials")
+    print(f"Cancelled requests recorded: {cancelled}")
+
+    if max(latencies) > args.max_seconds:
+        print(f"FAIL: upstream stayed open longer than {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure prompt compaction savings, speed and memory
+
+Builds a synthetic pasted input (a log with repeated lines, the same stack
+trace pasted twice, an oversized code block and padded prose), or reads
+--input, and reports for it:
+    - characters and tokens before/after compaction (tiktoken when
+      available, else the 4 characters per token estimate)
+    - compaction time and throughput
+    - peak extra memory when compacting from a file with compact_lines()
+
+Usage:
+    python -m benchmarks.bench_compaction --log-lines 20000 --max-block-lines 400
+    python -m benchmarks.bench_compaction --input pasted.txt
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from utils.compactor import PromptCompactor
+
+
+def synthetic_input(log_lines: int) -> str:
+    """Pasted log, duplicated traceback, long code block and padded prose"""
+    parts = ['Our   service   keeps   failing   after   the   deploy.   Logs   below:   ', '', '```']
+    for i in range(log_lines):
+        if i % 50 < 30:
+            parts.append('2024-05-01T12:00:00Z WARN pool exhausted, retrying in 100ms')
+        else:
+            parts.append(f"2024-05-01T12:00:{i % 60:02d}Z INFO request {i} served in {i % 97} ms")
+    parts += ['```', '', '', '']
+    traceback = ['Traceback (most recent call last):'] + [
+        f'  File "/srv/app/module_{i}.py", line {i * 7}, in handler_{i}' for i in range(12)
+    ] + ['ConnectionError: pool exhausted']
+    parts += traceback + ['', 'And again from the other node:', ''] + traceback + ['']
+    parts += ['```python'] + [f"def handler_{i}(request):\n    return process(request, {i})\n" for i in range(600)]
+    parts += ['```', '', 'What   is   going   on?   ']
+    return '\n'.join(parts)
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding('cl100k_base').encode(text, disallowed_special=()))
+    except Exception:
+        # Not installed, or the encoding cannot be downloaded
+        return len(text) // 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prompt compaction savings')
+    parser.add_argument('--input', help='File to compact (default: synthetic input)')
+    parser.add_argument('--log-lines', type=int, default=20000)
+    parser.add_argument('--max-block-lines', type=int, default=400)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as f:
+            text = f.read()
+    else:
+        text = synthetic_input(args.log_lines)
+    compactor = PromptCompactor(max_block_lines=args.max_block_lines)
+
+    started = time.perf_counter()
+    compacted, stats = compactor.compact(text)
+    elapsed = time.perf_counter() - started
+
+    tokens_before = count_tokens(text)
+    tokens_after = count_tokens(compacted)
+    print(f"chars   {stats['chars_before']:>10,} -> {stats['chars_after']:>10,}")
+    print(f"tokens  {tokens_before:>10,} -> {tokens_after:>10,}  "
+          f"({1 - tokens_after / max(tokens_before, 1):.1%} saved)")
+    print(f"repeated lines {stats['repeated_lines']:,}  duplicate blocks {stats['duplicate_blocks']}  "
+          f"truncated lines {stats['truncated_lines']:,}")
+    print(f"time    {elapsed * 1000:.1f} ms ({len(text) / elapsed / 1e6:.1f} MB/s)")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.write(text)
+        path = f.name
+    try:
+        tracemalloc.start()
+        with open(path) as f:
+            for _ in compactor.compact_lines(f):
+                pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.unlink(path)
+    print(f"streaming from a file: peak {peak / 1024:.0f} KiB for a {len(text) / 1024:.0f} KiB input")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure /api/embed throughput and latency with and without micro-batching
+
+Runs the app under gunicorn against the local fake provider, whose
+/v1/embeddings answers after a fixed per-call delay. Concurrent clients
+each send one text per request. Three phases are run:
+    - unbatched: EMBED_MAX_BATCH_SIZE=1 (one upstream call per text)
+    - batched: the default micro-batcher settings, cache disabled
+    - batched + cache: texts drawn from a smaller pool, so some repeat
+
+For each phase reports texts/sec, p50/p99 request latency and the number
+and average size of upstream calls seen by the fake provider.
+
+Usage:
+    python -m benchmarks.bench_embeddings --clients 64 --seconds 5
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.bench_workers import start_server
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def run_clients(port: int, clients: int, seconds: float, texts: list) -> list:
+    """Send single-text embed requests from several clients; return latencies"""
+    def client(_):
+        session = requests.Session()
+        latencies = []
+        end = time.time() + seconds
+        while time.time() < end:
+            started = time.perf_counter()
+            response = session.post(f"http://127.0.0.1:{port}/api/embed",
+                                    json={'input': random.choice(texts)}, timeout=30)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return [latency for latencies in pool.map(client, range(clients)) for latency in latencies]
+
+
+def run_phase(name: str, args, fake, base_url: str, extra_env: dict, texts: list):
+    batches = fake.RequestHandlerClass.embedding_batches
+    proc = start_server(args.port, workers=1, threads=args.clients + 8, base_url=base_url, extra_env=extra_env)
+    try:
+        del batches[:]
+        latencies = sorted(run_clients(args.port, args.clients, args.seconds, texts))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    calls = len(batches)
+    print(f"{name:<16} {len(latencies) / args.seconds:>9,.0f} texts/s  "
+          f"p50 {pick(0.5):6.1f}ms  p99 {pick(0.99):6.1f}ms  "
+          f"{calls} upstream calls (avg {sum(batches) / max(calls, 1):.1f} texts)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embeddings micro-batching benchmark')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--embed-delay-ms', type=float, default=20.0,
+                        help='Fixed latency of each upstream embeddings call')
+    parser.add_argument('--repeat-pool', type=int, default=500,
+                        help='Distinct texts in the cached phase')
+    args = parser.parse_args()
+
+    fake, base_url = start_fake_server(embed_delay_ms=args.embed_delay_ms)
+    unique = [f"document {i}: " + 'lorem ipsum dolor sit amet ' * 8 for i in range(200000)]
+    try:
+        run_phase('unbatched', args, fake, base_url,
+                  {'EMBED_MAX_BATCH_SIZE': '1', 'EMBED_CACHE_ENTRIES': '0'}, unique)
+        run_phase('batched', args, fake, base_url, {'EMBED_CACHE_ENTRIES': '0'}, unique)
+        run_phase('batched + cache', args, fake, base_url, {}, unique[:args.repeat_pool])
+    finally:
+        fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
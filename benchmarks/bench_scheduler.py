@@ -0,0 +1,112 @@
+"""
+Measure chat TTFT while batch traffic saturates the upstream slots
+
+Runs the app under gunicorn against a local fake provider. Background
+clients keep more batch requests in flight than the worker has scheduler
+slots; meanwhile chat requests are sent one after another and their time
+to first token is recorded. The run is repeated with the chat requests
+sent as 'batch' from a batch tenant (no prioritisation, no fair share)
+for comparison. Tenants are passed in X-Tenant-ID, which the app is told
+to trust (TENANT_HEADER). Requests refused because their class's share
+of the queue is full (a queued error event) are counted, and batch
+clients back off briefly before retrying.
+
+Usage:
+    python -m benchmarks.bench_scheduler --batch-clients 20 --requests 20
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+
+from benchmarks.bench_workers import start_server
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def time_to_first_token(port: int, priority: str, tenant: str):
+    """Send one query and return seconds until the first content event (None if the queue was full)"""
+    started = time.time()
+    with requests.post(
+        f"http://127.0.0.1:{port}/api/query",
+        json={'query': 'hello', 'priority': priority},
+        headers={'X-Tenant-ID': tenant},
+        stream=True, timeout=120
+    ) as response:
+        for line in response.iter_lines():
+            if not line.startswith(b'data: '):
+                continue
+            event = json.loads(line[6:])
+            if event['type'] == 'content':
+                return time.time() - started
+            if event['type'] == 'error' and event['data'].get('queued'):
+                return None
+    return float('inf')
+
+
+def run_phase(port: int, batch_clients: int, requests_count: int, chat_priority: str, chat_tenant: str):
+    """Measure chat TTFT under batch load; returns (sorted TTFTs, rejected chat requests)"""
+    stop = threading.Event()
+
+    def batch_client(index: int):
+        while not stop.is_set():
+            try:
+                if time_to_first_token(port, 'batch', f"batch-{index % 2}") is None:
+                    time.sleep(0.1)
+            except requests.RequestException:
+                pass
+
+    clients = [threading.Thread(target=batch_client, args=(i,), daemon=True) for i in range(batch_clients)]
+    for client in clients:
+        client.start()
+    time.sleep(2)  # let the batch load build up
+
+    results = [time_to_first_token(port, chat_priority, chat_tenant) for _ in range(requests_count)]
+
+    stop.set()
+    for client in clients:
+        client.join(timeout=120)
+    return sorted(ttft for ttft in results if ttft is not None), results.count(None)
+
+
+def summarize(label: str, phase: tuple):
+    ttfts, rejected = phase
+    if not ttfts:
+        print(f"{label:<28} all {rejected} requests rejected")
+        return
+    p99 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.99))]
+    print(f"{label:<28} p50={statistics.median(ttfts) * 1000:7.0f}ms p99={p99 * 1000:7.0f}ms rejected={rejected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chat TTFT under batch load')
+    parser.add_argument('--batch-clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    # ~1s answers keep the batch requests holding their slots
+    fake, base_url = start_fake_server(tokens=50, delay_ms=20)
+    proc = start_server(args.port, workers=1, threads=args.threads, base_url=base_url,
+                        extra_env={'TENANT_HEADER': 'X-Tenant-ID'})
+    try:
+        prioritised = run_phase(args.port, args.batch_clients, args.requests, 'interactive', 'chat')
+        scheduler_stats = requests.get(f"http://127.0.0.1:{args.port}/api/scheduler", timeout=10).json()
+        unprioritised = run_phase(args.port, args.batch_clients, args.requests, 'batch', 'batch-0')
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        fake.shutdown()
+
+    summarize('chat as interactive', prioritised)
+    summarize('chat as batch (baseline)', unprioritised)
+    for name, stats in scheduler_stats['classes'].items():
+        queue_time = stats['queue_time']
+        print(f"  {name:<12} admitted={stats['admitted']:<5} rejected={stats['rejected']:<5} queue p50={queue_time['p50']}s p99={queue_time['p99']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark cold-start time of the app
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter with all
+three provider keys configured, and reports total wall time, the cumulative
+import time of the app and the slowest top-level imports. With lazy provider
+loading, vendor SDKs (openai, anthropic, google.generativeai/grpc, tiktoken)
+should not appear in the list.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SDK_MODULES = ('openai', 'anthropic', 'google.generativeai', 'grpc', 'tiktoken')
+
+
+def run_once(module: str):
+    """
+    Import a module in a fresh interpreter under -X importtime
+
+    Returns:
+        Tuple of (wall seconds, {module: cumulative microseconds})
+    """
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_KEY': 'sk-bench',
+        'ANTHROPIC_API_KEY': 'sk-ant-bench',
+        'GOOGLE_API_KEY': 'AIzaSy-bench',
+        'PREWARM_PROVIDERS': 'false',
+    })
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        cumulative[name] = int(cumulative_us)
+    return wall, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app cold-start time')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', help='Write results to this file for tracking')
+    args = parser.parse_args()
+
+    walls = []
+    imports = []
+    for _ in range(args.runs):
+        wall, cumulative = run_once(args.module)
+        walls.append(wall)
+        imports.append(cumulative)
+
+    last = imports[-1]
+    app_import_ms = statistics.median(run.get(args.module, 0) for run in imports) / 1000
+    sdk_loaded = sorted(name for name in last if name in SDK_MODULES)
+    # Top-level modules only, so nested imports aren't double counted
+    top = sorted(
+        ((name, us) for name, us in last.items() if '.' not in name),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+
+    print(f"Wall time (median of {args.runs}): {statistics.median(walls) * 1000:.0f} ms")
+    print(f"import {args.module} (median cumulative): {app_import_ms:.0f} ms")
+    print(f"Vendor SDKs imported at startup: {', '.join(sdk_loaded) or 'none'}")
+    print("\nSlowest top-level imports:")
+    for name, us in top:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'module': args.module,
+                'runs': args.runs,
+                'wall_ms_median': round(statistics.median(walls) * 1000, 1),
+                'import_ms_median': round(app_import_ms, 1),
+                'sdk_modules_loaded': sdk_loaded,
+                'top_imports_ms': {name: round(us / 1000, 1) for name, us in top}
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare SSE, JSON and multiplexed WebSocket transports for short queries
+
+Runs the app under gunicorn against the local fake provider (short
+answers, no token delay, so transport overhead dominates) and sends the
+same number of queries through:
+    - sse: POST /api/query, read the event stream until 'complete'
+    - json: POST /api/query with "stream": false
+    - ws: one WebSocket per client thread to /api/ws, each keeping
+      --in-flight queries outstanding on that connection
+
+Reports queries/sec and p50/p99 latency for each.
+
+Usage:
+    python -m benchmarks.bench_transports --clients 8 --requests 2000
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import simple_websocket
+
+from benchmarks.bench_workers import start_server
+from benchmarks.fake_provider_server import start_fake_server
+
+BODY = {'query': 'hello', 'provider': 'openai', 'cascade': False}
+
+
+def run_http(port: int, clients: int, total: int, stream: bool) -> list:
+    url = f"http://127.0.0.1:{port}/api/query"
+
+    def client(count):
+        session = requests.Session()
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            if stream:
+                with session.post(url, json=BODY, stream=True, timeout=30) as response:
+                    for line in response.iter_lines():
+                        if line.startswith(b'data: ') and json.loads(line[6:])['type'] == 'complete':
+                            break
+            else:
+                response = session.post(url, json={**BODY, 'stream': False}, timeout=30)
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return [l for ls in pool.map(client, [total // clients] * clients) for l in ls]
+
+
+def run_ws(port: int, clients: int, total: int, in_flight: int) -> list:
+    def client(count):
+        ws = simple_websocket.Client(f"ws://127.0.0.1:{port}/api/ws")
+        sent_at = {}
+        latencies = []
+        lock = threading.Lock()
+        next_id = 0
+
+        def send_one():
+            nonlocal next_id
+            with lock:
+                request_id = next_id
+                next_id += 1
+                sent_at[request_id] = time.perf_counter()
+            ws.send(json.dumps({**BODY, 'id': request_id}))
+
+        for _ in range(min(in_flight, count)):
+            send_one()
+        while len(latencies) < count:
+            message = json.loads(ws.receive())
+            if message['type'] != 'result':
+                continue
+            latencies.append(time.perf_counter() - sent_at.pop(message['id']))
+            if next_id < count:
+                send_one()
+        ws.close()
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return [l for ls in pool.map(client, [total // clients] * clients) for l in ls]
+
+
+def report(name: str, latencies: list, seconds: float):
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"{name:<5} {len(latencies) / seconds:>8,.0f} q/s  p50 {pick(0.5):6.1f}ms  p99 {pick(0.99):6.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE vs JSON vs WebSocket transport benchmark')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--in-flight', type=int, default=8, help='Outstanding queries per WebSocket')
+    parser.add_argument('--tokens', type=int, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    fake, base_url = start_fake_server(tokens=args.tokens, delay_ms=0)
+    proc = start_server(args.port, workers=1, threads=32, base_url=base_url,
+                        extra_env={'USAGE_LEDGER_PATH': '', 'WS_MAX_IN_FLIGHT': str(args.in_flight)})
+    try:
+        for name, run in (
+            ('sse', lambda: run_http(args.port, args.clients, args.requests, stream=True)),
+            ('json', lambda: run_http(args.port, args.clients, args.requests, stream=False)),
+            ('ws', lambda: run_ws(args.port, args.clients, args.requests, args.in_flight)),
+        ):
+            run()  # Warm up connections, tokenizer and client pools
+            started = time.perf_counter()
+            latencies = run()
+            report(name, latencies, time.perf_counter() - started)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure usage ledger write throughput and range query latency
+
+Writes synthetic request records spread over a week through the ledger's
+batching writer, then times /api/usage-style queries ("cost by model per
+hour for the last week") against the rollups.
+
+Usage:
+    python -m benchmarks.bench_usage_ledger --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils.usage_ledger import UsageLedger
+
+MODELS = [('openai', 'gpt-4'), ('openai', 'gpt-3.5-turbo'), ('anthropic', 'claude-3-sonnet-20240229'),
+          ('google', 'gemini-2.5-flash')]
+
+
+def synthetic_entry(now: float) -> dict:
+    provider, model = random.choice(MODELS)
+    return {
+        'ts': now - random.random() * 7 * 86400,
+        'tenant': f"tenant-{random.randrange(50)}",
+        'priority': 'standard',
+        'provider': provider,
+        'model': model,
+        'status': 'ok' if random.random() > 0.02 else 'error',
+        'input_tokens': random.randrange(50, 4000),
+        'output_tokens': random.randrange(10, 1000),
+        'cost': random.random() / 100,
+        'ttft': random.random(),
+        'latency': random.random() * 10,
+        'fallback_depth': 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Usage ledger benchmark')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'usage.db')
+    ledger = UsageLedger(path, batch_size=5000, flush_interval=0.05, max_queue=args.rows)
+    now = time.time()
+    entries = [synthetic_entry(now) for _ in range(args.rows)]
+
+    began = time.perf_counter()
+    for entry in entries:
+        ledger.record(entry)
+    enqueue_seconds = time.perf_counter() - began
+    while ledger.written + ledger.dropped < args.rows:
+        time.sleep(0.05)
+    write_seconds = time.perf_counter() - began
+
+    print(f"record(): {enqueue_seconds / args.rows * 1e6:.2f}us per call")
+    print(f"Written {ledger.written} rows in {write_seconds:.1f}s "
+          f"({ledger.written / write_seconds:,.0f} rows/s, {ledger.dropped} dropped)")
+
+    for granularity, group_by in (('hour', ('model',)), ('hour', ('tenant', 'model')), ('minute', ('provider',))):
+        timings = []
+        for _ in range(args.queries):
+            began = time.perf_counter()
+            rows = ledger.query(now - 7 * 86400, now, granularity=granularity, group_by=group_by)
+            timings.append(time.perf_counter() - began)
+        timings.sort()
+        print(f"7-day query by {granularity}/{','.join(group_by)}: {len(rows)} rows, "
+              f"median {timings[len(timings) // 2] * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark requests/sec and open-stream capacity as gunicorn workers scale
+
+Starts the app under gunicorn (gunicorn.conf.py) against a local fake
+provider for each worker count and reports:
+    - requests/sec on /api/providers
+    - how many concurrent /api/query streams receive their first token
+    - the fleet-wide request count reported by /api/providers
+
+Usage:
+    python -m benchmarks.bench_workers --workers 1 2 4 --threads 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_provider_server import start_fake_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(port: int, workers: int, threads: int, base_url: str, extra_env: dict = None) -> subprocess.Popen:
+    """Start gunicorn with the given worker count and wait until it answers"""
+    env = dict(os.environ)
+    env.update({
+        'HOST': '127.0.0.1',
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(workers),
+        'WORKER_THREADS': str(threads),
+        'OPENAI_API_KEY': 'sk-bench',
+        'OPENAI_BASE_URL': base_url,
+        'ANTHROPIC_API_KEY': '',
+        'GOOGLE_API_KEY': '',
+    })
+    env.update(extra_env or {})
+    env.pop('SHARED_STATE_SOCKET', None)
+    env.pop('SHARED_STATE_AUTHKEY', None)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/providers", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start within 30 seconds')
+
+
+def measure_rps(url: str, clients: int, duration: float) -> float:
+    """Hammer a GET endpoint from several clients and return requests/sec"""
+    def worker():
+        session = requests.Session()
+        count = 0
+        end = time.time() + duration
+        while time.time() < end:
+            session.get(url, timeout=10)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        total = sum(pool.map(lambda _: worker(), range(clients)))
+    return total / duration
+
+
+def measure_streams(url: str, streams: int, first_token_timeout: float) -> int:
+    """Open concurrent streams and count those that got content in time and completed"""
+    def open_stream(_):
+        start = time.time()
+        first_token_in_time = False
+        try:
+            with requests.post(url, json={'query': 'hello'}, stream=True,
+                               timeout=first_token_timeout) as response:
+                for line in response.iter_lines():
+                    if not line.startswith(b'data: '):
+                        continue
+                    event_type = json.loads(line[6:])['type']
+                    if event_type == 'content' and not first_token_in_time:
+                        first_token_in_time = time.time() - start <= first_token_timeout
+                    elif event_type == 'complete':
+                        return first_token_in_time
+        except requests.RequestException:
+            return False
+        return False
+
+    with ThreadPoolExecutor(max_workers=streams) as pool:
+        return sum(pool.map(open_stream, range(streams)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gunicorn worker scaling')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--streams', type=int, default=128)
+    parser.add_argument('--first-token-timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    # Slow streams (~4s each) so that open streams overlap during the measurement
+    fake, base_url = start_fake_server(tokens=40, delay_ms=100)
+
+    print(f"{'workers':>8} {'req/s':>10} {'streams ok':>12} {'fleet requests':>15}")
+    for workers in args.workers:
+        proc = start_server(args.port, workers, args.threads, base_url)
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            rps = measure_rps(f"{base}/api/providers", args.clients, args.duration)
+            ok = measure_streams(f"{base}/api/query", args.streams, args.first_token_timeout)
+            stats = requests.get(f"{base}/api/providers", timeout=10).json()['stats']
+            # Every completed stream must be visible from whichever worker answers
+            fleet = sum(stat['request_count'] for stat in stats)
+            print(f"{workers:>8} {rps:>10.1f} {ok:>8}/{args.streams:<3} {fleet:>15}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Check the startup latency probe and the router's seeding from its baseline
+
+Runs the router in-process with two providers: "openai" pointed at a port
+nobody listens on, and an OpenAI-compatible provider named "local" backed
+by the fake provider. The script:
+    - probes both (router.probe_latency) and checks the baseline file
+    - starts a new router from that file and checks that "local" reports
+      its baseline TTFT/latency and that the unreachable "openai" is tried
+      last, until a live request replaces the baseline
+    - times the first request with and without the baseline (without it,
+      the request first fails over from the unreachable provider)
+
+Exits non-zero if any check fails.
+
+Usage:
+    python -m benchmarks.check_latency_probe --tokens 60 --delay-ms 5
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency probe and baseline seeding check')
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--delay-ms', type=float, default=5)
+    parser.add_argument('--samples', type=int, default=2)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(tokens=args.tokens, delay_ms=args.delay_ms)
+    workdir = tempfile.mkdtemp(prefix='probe-check-')
+    rules_file = os.path.join(workdir, 'routing_rules.json')
+    with open(rules_file, 'w') as f:
+        json.dump({
+            'default_provider': 'local',
+            'default_model': 'local-model',
+            'fallback_order': ['local', 'openai'],
+            'providers': {
+                'local': {'type': 'openai_compatible', 'base_url': base_url, 'default_model': 'local-model'}
+            }
+        }, f)
+    os.environ.update({'OPENAI_API_KEY': 'sk-check', 'OPENAI_BASE_URL': f"http://127.0.0.1:{unused_port()}/v1",
+                       'ANTHROPIC_API_KEY': '', 'GOOGLE_API_KEY': ''})
+    os.environ.pop('SHARED_STATE_SOCKET', None)
+
+    from config import Config
+    Config.ROUTING_RULES_FILE = rules_file
+    Config.USAGE_LEDGER_PATH = ''
+    Config.LATENCY_BASELINE_FILE = os.path.join(workdir, 'latency_baseline.json')
+    from llm_router import LLMRouter
+    from utils.shared_state import get_stats_store
+
+    failed = False
+
+    def check(ok, message):
+        nonlocal failed
+        print(f"  {'✓' if ok else '✗'} {message}")
+        failed = failed or not ok
+
+    started = time.perf_counter()
+    LLMRouter().probe_latency(samples=args.samples, background=False)
+    print(f"probe took {time.perf_counter() - started:.2f}s")
+    with open(Config.LATENCY_BASELINE_FILE) as f:
+        results = json.load(f)['results']
+    print(json.dumps(results, indent=2))
+    check(results.get('local/local-model', {}).get('ok'), 'local provider probed')
+    unreachable = [result for key, result in results.items() if key.startswith('openai/')]
+    check(unreachable and not any(result['ok'] for result in unreachable), 'unreachable provider recorded as failed')
+
+    seeded = LLMRouter()
+    live = seeded.get_live_stats()
+    check(live['local']['latency_source'] == 'baseline' and live['local']['ttft_p50'] > 0,
+          f"local seeded from the baseline (TTFT p50 {live['local']['ttft_p50']}s)")
+    check(seeded._get_fallback_order('local') == ['local', 'openai'], 'unreachable provider tried last')
+
+    started = time.perf_counter()
+    result = seeded.query_once('What is the capital of France?')
+    with_baseline = time.perf_counter() - started
+    check(result.get('provider') == 'local' and not result['errors'], 'first request answered without failing over')
+    check(seeded.get_live_stats()['local']['latency_source'] == 'live', 'live samples replace the baseline')
+
+    get_stats_store().clear()
+    Config.LATENCY_BASELINE_FILE = ''
+    unseeded = LLMRouter()
+    started = time.perf_counter()
+    result = unseeded.query_once('What is the capital of France?')
+    without_baseline = time.perf_counter() - started
+    print(f"first request: {with_baseline * 1000:.0f} ms with the baseline, "
+          f"{without_baseline * 1000:.0f} ms without ({len(result['errors'])} failed attempt(s) first)")
+
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
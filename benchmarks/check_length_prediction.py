@@ -0,0 +1,82 @@
+"""
+Check output length prediction against the local fake provider
+
+Runs the router in-process with OUTPUT_PREDICTION=enforce. The first
+--warmup queries have no prediction yet and build the answer length
+history; the next --requests queries should be predicted, get max_tokens
+set from the prediction, and still receive their full answer. Reports the
+prediction, its error, and the output tokens the budget check reserves per
+request with and without the prediction.
+
+Exits non-zero if no prediction was made or answers were cut short.
+
+Usage:
+    python -m benchmarks.check_length_prediction --tokens 300 --warmup 30 --requests 20
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Output length prediction check')
+    parser.add_argument('--tokens', type=int, default=300, help='Answer length of the fake provider')
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(tokens=args.tokens, delay_ms=0)
+    os.environ.update({'OPENAI_API_KEY': 'sk-check', 'OPENAI_BASE_URL': base_url,
+                       'ANTHROPIC_API_KEY': '', 'GOOGLE_API_KEY': ''})
+    os.environ.pop('SHARED_STATE_SOCKET', None)
+
+    from config import Config
+    Config.USAGE_LEDGER_PATH = ''
+    Config.OUTPUT_PREDICTION = 'enforce'
+    Config.OUTPUT_PREDICTION_MIN_SAMPLES = args.warmup
+    Config.OUTPUT_PREDICTION_MIN_TOKENS = 16
+    from llm_router import LLMRouter
+
+    router = LLMRouter()
+    router.length_predictor.refresh_seconds = 0
+
+    def ask(index):
+        result = router.query_once(f"Tell me about topic {index}", user_preference='openai')
+        return result['routing'], result['usage'].get('output_tokens', 0)
+
+    for index in range(args.warmup):
+        ask(index)
+
+    failed = False
+    capped = []
+    cut = 0
+    for index in range(args.requests):
+        routing, output_tokens = ask(args.warmup + index)
+        if routing.get('max_tokens'):
+            capped.append(routing['max_tokens'])
+        if output_tokens < args.tokens:
+            cut += 1
+
+    stats = router.get_output_length_stats()
+    print(json.dumps(stats, indent=2))
+    if len(capped) != args.requests:
+        print(f"  ✗ only {len(capped)} of {args.requests} requests were predicted")
+        failed = True
+    if cut:
+        print(f"  ✗ {cut} answers were cut short by the predicted max_tokens")
+        failed = True
+    if capped:
+        print(f"budget reserve per request: {Config.BUDGET_ESTIMATE_MAX_TOKENS} output tokens without prediction, "
+              f"{sum(capped) / len(capped):.0f} with it (answers are {args.tokens})")
+    if not failed:
+        print(f"  ✓ {len(capped)} requests sized from the prediction, none cut short")
+
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Check that shadow traffic stays off the critical path
+
+Runs the router in-process against two local fake providers: the primary
+(as "openai") and a slower candidate (an OpenAI-compatible provider named
+"candidate"). Concurrent clients send queries twice, once with no shadows
+and once with every request sampled for a shadow, and the script reports:
+    - the primary's TTFT and latency percentiles in both runs
+    - how many requests were mirrored or dropped by the concurrency caps
+    - the candidate's TTFT, latency, throughput, cost and similarity from
+      get_shadow_stats()
+
+Exits non-zero if shadows noticeably slowed the primary, ran more than
+SHADOW_MAX_CONCURRENT at once, recorded nothing, or showed up in the
+candidate provider's own stats.
+
+Usage:
+    python -m benchmarks.check_shadow --clients 8 --requests 40 --max-concurrent 2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run_clients(router, clients: int, requests: int):
+    """Send requests from concurrent clients; returns (ttft, latency) per request"""
+    def one(index):
+        started = time.perf_counter()
+        ttft = None
+        for event in router.query_with_fallback(f"Explain topic {index}", user_preference='openai'):
+            if event['type'] == 'content' and ttft is None:
+                ttft = time.perf_counter() - started
+        return ttft, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shadow traffic overhead and accounting check')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--max-concurrent', type=int, default=2, help='SHADOW_MAX_CONCURRENT')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase of the primary p50 TTFT/latency')
+    args = parser.parse_args()
+
+    primary_server, primary_url = start_fake_server(tokens=args.tokens, delay_ms=10)
+    candidate_server, candidate_url = start_fake_server(tokens=args.tokens, delay_ms=25)
+    rules_file = os.path.join(tempfile.mkdtemp(prefix='shadow-check-'), 'routing_rules.json')
+    with open(rules_file, 'w') as f:
+        json.dump({
+            'default_provider': 'openai',
+            'default_model': 'gpt-3.5-turbo',
+            'fallback_order': ['openai'],
+            'providers': {
+                'candidate': {
+                    'type': 'openai_compatible',
+                    'base_url': candidate_url,
+                    'models': {'cand-model': {'input': 0.1, 'output': 0.2, 'context': 8192}}
+                }
+            },
+            'shadows': []
+        }, f)
+    os.environ.update({'OPENAI_API_KEY': 'sk-check', 'OPENAI_BASE_URL': primary_url,
+                       'ANTHROPIC_API_KEY': '', 'GOOGLE_API_KEY': ''})
+    os.environ.pop('SHARED_STATE_SOCKET', None)
+
+    from config import Config
+    Config.ROUTING_RULES_FILE = rules_file
+    Config.USAGE_LEDGER_PATH = ''
+    Config.SHADOW_MAX_CONCURRENT = args.max_concurrent
+    from llm_router import LLMRouter
+
+    router = LLMRouter()
+    router.prewarm(background=False)
+    run_clients(router, args.clients, args.clients)  # warm up connections
+
+    baseline = run_clients(router, args.clients, args.requests)
+    router.routing_rules['shadows'] = [{
+        'name': 'check',
+        'condition': {},
+        'candidate': {'provider': 'candidate', 'model': 'cand-model'},
+        'sample_rate': 1.0,
+        'similarity': 'lexical'
+    }]
+    peak = 0
+    sampling = True
+
+    def watch():
+        nonlocal peak
+        while sampling:
+            peak = max(peak, router.shadow_pool.in_flight)
+            time.sleep(0.002)
+
+    with ThreadPoolExecutor(max_workers=1) as watcher:
+        watcher.submit(watch)
+        shadowed = run_clients(router, args.clients, args.requests)
+        deadline = time.time() + 60
+        while router.shadow_pool.in_flight and time.time() < deadline:
+            time.sleep(0.05)
+        sampling = False
+
+    failed = False
+    for label, index in (('ttft', 0), ('latency', 1)):
+        before = statistics.median(r[index] for r in baseline)
+        after = statistics.median(r[index] for r in shadowed)
+        print(f"primary {label:<8} p50 {before * 1000:7.1f} ms -> {after * 1000:7.1f} ms   "
+              f"p95 {percentile([r[index] for r in baseline], 95) * 1000:7.1f} ms -> "
+              f"{percentile([r[index] for r in shadowed], 95) * 1000:7.1f} ms")
+        if after > before * (1 + args.tolerance):
+            print(f"  ✗ primary {label} slowed by more than {args.tolerance:.0%} with shadows on")
+            failed = True
+
+    stats = router.get_shadow_stats().get('check', {})
+    print(json.dumps(stats, indent=2))
+    print(f"peak concurrent shadows: {peak}")
+    if peak > args.max_concurrent:
+        print(f"  ✗ more than {args.max_concurrent} shadows ran at once")
+        failed = True
+    if stats.get('mirrored', 0) + stats.get('dropped', 0) != args.requests:
+        print('  ✗ mirrored + dropped does not add up to the requests sent')
+        failed = True
+    if not stats.get('vs_primary'):
+        print('  ✗ no paired shadow results recorded')
+        failed = True
+    candidate_requests = router.providers['candidate'].get_stats()['request_count']
+    if candidate_requests:
+        print(f"  ✗ shadow traffic counted in the candidate provider's stats ({candidate_requests} requests)")
+        failed = True
+    if not failed:
+        print(f"  ✓ {stats['mirrored']} mirrored, {stats['dropped']} dropped, primary unaffected")
+
+    primary_server.shutdown()
+    candidate_server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Check that a slow client no longer holds the upstream stream open
+
+Runs the app under gunicorn against the local fake provider and reads a
+long answer through a throttled client: a raw socket with a small receive
+buffer that takes --read-bytes every --read-interval-ms. For each mode it
+reports how long the upstream stream took to send (measured by the fake
+provider) against how long the client took to receive it, and the buffer
+stats from /api/stream-buffers:
+    - direct: STREAM_BUFFER_ENABLED=false, upstream reads follow the client
+    - memory: buffered in memory (STREAM_BUFFER_MAX_BYTES large enough)
+    - spill: small memory cap, overflow spilled to a temp directory
+
+Exits non-zero if a buffered mode does not release the upstream well
+before the client finishes.
+
+Usage:
+    python -m benchmarks.check_slow_client --tokens 20000 --padding 400 --read-bytes 4096 --read-interval-ms 15
+
+The answer must be larger than the kernel socket buffers between the app
+and the client (several MB on loopback), or the direct mode never stalls.
+"""
+import argparse
+import json
+import socket
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.bench_workers import start_server
+from benchmarks.fake_provider_server import start_fake_server
+
+
+def throttled_query(port: int, read_bytes: int, interval: float) -> float:
+    """POST /api/query and read the SSE response slowly; returns seconds until the end of the stream"""
+    body = json.dumps({'query': 'hello', 'provider': 'openai', 'cascade': False}).encode()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # A small receive window makes the server's writes block on this client
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(('127.0.0.1', port))
+    started = time.perf_counter()
+    sock.sendall(
+        b"POST /api/query HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    tail = b''
+    while True:
+        data = sock.recv(read_bytes)
+        if not data:
+            break
+        tail = (tail + data)[-256:]
+        if b'"type": "complete"' in tail:
+            break
+        time.sleep(interval)
+    sock.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slow client vs upstream stream duration')
+    parser.add_argument('--tokens', type=int, default=20000)
+    parser.add_argument('--padding', type=int, default=400, help='Extra characters per token')
+    parser.add_argument('--read-bytes', type=int, default=4096)
+    parser.add_argument('--read-interval-ms', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    fake, base_url = start_fake_server(tokens=args.tokens, delay_ms=0, token_padding=args.padding)
+    durations = fake.RequestHandlerClass.stream_durations
+    spill_dir = tempfile.mkdtemp(prefix='stream-spill-')
+    modes = (
+        ('direct', {'STREAM_BUFFER_ENABLED': 'false'}),
+        ('memory', {'STREAM_BUFFER_ENABLED': 'true', 'STREAM_BUFFER_MAX_BYTES': str(16 << 20)}),
+        ('spill', {'STREAM_BUFFER_ENABLED': 'true', 'STREAM_BUFFER_MAX_BYTES': str(16 << 10),
+                   'STREAM_BUFFER_SPILL_DIR': spill_dir}),
+    )
+    failed = False
+    try:
+        for mode, env in modes:
+            proc = start_server(args.port, workers=1, threads=8, base_url=base_url,
+                                extra_env={'USAGE_LEDGER_PATH': '', **env})
+            try:
+                del durations[:]
+                client_seconds = throttled_query(args.port, args.read_bytes, args.read_interval_ms / 1000)
+                upstream_seconds = durations[-1] if durations else float('nan')
+                buffers = requests.get(f"http://127.0.0.1:{args.port}/api/stream-buffers", timeout=5).json()
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+            stats = buffers.get('openai', {})
+            print(f"{mode:<7} upstream {upstream_seconds:6.2f}s  client {client_seconds:6.2f}s  "
+                  f"high-water p99 {stats.get('high_water_bytes', {}).get('p99', 0):>9,} B  "
+                  f"spilled {stats.get('spilled_bytes', 0):>9,} B  stalls {stats.get('stalls', 0)}")
+            if mode != 'direct':
+                if upstream_seconds < client_seconds / 2:
+                    print(f"  ✓ upstream released {client_seconds - upstream_seconds:.2f}s before the client finished")
+                else:
+                    print('  ✗ upstream still paced by the client')
+                    failed = True
+            if mode == 'spill' and not stats.get('spilled_bytes'):
+                print('  ✗ nothing was spilled; lower --read-bytes or raise --tokens')
+                failed = True
+    finally:
+        fake.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
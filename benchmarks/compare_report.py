@@ -0,0 +1,68 @@
+"""
+Summarize saved compare runs per query class, for tuning routing rules
+
+Reads the JSON lines written by compare mode (/api/query with "compare"
+and "save": true) and, for each query_type/complexity the routing rules
+match on, reports every provider/model's success rate, mean TTFT,
+throughput and cost, marking the cheapest and the fastest to first token.
+
+Usage:
+    python -m benchmarks.compare_report compare_results.jsonl
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+def summarize(records: list) -> dict:
+    """(query_type, complexity) -> (provider, model) -> aggregated measurements"""
+    classes = defaultdict(lambda: defaultdict(lambda: {'runs': 0, 'ok': 0, 'ttft': [], 'tps': [], 'cost': []}))
+    for record in records:
+        metadata = record.get('query_metadata', {})
+        query_class = (metadata.get('query_type', '?'), metadata.get('complexity', '?'))
+        for result in record['results']:
+            stats = classes[query_class][(result['provider'], result['model'])]
+            stats['runs'] += 1
+            if result['status'] != 'ok':
+                continue
+            stats['ok'] += 1
+            stats['cost'].append(result['cost'])
+            if result['ttft'] is not None:
+                stats['ttft'].append(result['ttft'])
+            if result['tokens_per_second'] is not None:
+                stats['tps'].append(result['tokens_per_second'])
+    return classes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per query class comparison of saved compare runs')
+    parser.add_argument('results', help='compare_results.jsonl')
+    args = parser.parse_args()
+
+    with open(args.results) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        sys.exit('No records')
+
+    mean = lambda values: sum(values) / len(values) if values else None
+    fmt = lambda value, spec: format(value, spec) if value is not None else '-'
+    for (query_type, complexity), targets in sorted(summarize(records).items()):
+        rows = []
+        for (provider, model), stats in targets.items():
+            rows.append((f"{provider}/{model}", stats['ok'] / stats['runs'], mean(stats['ttft']),
+                         mean(stats['tps']), mean(stats['cost'])))
+        cheapest = min((r for r in rows if r[4] is not None), key=lambda r: r[4], default=None)
+        fastest = min((r for r in rows if r[2] is not None), key=lambda r: r[2], default=None)
+
+        print(f"\n{query_type} / {complexity}")
+        print(f"  {'target':<36} {'ok':>5} {'ttft':>7} {'tok/s':>7} {'cost':>10}")
+        for row in sorted(rows):
+            marks = ' cheapest' if row is cheapest else ''
+            marks += ' fastest' if row is fastest else ''
+            print(f"  {row[0]:<36} {row[1]:>5.0%} {fmt(row[2], '>7.3f')} {fmt(row[3], '>7.1f')} "
+                  f"{fmt(row[4], '>10.6f')}{marks}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Evaluate a cascade's acceptance checks offline over a captured query set
+
+The query set is JSONL, one record per line:
+    {"query": "...", "answer": "<first-stage answer>", "label": true,
+     "input_tokens": 120, "output_tokens": 340,
+     "stage_latency": 1.2, "final_latency": 4.5}
+
+Only "query" and "answer" are required. "label" marks whether the
+first-stage answer was actually good enough (from human review or a
+stronger judge); with labels the report includes how often the checks
+accept bad answers and reject good ones. Token counts default to a
+len/4 estimate; latencies are optional.
+
+Answers can be captured from the configured providers first:
+    python -m benchmarks.eval_cascade capture queries.jsonl captured.jsonl --cascade flash_first
+
+Then evaluated (no provider calls), optionally sweeping min_confidence:
+    python -m benchmarks.eval_cascade evaluate captured.jsonl --cascade flash_first --sweep
+
+Runs saved by compare mode (/api/query with "compare" and "save": true)
+can be evaluated directly: the answers of the cascade's first and final
+stage models are taken from each run's results.
+    python -m benchmarks.eval_cascade evaluate compare_results.jsonl --cascade flash_first
+"""
+import argparse
+import functools
+import json
+import sys
+import time
+
+from config import Config
+from providers.registry import PROVIDER_REGISTRY, get_provider_class, register_config_providers
+from utils.cascade import AnswerChecker
+from utils.query_analyzer import QueryAnalyzer
+
+
+def load_cascade(name: str) -> dict:
+    rules = Config.load_routing_rules()
+    register_config_providers(rules.get('providers', {}))
+    for cascade in rules.get('cascades', []):
+        if cascade.get('name') == name:
+            return cascade
+    sys.exit(f"No cascade named {name!r} in {Config.ROUTING_RULES_FILE}")
+
+
+def read_jsonl(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@functools.lru_cache(maxsize=None)
+def pricing_provider(name: str, model: str):
+    """Provider instance used only for its pricing (no client is created)"""
+    spec = PROVIDER_REGISTRY[name]
+    return get_provider_class(name)('', model, **spec.get('options', {}))
+
+
+def price(stage: dict, input_tokens: int, output_tokens: int) -> float:
+    """Cost of a request on a stage's model, using the provider's pricing"""
+    provider = pricing_provider(stage['provider'], stage['model'])
+    return provider.estimate_cost(input_tokens, output_tokens, model=stage['model'])
+
+
+def from_compare(record: dict, cascade: dict):
+    """Cascade record from a saved compare run, or None if it lacks the first stage's answer"""
+    if 'results' not in record:
+        return record
+    answers = {(r['provider'], r['model']): r for r in record['results'] if r['status'] == 'ok'}
+    first, final = cascade['stages'][0], cascade['stages'][-1]
+    stage = answers.get((first['provider'], first['model']))
+    if stage is None:
+        return None
+    converted = {
+        'query': record['query'],
+        'answer': stage['answer'],
+        'input_tokens': stage['input_tokens'],
+        'output_tokens': stage['output_tokens'],
+        'stage_latency': stage['elapsed']
+    }
+    final_result = answers.get((final['provider'], final['model']))
+    if final_result is not None:
+        converted['final_answer'] = final_result['answer']
+        converted['final_latency'] = final_result['elapsed']
+    if 'label' in record:
+        converted['label'] = record['label']
+    return converted
+
+
+def capture(args):
+    """Run the first stage (and optionally the final one) over each query"""
+    from llm_router import LLMRouter
+
+    cascade = load_cascade(args.cascade)
+    router = LLMRouter()
+    first, final = cascade['stages'][0], cascade['stages'][-1]
+    with open(args.output, 'w') as out:
+        for record in read_jsonl(args.queries):
+            for key, stage in (('stage', first), ('final', final)):
+                if key == 'final' and not args.with_final:
+                    continue
+                provider = router.providers[stage['provider']]
+                provider.model = stage['model']
+                usage = {}
+                started = time.time()
+                answer = ''.join(provider.query(record['query'], stream=False, usage=usage))
+                record[f"{key}_latency"] = round(time.time() - started, 3)
+                if key == 'stage':
+                    record['answer'] = answer
+                    record['input_tokens'] = usage.get('input_tokens')
+                    record['output_tokens'] = usage.get('output_tokens')
+                else:
+                    record['final_answer'] = answer
+            out.write(json.dumps(record) + '\n')
+            print(f"✓ {record['query'][:60]!r}")
+
+
+def evaluate_records(records: list, cascade: dict, checks: dict) -> dict:
+    first, final = cascade['stages'][0], cascade['stages'][-1]
+    accepted = false_accepts = false_rejects = labelled = 0
+    cascade_cost = final_only_cost = 0.0
+    added_latency = []
+    for record in records:
+        metadata = QueryAnalyzer.analyze(record['query'])
+        verdict = AnswerChecker.evaluate(record['query'], record['answer'], metadata, checks)
+        input_tokens = record.get('input_tokens') or len(record['query']) // 4
+        output_tokens = record.get('output_tokens') or len(record['answer']) // 4
+
+        stage_cost = price(first, input_tokens, output_tokens)
+        final_cost = price(final, input_tokens, output_tokens)
+        final_only_cost += final_cost
+        cascade_cost += stage_cost if verdict['accepted'] else stage_cost + final_cost
+        if verdict['accepted']:
+            accepted += 1
+        elif 'stage_latency' in record:
+            added_latency.append(record['stage_latency'])
+
+        if 'label' in record:
+            labelled += 1
+            false_accepts += int(verdict['accepted'] and not record['label'])
+            false_rejects += int(not verdict['accepted'] and record['label'])
+
+    return {
+        'records': len(records),
+        'acceptance_rate': accepted / len(records),
+        'cascade_cost': cascade_cost,
+        'final_only_cost': final_only_cost,
+        'false_accept_rate': false_accepts / labelled if labelled else None,
+        'false_reject_rate': false_rejects / labelled if labelled else None,
+        'avg_added_latency': sum(added_latency) / len(added_latency) if added_latency else None
+    }
+
+
+def evaluate(args):
+    cascade = load_cascade(args.cascade)
+    records = [r for r in (from_compare(r, cascade) for r in read_jsonl(args.captured)) if r is not None]
+    if not records:
+        sys.exit('No records')
+    base_checks = cascade.get('checks', {})
+    thresholds = [round(0.3 + 0.1 * i, 1) for i in range(7)] if args.sweep else [None]
+
+    print(f"{'min_conf':>8} {'accept':>7} {'saved':>7} {'cost':>10} {'final-only':>10} "
+          f"{'false acc':>9} {'false rej':>9} {'+latency':>8}")
+    for threshold in thresholds:
+        checks = dict(base_checks)
+        if threshold is not None:
+            checks['min_confidence'] = threshold
+        report = evaluate_records(records, cascade, checks)
+        saved = 1 - report['cascade_cost'] / report['final_only_cost'] if report['final_only_cost'] else 0.0
+        fmt = lambda value, spec: format(value, spec) if value is not None else '-'
+        print(f"{fmt(checks.get('min_confidence', 'default'), '>8')} {report['acceptance_rate']:>7.1%} {saved:>7.1%} "
+              f"{report['cascade_cost']:>10.4f} {report['final_only_cost']:>10.4f} "
+              f"{fmt(report['false_accept_rate'], '>9.1%')} {fmt(report['false_reject_rate'], '>9.1%')} "
+              f"{fmt(report['avg_added_latency'], '>7.2f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline cascade evaluator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    capture_parser = commands.add_parser('capture', help='Capture first-stage answers from the providers')
+    capture_parser.add_argument('queries')
+    capture_parser.add_argument('output')
+    capture_parser.add_argument('--cascade', required=True)
+    capture_parser.add_argument('--with-final', action='store_true',
+                                help='Also capture the final stage answer and latency')
+    capture_parser.set_defaults(func=capture)
+
+    evaluate_parser = commands.add_parser('evaluate', help='Score the acceptance checks on captured answers')
+    evaluate_parser.add_argument('captured')
+    evaluate_parser.add_argument('--cascade', required=True)
+    evaluate_parser.add_argument('--sweep', action='store_true', help='Try min_confidence from 0.3 to 0.9')
+    evaluate_parser.set_defaults(func=evaluate)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Local stand-in for an OpenAI-compatible API
+
+Serves /v1/chat/completions (streaming and non-streaming) with a fixed
+number of tokens and a configurable delay, so benchmarks can exercise the
+full router without calling a real provider. /v1/embeddings returns
+deterministic vectors after a fixed per-call delay plus a small per-text
+delay, like a batched embedding API.
+
+Usage:
+    python -m benchmarks.fake_provider_server --port 8901 --tokens 50 --delay-ms 20
+"""
+import argparse
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Request handler emulating the OpenAI chat completions and embeddings APIs"""
+
+    protocol_version = 'HTTP/1.1'
+    # Send small responses immediately instead of waiting on delayed ACKs
+    disable_nagle_algorithm = True
+    tokens = 50
+    delay_ms = 20.0
+    # Extra characters appended to each token (for large answers without more chunks)
+    token_padding = 0
+    embed_delay_ms = 20.0
+    embed_item_delay_ms = 0.05
+    embedding_dim = 256
+    # Number of texts in each /embeddings call (set per server)
+    embedding_batches = None
+    # Times at which a client hung up mid-stream (set per server)
+    disconnect_times = None
+    # Seconds from first byte to [DONE] of each completed stream (set per server)
+    stream_durations = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith('/models'):
+            self._send_json({'object': 'list', 'data': [{'id': 'fake-model', 'object': 'model'}]})
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path.endswith('/chat/completions'):
+            self._chat_completions(body)
+        elif self.path.endswith('/embeddings'):
+            self._embeddings(body)
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def _embeddings(self, body):
+        texts = body.get('input', [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if self.embedding_batches is not None:
+            self.embedding_batches.append(len(texts))
+        time.sleep((self.embed_delay_ms + self.embed_item_delay_ms * len(texts)) / 1000)
+        self._send_json({
+            'object': 'list',
+            'model': body.get('model', 'fake-embedding'),
+            'data': [
+                {'object': 'embedding', 'index': index, 'embedding': self._vector(text, body.get('encoding_format'))}
+                for index, text in enumerate(texts)
+            ],
+            'usage': {
+                'prompt_tokens': sum(len(text) // 4 for text in texts),
+                'total_tokens': sum(len(text) // 4 for text in texts)
+            }
+        })
+
+    def _vector(self, text, encoding_format=None):
+        """Deterministic unit-scale vector derived from the text's hash"""
+        seed = hashlib.sha256(text.encode()).digest()
+        values = struct.unpack('<8i', seed)
+        vector = [values[i % 8] / 2 ** 31 for i in range(self.embedding_dim)]
+        if encoding_format == 'base64':
+            return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+        return vector
+
+    def _chat_completions(self, body):
+        model = body.get('model', 'fake-model')
+        # Honour max_tokens like the real APIs (one word per token here)
+        tokens = min(self.tokens, body.get('max_tokens') or self.tokens)
+        words = [f"tok{i}{'.' * self.token_padding} " for i in range(tokens)]
+
+        if not body.get('stream'):
+            time.sleep(self.delay_ms * tokens / 1000)
+            self._send_json({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(words)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': tokens, 'total_tokens': 10 + tokens}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        started = time.perf_counter()
+        try:
+            for word in words:
+                time.sleep(self.delay_ms / 1000)
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            if (body.get('stream_options') or {}).get('include_usage'):
+                usage_chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [],
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': tokens, 'total_tokens': 10 + tokens}
+                }
+                self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            if self.stream_durations is not None:
+                self.stream_durations.append(time.perf_counter() - started)
+        except (BrokenPipeError, ConnectionResetError):
+            if self.disconnect_times is not None:
+                self.disconnect_times.append(time.time())
+        self.close_connection = True
+
+
+def start_fake_server(
+    port: int = 0,
+    tokens: int = 50,
+    delay_ms: float = 20.0,
+    embed_delay_ms: float = 20.0,
+    token_padding: int = 0
+):
+    """
+    Start the fake provider in a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        tokens: Number of tokens each completion returns
+        delay_ms: Delay between streamed tokens
+        embed_delay_ms: Fixed delay of each /embeddings call
+        token_padding: Extra characters appended to each token
+
+    Returns:
+        Tuple of (server, base_url); server.RequestHandlerClass.disconnect_times
+        lists when clients hung up mid-stream, stream_durations how long
+        each completed stream took to send, and embedding_batches the size
+        of each /embeddings call
+    """
+    handler = type('ConfiguredHandler', (FakeProviderHandler,), {
+        'tokens': tokens,
+        'delay_ms': delay_ms,
+        'embed_delay_ms': embed_delay_ms,
+        'token_padding': token_padding,
+        'disconnect_times': [],
+        'stream_durations': [],
+        'embedding_batches': []
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible provider')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--delay-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.port, args.tokens, args.delay_ms)
+    print(f"Fake provider listening at {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,93 +1,207 @@
 """
 Troubleshooting script to check .env file configuration
+
+With --probe it instead measures connect time, time to first token and
+tokens/sec of every configured provider/model (or of a local stand-in
+endpoint with --endpoint) with a short fixed prompt, and writes the results
+to the latency baseline file the router seeds its estimates from.
+--endpoint and --ci probe without writing the baseline unless --output is
+given; --ci exits non-zero when a probe fails or regresses past the
+thresholds.
+
+Usage:
+    python check_config.py
+    python check_config.py --probe
+    python check_config.py --probe --endpoint http://localhost:11434/v1 --model llama3.1:8b
+    python check_config.py --ci --baseline latency_baseline.json --max-regression 0.5 --max-ttft-ms 2000
 """
+import argparse
+import json
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
-print("=" * 60)
-print("🔍 LLM Router - Configuration Troubleshooter")
-print("=" * 60)
-
-# Check if .env file exists
-env_file = Path('.env')
-if not env_file.exists():
-    print("\n❌ ERROR: .env file not found!")
-    print("   Please create it by copying .env.example:")
-    print("   copy .env.example .env")
-    exit(1)
-else:
-    print(f"\n✓ .env file found at: {env_file.absolute()}")
-
-# Load environment variables
-load_dotenv()
-
-print("\n" + "=" * 60)
-print("Checking API Keys...")
-print("=" * 60)
-
-# Check each API key
-keys_found = 0
-
-# OpenAI
-openai_key = os.getenv('OPENAI_API_KEY', '')
-if openai_key and openai_key != 'your_openai_api_key_here':
-    if openai_key.startswith('sk-'):
-        print("\n✓ OpenAI API Key: CONFIGURED")
-        print(f"  Format: {openai_key[:10]}...{openai_key[-4:]}")
-        keys_found += 1
+from utils.probe import find_regressions, load_baseline, run_probe, save_baseline
+
+
+def check_env():
+    """Check the .env file and the API keys it configures"""
+    print("=" * 60)
+    print("🔍 LLM Router - Configuration Troubleshooter")
+    print("=" * 60)
+
+    # Check if .env file exists
+    env_file = Path('.env')
+    if not env_file.exists():
+        print("\n❌ ERROR: .env file not found!")
+        print("   Please create it by copying .env.example:")
+        print("   copy .env.example .env")
+        exit(1)
+    else:
+        print(f"\n✓ .env file found at: {env_file.absolute()}")
+
+    # Load environment variables
+    load_dotenv()
+
+    print("\n" + "=" * 60)
+    print("Checking API Keys...")
+    print("=" * 60)
+
+    # Check each API key
+    keys_found = 0
+
+    # OpenAI
+    openai_key = os.getenv('OPENAI_API_KEY', '')
+    if openai_key and openai_key != 'your_openai_api_key_here':
+        if openai_key.startswith('sk-'):
+            print("\n✓ OpenAI API Key: CONFIGURED")
+            print(f"  Format: {openai_key[:10]}...{openai_key[-4:]}")
+            keys_found += 1
+        else:
+            print("\n⚠ OpenAI API Key: INVALID FORMAT")
+            print("  Should start with 'sk-'")
+    else:
+        print("\n✗ OpenAI API Key: NOT CONFIGURED")
+        print("  Add: OPENAI_API_KEY=sk-proj-your_key_here")
+
+    # Anthropic
+    anthropic_key = os.getenv('ANTHROPIC_API_KEY', '')
+    if anthropic_key and anthropic_key != 'your_anthropic_api_key_here':
+        if anthropic_key.startswith('sk-ant-'):
+            print("\n✓ Anthropic API Key: CONFIGURED")
+            print(f"  Format: {anthropic_key[:10]}...{anthropic_key[-4:]}")
+            keys_found += 1
+        else:
+            print("\n⚠ Anthropic API Key: INVALID FORMAT")
+            print("  Should start with 'sk-ant-'")
     else:
-        print("\n⚠ OpenAI API Key: INVALID FORMAT")
-        print("  Should start with 'sk-'")
-else:
-    print("\n✗ OpenAI API Key: NOT CONFIGURED")
-    print("  Add: OPENAI_API_KEY=sk-proj-your_key_here")
-
-# Anthropic
-anthropic_key = os.getenv('ANTHROPIC_API_KEY', '')
-if anthropic_key and anthropic_key != 'your_anthropic_api_key_here':
-    if anthropic_key.startswith('sk-ant-'):
-        print("\n✓ Anthropic API Key: CONFIGURED")
-        print(f"  Format: {anthropic_key[:10]}...{anthropic_key[-4:]}")
-        keys_found += 1
+        print("\n✗ Anthropic API Key: NOT CONFIGURED")
+        print("  Add: ANTHROPIC_API_KEY=sk-ant-your_key_here")
+
+    # Google
+    google_key = os.getenv('GOOGLE_API_KEY', '')
+    if google_key and google_key != 'your_google_api_key_here':
+        if google_key.startswith('AIzaSy'):
+            print("\n✓ Google API Key: CONFIGURED")
+            print(f"  Format: {google_key[:10]}...{google_key[-4:]}")
+            keys_found += 1
+        else:
+            print("\n⚠ Google API Key: INVALID FORMAT")
+            print("  Should start with 'AIzaSy'")
     else:
-        print("\n⚠ Anthropic API Key: INVALID FORMAT")
-        print("  Should start with 'sk-ant-'")
-else:
-    print("\n✗ Anthropic API Key: NOT CONFIGURED")
-    print("  Add: ANTHROPIC_API_KEY=sk-ant-your_key_here")
-
-# Google
-google_key = os.getenv('GOOGLE_API_KEY', '')
-if google_key and google_key != 'your_google_api_key_here':
-    if google_key.startswith('AIzaSy'):
-        print("\n✓ Google API Key: CONFIGURED")
-        print(f"  Format: {google_key[:10]}...{google_key[-4:]}")
-        keys_found += 1
+        print("\n✗ Google API Key: NOT CONFIGURED")
+        print("  Add: GOOGLE_API_KEY=AIzaSy_your_key_here")
+
+    print("\n" + "=" * 60)
+    print(f"Summary: {keys_found} API key(s) configured")
+    print("=" * 60)
+
+    if keys_found == 0:
+        print("\n❌ NO API KEYS CONFIGURED!")
+        print("\nCommon issues:")
+        print("1. Make sure you copied .env.example to .env")
+        print("2. Replace the placeholder text with your actual keys")
+        print("3. Remove any quotes around the keys")
+        print("4. Make sure there are no extra spaces")
+        print("\nExample .env file:")
+        print("  OPENAI_API_KEY=sk-proj-abc123...")
+        print("  ANTHROPIC_API_KEY=sk-ant-xyz789...")
+        print("  GOOGLE_API_KEY=AIzaSy123456...")
     else:
-        print("\n⚠ Google API Key: INVALID FORMAT")
-        print("  Should start with 'AIzaSy'")
-else:
-    print("\n✗ Google API Key: NOT CONFIGURED")
-    print("  Add: GOOGLE_API_KEY=AIzaSy_your_key_here")
-
-print("\n" + "=" * 60)
-print(f"Summary: {keys_found} API key(s) configured")
-print("=" * 60)
-
-if keys_found == 0:
-    print("\n❌ NO API KEYS CONFIGURED!")
-    print("\nCommon issues:")
-    print("1. Make sure you copied .env.example to .env")
-    print("2. Replace the placeholder text with your actual keys")
-    print("3. Remove any quotes around the keys")
-    print("4. Make sure there are no extra spaces")
-    print("\nExample .env file:")
-    print("  OPENAI_API_KEY=sk-proj-abc123...")
-    print("  ANTHROPIC_API_KEY=sk-ant-xyz789...")
-    print("  GOOGLE_API_KEY=AIzaSy123456...")
-else:
-    print(f"\n✓ Configuration looks good! {keys_found} provider(s) available.")
-    print("\nYou can now run: python app.py")
-
-print("\n" + "=" * 60)
+        print(f"\n✓ Configuration looks good! {keys_found} provider(s) available.")
+        print("\nYou can now run: python app.py")
+
+    print("\n" + "=" * 60)
+
+
+def probe(args) -> int:
+    """
+    Run the latency probe, write the baseline and check it for regressions
+
+    Args:
+        args: Parsed command line arguments
+
+    Returns:
+        Process exit code
+    """
+    from config import Config
+
+    print("=" * 60)
+    print("⏱ LLM Router - Latency Probe")
+    print("=" * 60)
+
+    if args.endpoint:
+        from providers.openai_compatible_provider import OpenAICompatibleProvider
+        standin = OpenAICompatibleProvider(args.api_key, args.model, name='standin', base_url=args.endpoint)
+        baseline = run_probe({'standin': standin}, [('standin', args.model)], args.samples)
+    else:
+        from llm_router import LLMRouter
+        router = LLMRouter()
+        baseline = run_probe(router.providers, router.probe_targets(), args.samples)
+
+    for key, result in baseline['results'].items():
+        if result['ok']:
+            rate = result['tokens_per_second']
+            print(f"\n✓ {key}")
+            print(f"  connect {result.get('connect_ms', '-')} ms, TTFT {result['ttft_ms']} ms, "
+                  f"latency {result['latency_ms']} ms, {rate if rate is not None else '-'} tokens/s")
+        else:
+            print(f"\n✗ {key}: {result['error']}")
+    if not baseline['results']:
+        print("\n✗ Nothing to probe: no providers are configured")
+
+    # A stand-in probe or a CI run must not replace the baseline routing is seeded from
+    output = args.output or (None if args.ci or args.endpoint else Config.LATENCY_BASELINE_FILE)
+    previous = load_baseline(args.baseline or output)
+    if output:
+        save_baseline(baseline, output)
+        print(f"\n✓ Baseline written to {output}")
+
+    print("\n" + "=" * 60)
+    if not args.ci:
+        return 0
+    if args.json:
+        print(json.dumps(baseline, indent=2))
+    problems = find_regressions(
+        baseline,
+        previous,
+        tolerance=args.max_regression,
+        max_ttft_ms=args.max_ttft_ms,
+        min_tokens_per_second=args.min_tps
+    )
+    if not baseline['results']:
+        problems.append('no providers were probed')
+    for problem in problems:
+        print(f"✗ {problem}")
+    if problems:
+        print(f"\n❌ {len(problems)} latency regression(s)")
+        return 1
+    print(f"✓ No latency regressions ({'compared with ' + (args.baseline or output) if previous else 'no previous baseline'})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the configuration and probe provider latency')
+    parser.add_argument('--probe', action='store_true', help='Measure provider latency and write the baseline')
+    parser.add_argument('--ci', action='store_true', help='Probe and exit non-zero on failures or regressions')
+    parser.add_argument('--endpoint', help='Probe this OpenAI-compatible URL instead of the configured providers')
+    parser.add_argument('--model', default='gpt-4o-mini', help='Model to probe at --endpoint')
+    parser.add_argument('--api-key', default='', help='API key for --endpoint')
+    parser.add_argument('--samples', type=int, default=3, help='Probe requests per model (medians are reported)')
+    parser.add_argument('--output', help='Baseline file to write (default: LATENCY_BASELINE_FILE; none with --ci or --endpoint)')
+    parser.add_argument('--baseline', help='Previous baseline to compare with (default: the output file)')
+    parser.add_argument('--max-regression', type=float, default=0.5,
+                        help='Allowed relative slowdown of connect time/TTFT/tokens per second')
+    parser.add_argument('--max-ttft-ms', type=float, help='Fail when a TTFT exceeds this')
+    parser.add_argument('--min-tps', type=float, help='Fail when tokens per second fall below this')
+    parser.add_argument('--json', action='store_true', help='Also print the probe results as JSON (with --ci)')
+    args = parser.parse_args()
+
+    if args.probe or args.ci or args.endpoint:
+        sys.exit(probe(args))
+    check_env()
+
+
+if __name__ == '__main__':
+    main()
@@ -21,7 +21,148 @@ class Config:
     # Request Configuration
     REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))
     MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
+
+    # Conversation Sessions (kept in memory, per worker process)
+    MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', 1000))
+    SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', 3600))
+    SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', 200))
+    SESSION_RESPONSE_RESERVE_TOKENS = int(os.getenv('SESSION_RESPONSE_RESERVE_TOKENS', 1024))
+    
+    # Provider-side prompt caching of long, recurring prefixes
+    PROMPT_CACHE_ENABLED = os.getenv('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+    PROMPT_CACHE_MIN_TOKENS = int(os.getenv('PROMPT_CACHE_MIN_TOKENS', 1024))
+    PROMPT_CACHE_MIN_HITS = int(os.getenv('PROMPT_CACHE_MIN_HITS', 2))
+    
+    # Import provider SDKs and build clients in the background at startup
+    # instead of on the first request
+    PREWARM_PROVIDERS = os.getenv('PREWARM_PROVIDERS', 'false').lower() == 'true'
     
+    # Latency baseline written by the startup probe (python check_config.py
+    # --probe, or PROBE_ON_STARTUP). At startup the router seeds each
+    # provider's latency stats from it until live samples exist, and tries
+    # providers whose probe failed last until they answer a request.
+    LATENCY_BASELINE_FILE = os.getenv('LATENCY_BASELINE_FILE', 'latency_baseline.json')
+    PROBE_ON_STARTUP = os.getenv('PROBE_ON_STARTUP', 'false').lower() == 'true'
+    PROBE_SAMPLES = int(os.getenv('PROBE_SAMPLES', 3))
+    
+    # Production Server Configuration (see gunicorn.conf.py)
+    WORKERS = int(os.getenv('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+    WORKER_THREADS = int(os.getenv('WORKER_THREADS', 16))
+    WORKER_TIMEOUT = int(os.getenv('WORKER_TIMEOUT', 120))
+    PRELOAD_APP = os.getenv('PRELOAD_APP', 'true').lower() == 'true'
+
+    # Tenant identity for fair sharing, budgets and usage. TENANT_API_KEYS
+    # maps X-API-Key values to tenants ("key1:acme,key2:globex"); when set,
+    # requests without a listed key are rejected. TENANT_HEADER names a
+    # header set by a trusted gateway in front of the app. Otherwise the
+    # tenant is the client address; client-chosen tenant names are ignored.
+    TENANT_API_KEYS = dict(
+        pair.strip().rsplit(':', 1) for pair in os.getenv('TENANT_API_KEYS', '').split(',') if ':' in pair
+    )
+    TENANT_HEADER = os.getenv('TENANT_HEADER', '')
+
+    # Shared state server used by all workers (empty = per-process stats)
+    SHARED_STATE_SOCKET = os.getenv('SHARED_STATE_SOCKET', '')
+
+    # Request scheduler (per worker process). Keep the slot count below
+    # WORKER_THREADS so queued requests can still be accepted and ordered
+    # by priority instead of waiting in the server's accept queue.
+    SCHEDULER_MAX_CONCURRENT = int(os.getenv('SCHEDULER_MAX_CONCURRENT', max(1, WORKER_THREADS * 3 // 4)))
+    SCHEDULER_QUEUE_TIMEOUT = float(os.getenv('SCHEDULER_QUEUE_TIMEOUT', 30))
+    # A queued request holds a worker thread too: requests that would queue
+    # past the threads left over are rejected (429) rather than waiting
+    SCHEDULER_MAX_QUEUED = int(os.getenv('SCHEDULER_MAX_QUEUED', max(1, WORKER_THREADS - SCHEDULER_MAX_CONCURRENT)))
+    PROVIDER_MAX_CONCURRENCY = int(os.getenv('PROVIDER_MAX_CONCURRENCY', 32))
+    BULKHEAD_WAIT_SECONDS = float(os.getenv('BULKHEAD_WAIT_SECONDS', 0.5))
+
+    # Per-tenant budgets (limits live in the "budgets" section of the
+    # routing rules). Output size assumed when a request sets no max_tokens.
+    BUDGET_STATE_FILE = os.getenv('BUDGET_STATE_FILE', 'budget_state.json')
+    BUDGET_FLUSH_SECONDS = float(os.getenv('BUDGET_FLUSH_SECONDS', 30))
+    BUDGET_ESTIMATE_MAX_TOKENS = int(os.getenv('BUDGET_ESTIMATE_MAX_TOKENS', 1024))
+
+    # Usage ledger (SQLite; empty path disables it)
+    USAGE_LEDGER_PATH = os.getenv('USAGE_LEDGER_PATH', 'usage.db')
+    USAGE_RETENTION_DAYS = int(os.getenv('USAGE_RETENTION_DAYS', 30))
+
+    # Seconds between updates on /api/stats/stream (clients may ask for
+    # another rate with ?interval=)
+    STATS_STREAM_INTERVAL = float(os.getenv('STATS_STREAM_INTERVAL', 1.0))
+    # Each open stream holds a worker thread, so at most
+    # STATS_STREAM_MAX_SUBSCRIBERS streams are served per process (others get
+    # a 503 and poll /api/stats/live), and a stream ends after
+    # STATS_STREAM_MAX_SECONDS (EventSource reconnects on its own)
+    STATS_STREAM_MAX_SUBSCRIBERS = int(os.getenv('STATS_STREAM_MAX_SUBSCRIBERS', 4))
+    STATS_STREAM_MAX_SECONDS = float(os.getenv('STATS_STREAM_MAX_SECONDS', 300))
+
+    # Embeddings: concurrent requests are coalesced into upstream batches of
+    # up to EMBED_MAX_BATCH_SIZE texts, waiting at most EMBED_MAX_WAIT_MS
+    EMBED_MAX_BATCH_SIZE = int(os.getenv('EMBED_MAX_BATCH_SIZE', 64))
+    EMBED_MAX_WAIT_MS = float(os.getenv('EMBED_MAX_WAIT_MS', 5))
+    EMBED_MAX_IN_FLIGHT = int(os.getenv('EMBED_MAX_IN_FLIGHT', 4))
+    EMBED_CACHE_ENTRIES = int(os.getenv('EMBED_CACHE_ENTRIES', 10000))
+    EMBED_MAX_INPUTS = int(os.getenv('EMBED_MAX_INPUTS', 2048))
+
+    # Queries run concurrently per /api/ws connection (each holds a thread
+    # outside the server's WORKER_THREADS while it runs)
+    WS_MAX_IN_FLIGHT = int(os.getenv('WS_MAX_IN_FLIGHT', 32))
+
+    # Upstream streams are read on their own thread into a per-request
+    # buffer so slow clients do not stall the provider connection. Past
+    # STREAM_BUFFER_MAX_BYTES in memory, chunks spill to a temp file in
+    # STREAM_BUFFER_SPILL_DIR (if set), else the reader waits for the client
+    STREAM_BUFFER_ENABLED = os.getenv('STREAM_BUFFER_ENABLED', 'true').lower() == 'true'
+    STREAM_BUFFER_MAX_BYTES = int(os.getenv('STREAM_BUFFER_MAX_BYTES', 1 << 20))
+    STREAM_BUFFER_SPILL_DIR = os.getenv('STREAM_BUFFER_SPILL_DIR', '')
+    STREAM_BUFFER_SPILL_MAX_BYTES = int(os.getenv('STREAM_BUFFER_SPILL_MAX_BYTES', 64 << 20))
+
+    # Compare mode: at most COMPARE_MAX_TARGETS providers/models per
+    # request; saved runs are appended to COMPARE_RESULTS_FILE
+    COMPARE_MAX_TARGETS = int(os.getenv('COMPARE_MAX_TARGETS', 6))
+    COMPARE_RESULTS_FILE = os.getenv('COMPARE_RESULTS_FILE', 'compare_results.jsonl')
+
+    # Shadow traffic ("shadows" in the routing rules): at most
+    # SHADOW_MAX_CONCURRENT mirrored requests per worker, and only while the
+    # candidate provider keeps SHADOW_PROVIDER_HEADROOM bulkhead slots free
+    # for production. A shadow is cancelled after SHADOW_TIMEOUT seconds.
+    SHADOW_MAX_CONCURRENT = int(os.getenv('SHADOW_MAX_CONCURRENT', 2))
+    SHADOW_PROVIDER_HEADROOM = int(os.getenv('SHADOW_PROVIDER_HEADROOM', 4))
+    SHADOW_TIMEOUT = float(os.getenv('SHADOW_TIMEOUT', 120))
+
+    # Output length prediction per query type/complexity, from past answers:
+    # the OUTPUT_PREDICTION_QUANTILE percentile times the margin. 'estimate'
+    # uses it for budget checks, context reserve and output_tokens_min/max
+    # rule conditions; 'enforce' also sends it as max_tokens when the
+    # request sets none (longer answers are cut); 'off' disables it
+    OUTPUT_PREDICTION = os.getenv('OUTPUT_PREDICTION', 'estimate').lower()
+    OUTPUT_PREDICTION_QUANTILE = float(os.getenv('OUTPUT_PREDICTION_QUANTILE', 95))
+    OUTPUT_PREDICTION_MARGIN = float(os.getenv('OUTPUT_PREDICTION_MARGIN', 1.25))
+    OUTPUT_PREDICTION_MIN_SAMPLES = int(os.getenv('OUTPUT_PREDICTION_MIN_SAMPLES', 50))
+    OUTPUT_PREDICTION_MIN_TOKENS = int(os.getenv('OUTPUT_PREDICTION_MIN_TOKENS', 256))
+    OUTPUT_PREDICTION_MAX_TOKENS = int(os.getenv('OUTPUT_PREDICTION_MAX_TOKENS', 4096))
+
+    # Prompt compaction for routing rules with "compact" set: inputs shorter
+    # than COMPACT_MIN_CHARS are left alone, and blocks longer than
+    # COMPACT_MAX_BLOCK_LINES keep only their first and last lines (both
+    # can be overridden per rule)
+    COMPACT_MIN_CHARS = int(os.getenv('COMPACT_MIN_CHARS', 2000))
+    COMPACT_MAX_BLOCK_LINES = int(os.getenv('COMPACT_MAX_BLOCK_LINES', 400))
+
+    # Request tracing: spans per phase and fallback attempt, exported as
+    # OTLP/JSON. TRACE_SAMPLE_RATE keeps that fraction of traces up front;
+    # slower (TRACE_TAIL_LATENCY_MS > 0) or failed (TRACE_TAIL_ERRORS)
+    # requests are kept as well. Off unless an export target is set.
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))
+    TRACE_TAIL_LATENCY_MS = float(os.getenv('TRACE_TAIL_LATENCY_MS', 0))
+    TRACE_TAIL_ERRORS = os.getenv('TRACE_TAIL_ERRORS', 'true').lower() == 'true'
+    TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE', '')
+    TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', '')
+
+    # /api/debug/profile is disabled unless this token is set; callers send
+    # it in X-Debug-Token. It also lets /api/budgets/<tenant> show any tenant
+    DEBUG_PROFILE_TOKEN = os.getenv('DEBUG_PROFILE_TOKEN', '')
+    PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+
     # Routing Rules
     ROUTING_RULES_FILE = 'routing_rules.json'
     
@@ -47,34 +188,41 @@ class Config:
             "default_provider": "openai",
             "default_model": "gpt-3.5-turbo",
             "timeout_seconds": 30,
-            "max_retries": 3
+            "max_retries": 3,
+            "resume_on_failure": True
         }
     
+    @classmethod
+    def get_api_key(cls, setting):
+        """Return the API key stored in a Config attribute or environment variable"""
+        if not setting:
+            return ''
+        return getattr(cls, setting, None) or os.getenv(setting, '')
+    
     @classmethod
     def get_available_providers(cls):
-        """Return list of providers with configured API keys"""
+        """Return list of registered providers that are usable (key configured or not needed)"""
+        from providers.registry import PROVIDER_REGISTRY
+        
         providers = []
-        if cls.OPENAI_API_KEY:
-            providers.append('openai')
-        if cls.ANTHROPIC_API_KEY:
-            providers.append('anthropic')
-        if cls.GOOGLE_API_KEY:
-            providers.append('google')
+        for name, spec in PROVIDER_REGISTRY.items():
+            if spec.get('api_key_setting') is None or cls.get_api_key(spec['api_key_setting']):
+                providers.append(name)
         return providers
     
     @classmethod
     def validate_config(cls):
         """Validate configuration and return any warnings"""
+        from providers.registry import PROVIDER_REGISTRY
+        
         warnings = []
         
-        if not cls.OPENAI_API_KEY:
-            warnings.append("OpenAI API key not configured")
-        if not cls.ANTHROPIC_API_KEY:
-            warnings.append("Anthropic API key not configured")
-        if not cls.GOOGLE_API_KEY:
-            warnings.append("Google API key not configured")
+        for name, spec in PROVIDER_REGISTRY.items():
+            setting = spec.get('api_key_setting')
+            if setting is not None and not cls.get_api_key(setting):
+                warnings.append(f"{spec.get('label', name)} API key not configured")
         
-        if not any([cls.OPENAI_API_KEY, cls.ANTHROPIC_API_KEY, cls.GOOGLE_API_KEY]):
+        if not cls.get_available_providers():
             warnings.append("WARNING: No API keys configured! Please add at least one API key to .env file")
         
         return warnings
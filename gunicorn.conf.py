@@ -0,0 +1,68 @@
+"""
+Gunicorn configuration for running the LLM router in production
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+
+All settings are derived from Config, so the same .env file drives both the
+development server and production. Workers use threads (gthread) because
+each streaming response holds a thread for its whole duration.
+
+Provider stats are kept in a shared state server started by the master
+process, so /api/providers reports fleet-wide numbers from any worker.
+"""
+import os
+import secrets
+import tempfile
+
+# Must be set before Config is imported so workers inherit them
+os.environ.setdefault(
+    'SHARED_STATE_SOCKET',
+    os.path.join(tempfile.gettempdir(), f'llm-router-{os.getpid()}.sock')
+)
+os.environ.setdefault('SHARED_STATE_AUTHKEY', secrets.token_hex(16))
+
+from config import Config
+from utils.shared_state import start_shared_state_server
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WORKERS
+worker_class = 'gthread'
+# Every in-flight query and every open /api/stats/stream subscriber holds one
+# of these threads for its whole duration. Live stats streams are capped per
+# worker (STATS_STREAM_MAX_SUBSCRIBERS) so open browser tabs cannot take all
+# of them; keep WORKER_THREADS well above that cap.
+threads = Config.WORKER_THREADS
+timeout = Config.WORKER_TIMEOUT
+graceful_timeout = Config.WORKER_TIMEOUT
+keepalive = 5
+
+# Import the app (and create the router) once in the master so that workers
+# start from a warm, copy-on-write image. Provider SDKs and clients are only
+# loaded on first use, so nothing fork-unsafe (e.g. grpc) exists yet.
+preload_app = Config.PRELOAD_APP
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Start the shared state server before any worker is forked"""
+    start_shared_state_server(
+        os.environ['SHARED_STATE_SOCKET'],
+        os.environ['SHARED_STATE_AUTHKEY']
+    )
+    server.log.info(f"Shared state server listening on {os.environ['SHARED_STATE_SOCKET']}")
+
+
+def post_fork(server, worker):
+    """Pre-warm provider SDKs in each worker (and run the startup latency probe), after fork"""
+    if Config.PREWARM_PROVIDERS:
+        from app import router
+        router.prewarm()
+    # One worker probes; its results reach the others through the shared
+    # stats store
+    if Config.PROBE_ON_STARTUP and worker.age == 1:
+        from app import router
+        router.probe_latency(samples=Config.PROBE_SAMPLES)
+
@@ -1,8 +1,30 @@
-from typing import Dict, Any, Optional, Generator, List
+from typing import Callable, Dict, Any, Optional, Generator, List
+import hashlib
+import json
+import queue
+import random
+import threading
 import time
 from config import Config
-from providers import OpenAIProvider, AnthropicProvider, GoogleProvider, BaseProvider
-from utils import QueryAnalyzer, TokenCounter
+from providers import BaseProvider, PROVIDER_REGISTRY, get_provider_class
+from providers.registry import register_config_providers, register_entry_point_providers
+from utils import QueryAnalyzer, TokenCounter, ConversationStore, Conversation, PrefixIndex
+from utils.cancellation import CancelToken, RequestCancelled
+from utils.scheduler import RequestScheduler, SchedulerTimeout
+from utils.budget import BudgetManager, BudgetExceeded, StreamBudget
+from utils.usage_ledger import UsageLedger
+from utils.metrics import Histogram
+from utils.micro_batcher import MicroBatcher
+from utils.embedding_cache import EmbeddingCache
+from utils.cascade import AnswerChecker
+from utils.tracing import Tracer, PhaseRecorder, NOOP_TRACE
+from utils.stream_buffer import BufferedStream, checked_stream
+from utils.length_predictor import OutputLengthPredictor
+from utils.compactor import PromptCompactor
+from utils.probe import load_baseline, run_probe, save_baseline
+from utils.shadow import ShadowPool, PrimaryResult, lexical_similarity, vector_similarity
+from utils.shared_state import get_stats_store
+from utils.stream_resume import build_continuation, trim_repeated_prefix
 
 class LLMRouter:
     """Main routing engine for LLM providers"""
@@ -13,127 +35,292 @@ class LLMRouter:
         self.routing_rules = Config.load_routing_rules()
         self.providers: Dict[str, BaseProvider] = {}
         self.provider_status: Dict[str, Dict[str, Any]] = {}  # Track all provider statuses
+        self.conversations = ConversationStore(
+            max_sessions=Config.MAX_SESSIONS,
+            ttl_seconds=Config.SESSION_TTL_SECONDS,
+            max_messages=Config.SESSION_MAX_MESSAGES
+        )
+        self.prefix_index = PrefixIndex(
+            min_tokens=Config.PROMPT_CACHE_MIN_TOKENS,
+            min_hits=Config.PROMPT_CACHE_MIN_HITS
+        )
+        scheduler_rules = self.routing_rules.get('scheduler', {})
+        self.scheduler = RequestScheduler(
+            max_concurrent=Config.SCHEDULER_MAX_CONCURRENT,
+            queue_timeout=Config.SCHEDULER_QUEUE_TIMEOUT,
+            class_shares=scheduler_rules.get('class_shares'),
+            tenant_weights=scheduler_rules.get('tenant_weights'),
+            provider_limits=scheduler_rules.get('provider_concurrency'),
+            default_provider_limit=Config.PROVIDER_MAX_CONCURRENCY,
+            max_queued=Config.SCHEDULER_MAX_QUEUED
+        )
+        self.budgets = BudgetManager(
+            self.routing_rules.get('budgets'),
+            state_file=Config.BUDGET_STATE_FILE,
+            flush_interval=Config.BUDGET_FLUSH_SECONDS
+        )
+        self.ledger = UsageLedger(
+            Config.USAGE_LEDGER_PATH,
+            retention_days=Config.USAGE_RETENTION_DAYS
+        ) if Config.USAGE_LEDGER_PATH else None
+        # Bucket layout of the shared latency histograms
+        self.latency_buckets = Histogram()
+        # Bucket layout (bytes) of the stream buffer high-water histograms
+        self.buffer_buckets = Histogram(buckets=(4096, 16384, 65536, 262144, 1 << 20, 4 << 20, 16 << 20, 64 << 20))
+        # Bucket layout of the shadow output similarity histograms
+        self.similarity_buckets = Histogram(buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0))
+        self.shadow_pool = ShadowPool(Config.SHADOW_MAX_CONCURRENT)
+        self.length_predictor = OutputLengthPredictor(
+            quantile=Config.OUTPUT_PREDICTION_QUANTILE,
+            margin=Config.OUTPUT_PREDICTION_MARGIN,
+            min_samples=Config.OUTPUT_PREDICTION_MIN_SAMPLES,
+            min_tokens=Config.OUTPUT_PREDICTION_MIN_TOKENS,
+            max_tokens=Config.OUTPUT_PREDICTION_MAX_TOKENS
+        ) if Config.OUTPUT_PREDICTION != 'off' else None
+        self.embedding_cache = EmbeddingCache(max_entries=Config.EMBED_CACHE_ENTRIES)
+        self._embedding_batchers: Dict[tuple, MicroBatcher] = {}
+        self._embedding_lock = threading.Lock()
+        self.tracer = Tracer(
+            sample_rate=Config.TRACE_SAMPLE_RATE,
+            tail_latency_ms=Config.TRACE_TAIL_LATENCY_MS,
+            tail_errors=Config.TRACE_TAIL_ERRORS,
+            export_file=Config.TRACE_EXPORT_FILE,
+            otlp_endpoint=Config.TRACE_OTLP_ENDPOINT
+        )
         self._initialize_providers()
+        self.apply_latency_baseline(load_baseline(Config.LATENCY_BASELINE_FILE))
         
     def _initialize_providers(self):
-        """Initialize all available providers based on API keys"""
-        # Initialize OpenAI
-        if Config.OPENAI_API_KEY:
-            try:
-                self.providers['openai'] = OpenAIProvider(
-                    Config.OPENAI_API_KEY,
-                    'gpt-4'
-                )
-                self.provider_status['openai'] = {
-                    'available': True,
-                    'model': 'gpt-4',
-                    'error': None
-                }
-                print("✓ OpenAI provider initialized")
-            except Exception as e:
-                self.provider_status['openai'] = {
+        """Initialize all registered providers based on API keys
+        
+        Besides the built-in providers, this picks up providers declared in
+        the "providers" section of the routing rules (e.g. local
+        OpenAI-compatible servers) and those installed via entry points.
+        Provider SDKs are not imported here; each provider imports its SDK
+        and builds its client on first use (or when pre-warmed).
+        """
+        register_config_providers(self.routing_rules.get('providers', {}))
+        register_entry_point_providers()
+        
+        for name, spec in PROVIDER_REGISTRY.items():
+            model = spec.get('default_model', '')
+            requires_key = spec.get('api_key_setting') is not None
+            api_key = Config.get_api_key(spec.get('api_key_setting'))
+            
+            if requires_key and not api_key:
+                self.provider_status[name] = {
                     'available': False,
-                    'model': 'gpt-4',
-                    'error': str(e)
+                    'model': model,
+                    'error': 'API key not configured'
                 }
-                print(f"✗ Failed to initialize OpenAI: {e}")
-        else:
-            self.provider_status['openai'] = {
-                'available': False,
-                'model': 'gpt-4',
-                'error': 'API key not configured'
-            }
-        
-        # Initialize Anthropic
-        if Config.ANTHROPIC_API_KEY:
+                continue
+            
             try:
-                self.providers['anthropic'] = AnthropicProvider(
-                    Config.ANTHROPIC_API_KEY,
-                    'claude-3-sonnet-20240229'
-                )
-                self.provider_status['anthropic'] = {
+                provider_class = get_provider_class(name)
+                model = model or getattr(provider_class, 'DEFAULT_MODEL', '')
+                self.providers[name] = provider_class(api_key, model, **spec.get('options', {}))
+                self.provider_status[name] = {
                     'available': True,
-                    'model': 'claude-3-sonnet-20240229',
+                    'model': model,
                     'error': None
                 }
-                print("✓ Anthropic provider initialized")
+                print(f"✓ {spec['label']} provider initialized")
             except Exception as e:
-                self.provider_status['anthropic'] = {
+                self.provider_status[name] = {
                     'available': False,
-                    'model': 'claude-3-sonnet-20240229',
+                    'model': model,
                     'error': str(e)
                 }
-                print(f"✗ Failed to initialize Anthropic: {e}")
+                print(f"✗ Failed to initialize {spec['label']}: {e}")
+        
+        if not self.providers:
+            print("⚠ WARNING: No providers initialized! Please configure API keys in .env file")
+    
+    def prewarm(self, background: bool = True):
+        """
+        Import provider SDKs and build clients ahead of the first request
+        
+        Args:
+            background: Run on a daemon thread instead of blocking
+        """
+        def warm_all():
+            for name, provider in list(self.providers.items()):
+                try:
+                    provider.warm()
+                    print(f"✓ {name} provider pre-warmed")
+                except Exception as e:
+                    print(f"✗ Failed to pre-warm {name}: {e}")
+        
+        if background:
+            threading.Thread(target=warm_all, name='provider-prewarm', daemon=True).start()
         else:
-            self.provider_status['anthropic'] = {
-                'available': False,
-                'model': 'claude-3-sonnet-20240229',
-                'error': 'API key not configured'
-            }
+            warm_all()
+    
+    def probe_targets(self) -> List[tuple]:
+        """(provider, model) pairs to probe: each provider's default model and the routing rules' models"""
+        targets = [(name, provider.model) for name, provider in self.providers.items()]
+        for rule in self.routing_rules.get('rules', []):
+            target = (rule.get('provider'), rule.get('model'))
+            if target[0] in self.providers and target[1] and target not in targets:
+                targets.append(target)
+        return targets
+    
+    def probe_latency(self, samples: int = 3, background: bool = True):
+        """
+        Probe every provider, save the results as the latency baseline and seed from them
         
-        # Initialize Google
-        if Config.GOOGLE_API_KEY:
+        Args:
+            samples: Probe requests per provider/model
+            background: Run on a daemon thread instead of blocking
+        """
+        def probe():
+            baseline = run_probe(self.providers, self.probe_targets(), samples)
             try:
-                self.providers['google'] = GoogleProvider(
-                    Config.GOOGLE_API_KEY,
-                    'gemini-2.5-flash'
-                )
-                self.provider_status['google'] = {
-                    'available': True,
-                    'model': 'gemini-2.5-flash',
-                    'error': None
-                }
-                print("✓ Google provider initialized")
-            except Exception as e:
-                self.provider_status['google'] = {
-                    'available': False,
-                    'model': 'gemini-2.5-flash',
-                    'error': str(e)
-                }
-                print(f"✗ Failed to initialize Google: {e}")
+                save_baseline(baseline, Config.LATENCY_BASELINE_FILE)
+            except OSError as e:
+                print(f"⚠ Could not save latency baseline: {e}")
+            self.apply_latency_baseline(baseline)
+            print(f"✓ Latency probe finished for {len(baseline['results'])} model(s)")
+        
+        if background:
+            threading.Thread(target=probe, name='latency-probe', daemon=True).start()
         else:
-            self.provider_status['google'] = {
-                'available': False,
-                'model': 'gemini-2.5-flash',
-                'error': 'API key not configured'
+            probe()
+    
+    def apply_latency_baseline(self, baseline: Optional[Dict[str, Any]]):
+        """
+        Seed latency and health estimates from a probe baseline
+        
+        Each provider's baseline is the probe of its default model (or of
+        any model that answered). Until a provider has live samples, its
+        baseline TTFT and latency are reported in the live stats. Providers
+        whose every probe failed are moved to the end of the fallback order
+        until they answer a request. The seed lives in the shared stats
+        store, so one worker's probe reaches every worker; a baseline no
+        newer than the stored one is ignored, so a restarted worker does not
+        bring back the file it imported.
+        
+        Args:
+            baseline: Baseline document from utils.probe (None is ignored)
+        """
+        if not baseline:
+            return
+        store = get_stats_store()
+        generated_at = baseline.get('generated_at') or 0
+        stored = store.get('latency_baseline')
+        if any((entry.get('generated_at') or 0) >= generated_at for entry in stored.values()):
+            return
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        for result in baseline['results'].values():
+            if result.get('provider') in self.providers:
+                results.setdefault(result['provider'], []).append(result)
+        
+        seeded = {}
+        failed = []
+        for name, probes in results.items():
+            answered = [result for result in probes if result.get('ok')]
+            if not answered:
+                failed.append(name)
+                seeded[name] = {'generated_at': generated_at, 'probe_failed': True}
+                continue
+            chosen = next((result for result in answered if result['model'] == self.providers[name].model), answered[0])
+            seeded[name] = {
+                'model': chosen['model'],
+                'generated_at': generated_at,
+                'connect_ms': chosen.get('connect_ms'),
+                'ttft_ms': chosen['ttft_ms'],
+                'latency_ms': chosen['latency_ms'],
+                'samples': chosen.get('samples') or 1,
+                'tokens_per_second': chosen.get('tokens_per_second'),
+                'probe_failed': False
             }
         
-        if not self.providers:
-            print("⚠ WARNING: No providers initialized! Please configure API keys in .env file")
+        store.clear('latency_baseline')
+        for name, entry in seeded.items():
+            store.set_many('latency_baseline', name, entry)
+        if failed:
+            print(f"⚠ Latency probe failed for {', '.join(sorted(failed))}; trying them last until they answer")
     
-    def route_query(self, query: str, user_preference: Optional[str] = None) -> Dict[str, Any]:
+    def _analyze(self, query: str) -> Dict[str, Any]:
+        """QueryAnalyzer result plus the predicted answer length (None until known)"""
+        query_metadata = QueryAnalyzer.analyze(query)
+        query_metadata['predicted_output_tokens'] = (
+            self.length_predictor.predict(query_metadata) if self.length_predictor is not None else None
+        )
+        return query_metadata
+    
+    def route_query(
+        self,
+        query: str,
+        user_preference: Optional[str] = None,
+        conversation: Optional[Conversation] = None,
+        cascade: Any = None,
+        trace: Any = NOOP_TRACE
+    ) -> Dict[str, Any]:
         """
         Route a query to the best provider
         
         Args:
             query: User's query
             user_preference: Optional user-specified provider preference
+            conversation: Optional session the query belongs to
+            cascade: Cascade name to force, False to skip cascades, or None
+                to use the first matching cascade from the routing rules
+            trace: Request trace for the 'analyze' and 'rules' spans
             
         Returns:
             Dictionary with routing decision
         """
-        # Analyze the query
-        query_metadata = QueryAnalyzer.analyze(query)
+        # Analyze only the new message; the history's token count is cached
+        with trace.span('analyze'):
+            query_metadata = self._analyze(query)
+            if conversation is not None:
+                query_metadata['history_tokens'] = conversation.history_tokens()
+                query_metadata['token_count'] += query_metadata['history_tokens']
+        matched_cascade = None
+        matched_rule = None
+        rules_span = trace.span('rules')
         
         # If user specified a preference, try to use it
         if user_preference and user_preference in self.providers:
             selected_provider = user_preference
             selected_model = self.providers[user_preference].model
             reason = f"User preference: {user_preference}"
+        elif conversation is not None and conversation.provider in self.providers:
+            # Keep a session on one provider/model so its prompt cache stays warm
+            selected_provider = conversation.provider
+            selected_model = conversation.model
+            reason = f"Sticky session: {selected_provider}"
         else:
             # Apply routing rules
-            selected_provider, selected_model, reason = self._apply_routing_rules(query_metadata)
+            selected_provider, selected_model, reason, matched_rule = self._apply_routing_rules(query_metadata)
+            matched_cascade = self._match_cascade(query_metadata, cascade)
+            if matched_cascade is not None:
+                # The last stage is the model escalations (and fallbacks) use
+                final = matched_cascade['stages'][-1]
+                selected_provider, selected_model = final['provider'], final['model']
+                first = matched_cascade['stages'][0]
+                reason = (f"Cascade {matched_cascade['name']}: {first['provider']}/{first['model']} "
+                          f"-> {selected_provider}/{selected_model}")
         
-        return {
+        routing = {
             'provider': selected_provider,
             'model': selected_model,
             'reason': reason,
             'query_metadata': query_metadata,
             'fallback_order': self._get_fallback_order(selected_provider)
         }
+        if matched_rule is not None:
+            routing['rule'] = matched_rule
+        if matched_cascade is not None:
+            routing['cascade'] = matched_cascade
+        rules_span.set('provider', selected_provider)
+        rules_span.set('model', selected_model)
+        rules_span.end()
+        return routing
     
     def _apply_routing_rules(self, query_metadata: Dict[str, Any]) -> tuple:
-        """Apply routing rules to select the best provider"""
+        """Apply routing rules to select the best provider (and name the rule that matched)"""
         # Sort rules by priority
         rules = sorted(
             self.routing_rules.get('rules', []),
@@ -150,7 +337,7 @@ class LLMRouter:
                 if provider in self.providers:
                     # Update provider's model
                     self.providers[provider].model = model
-                    return provider, model, rule.get('description', rule['name'])
+                    return provider, model, rule.get('description', rule['name']), rule['name']
         
         # No rule matched, use default
         default_provider = self.routing_rules.get('default_provider', 'openai')
@@ -159,15 +346,47 @@ class LLMRouter:
         # Check if default provider is available
         if default_provider in self.providers:
             self.providers[default_provider].model = default_model
-            return default_provider, default_model, "Default routing"
+            return default_provider, default_model, "Default routing", None
         
         # If default not available, use first available provider
         if self.providers:
             first_provider = list(self.providers.keys())[0]
             first_model = self.providers[first_provider].model
-            return first_provider, first_model, "First available provider"
+            return first_provider, first_model, "First available provider", None
         
-        return None, None, "No providers available"
+        return None, None, "No providers available", None
+    
+    def _match_cascade(self, query_metadata: Dict[str, Any], requested: Any = None) -> Optional[Dict[str, Any]]:
+        """
+        Pick the cascade for a query from the "cascades" routing rules
+        
+        Args:
+            query_metadata: Query analysis
+            requested: Cascade name to force (its condition and enabled flag
+                are ignored), False to skip cascades, or None
+            
+        Returns:
+            Cascade with its available stages, or None
+        """
+        if requested is False:
+            return None
+        for cascade in self.routing_rules.get('cascades', []):
+            if isinstance(requested, str):
+                if cascade.get('name') != requested:
+                    continue
+            elif not cascade.get('enabled', True) or not self._rule_matches(cascade, query_metadata):
+                continue
+            
+            stages = [stage for stage in cascade.get('stages', []) if stage['provider'] in self.providers]
+            if len(stages) < 2:
+                continue
+            return {
+                'name': cascade['name'],
+                'stages': stages,
+                'speculative': cascade.get('speculative', False),
+                'checks': cascade.get('checks', {})
+            }
+        return None
     
     def _rule_matches(self, rule: Dict[str, Any], query_metadata: Dict[str, Any]) -> bool:
         """Check if a routing rule matches the query metadata"""
@@ -193,6 +412,15 @@ class LLMRouter:
             if condition['complexity'] != query_metadata['complexity']:
                 return False
         
+        # Check predicted answer length (no match while there is no prediction)
+        predicted = query_metadata.get('predicted_output_tokens')
+        if 'output_tokens_min' in condition:
+            if predicted is None or predicted < condition['output_tokens_min']:
+                return False
+        if 'output_tokens_max' in condition:
+            if predicted is None or predicted > condition['output_tokens_max']:
+                return False
+        
         return True
     
     def _get_fallback_order(self, primary_provider: str) -> List[str]:
@@ -223,114 +451,1609 @@ class LLMRouter:
                 if provider not in order:
                     order.append(provider)
         
+        # Providers whose startup probe failed go last until they answer
+        failed = self._probe_failed()
+        if failed:
+            order = [p for p in order if p not in failed] + [p for p in order if p in failed]
+        
         return order
     
     def query_with_fallback(
         self,
         query: str,
         user_preference: Optional[str] = None,
-        stream: bool = True
+        stream: bool = True,
+        session_id: Optional[str] = None,
+        system: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        priority: Optional[str] = None,
+        tenant: str = 'default',
+        max_tokens: Optional[int] = None,
+        cascade: Any = None,
+        trace: Any = None
     ) -> Generator[Dict[str, Any], None, None]:
         """
         Query with automatic fallback on failure
         
+        The request first waits for a scheduler slot: interactive requests
+        are admitted before standard and batch ones, and tenants within a
+        class share slots fairly.
+        
+        A sampled share of requests matching a "shadows" rule is also
+        mirrored to that shadow's candidate model in the background; the
+        shadow never holds up this stream.
+        
         Args:
             query: User's query
             user_preference: Optional provider preference
             stream: Whether to stream responses
+            session_id: Optional conversation session; 'new' (or an unknown
+                id) starts a session whose id is returned in the routing event
+            system: Optional system prompt
+            cancel: Optional token cancelled when the client disconnects; the
+                upstream stream is closed and no fallback is attempted.
+                Closing this generator early has the same effect.
+            priority: Priority class ('interactive', 'standard', 'batch')
+            tenant: Tenant or API key identity for fair sharing and budgets
+            max_tokens: Optional cap on the answer length
+            cascade: Cascade name to force, or False to skip cascades
+            trace: Optional request trace started by the caller (which then
+                ends it); otherwise the router starts and ends its own
             
         Yields:
             Response chunks with metadata
         """
-        # Get routing decision
-        routing = self.route_query(query, user_preference)
-        fallback_order = routing['fallback_order']
+        started = time.time()
+        owns_trace = trace is None
+        if owns_trace:
+            trace = self.tracer.start('query', tenant=tenant)
+        trace.set('stream', stream)
+        queue_span = trace.start_span('queue', priority=priority or 'default')
+        try:
+            ticket = self.scheduler.acquire(priority, tenant, cancel)
+        except SchedulerTimeout as e:
+            queue_span.fail(e)
+            queue_span.end()
+            if owns_trace:
+                trace.end()
+            yield {
+                'type': 'error',
+                'data': {'error': str(e), 'queued': True}
+            }
+            return
+        except RequestCancelled:
+            queue_span.end()
+            if owns_trace:
+                trace.end()
+            return
+        queue_span.end()
         
-        # Yield routing decision
-        yield {
-            'type': 'routing',
-            'data': routing
-        }
+        events = self._query_with_fallback(
+            query, user_preference, stream, session_id, system, cancel, tenant, max_tokens, cascade, trace
+        )
+        outcome = {'status': 'error', 'provider': None, 'model': None, 'usage': {}, 'attempts': 0, 'ttft': None}
+        routing = None
+        shadow = None
+        try:
+            for event in events:
+                if event['type'] == 'routing':
+                    routing = event['data']
+                    routing['priority'] = ticket.priority
+                    routing['queue_time'] = round(ticket.queue_time, 3)
+                    shadow = self._start_shadow(query, system, max_tokens or routing.get('max_tokens'), routing)
+                elif shadow is not None:
+                    if event['type'] == 'content':
+                        shadow.add(event['data'])
+                    elif event['type'] == 'reset':
+                        shadow.reset()
+                self._track_outcome(event, outcome, started)
+                yield event
+        except GeneratorExit:
+            outcome['status'] = 'cancelled'
+            raise
+        finally:
+            events.close()
+            self.scheduler.release(ticket)
+            if cancel is not None and cancel.cancelled:
+                outcome['status'] = 'cancelled'
+            if outcome['status'] == 'ok':
+                self._record_latency(outcome, started)
+                if routing is not None and not max_tokens:
+                    self._record_output_length(routing, outcome)
+            if shadow is not None:
+                shadow.finish(outcome['status'], outcome['usage'])
+            self._record_ledger(tenant, ticket.priority, outcome, started)
+            self._finish_trace(trace, outcome, owns_trace)
+    
+    def query_once(self, query: str, **kwargs) -> Dict[str, Any]:
+        """
+        Run a query without streaming and collect the result
         
-        # Try each provider in fallback order
-        for provider_name in fallback_order:
-            if provider_name not in self.providers:
-                continue
+        Uses the providers' non-stream paths: one upstream response, with
+        exact usage wherever the API reports it.
+        
+        Args:
+            query: User's query
+            **kwargs: query_with_fallback options (except stream)
             
-            provider = self.providers[provider_name]
+        Returns:
+            Dictionary with answer, provider, model, usage, elapsed_time and
+            routing; on failure, error (and the queued / budget_exceeded
+            flag when set) instead of the answer. errors lists every failed
+            attempt.
+        """
+        result: Dict[str, Any] = {'answer': None, 'errors': []}
+        parts: List[str] = []
+        for event in self.query_with_fallback(query, stream=False, **kwargs):
+            kind, data = event['type'], event['data']
+            if kind == 'routing':
+                result['routing'] = data
+            elif kind == 'content':
+                parts.append(data)
+            elif kind == 'reset':
+                parts = []
+            elif kind == 'error':
+                result['errors'].append(data)
+            elif kind == 'complete':
+                result.update({
+                    'answer': ''.join(parts),
+                    'provider': data['provider'],
+                    'model': data['model'],
+                    'usage': data['usage'],
+                    'elapsed_time': data['elapsed_time']
+                })
+        
+        if result['answer'] is None:
+            last = result['errors'][-1] if result['errors'] else {}
+            result['error'] = last.get('error', 'Request cancelled')
+            for flag in ('queued', 'budget_exceeded'):
+                if last.get(flag):
+                    result[flag] = True
+        return result
+    
+    def resolve_compare_targets(self, spec: Any) -> tuple:
+        """
+        Validate the targets of a compare request
+        
+        Args:
+            spec: List of "provider", "provider/model" or
+                {"provider": ..., "model": ...} entries
+            
+        Returns:
+            Tuple of (list of {"provider", "model"} dicts, error message)
+        """
+        if not isinstance(spec, list) or not spec:
+            return None, 'compare must be a non-empty list of providers'
+        if len(spec) > Config.COMPARE_MAX_TARGETS:
+            return None, f"compare accepts at most {Config.COMPARE_MAX_TARGETS} targets"
+        targets = []
+        for entry in spec:
+            if isinstance(entry, str):
+                name, _, model = entry.partition('/')
+            elif isinstance(entry, dict):
+                name, model = entry.get('provider'), entry.get('model')
+            else:
+                return None, 'compare targets must be strings or objects'
+            if name not in self.providers:
+                return None, f"Provider not available: {name}"
+            targets.append({'provider': name, 'model': model or self.providers[name].model})
+        return targets, None
+    
+    def compare(
+        self,
+        query: str,
+        targets: List[Dict[str, str]],
+        system: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        priority: Optional[str] = None,
+        tenant: str = 'default',
+        max_tokens: Optional[int] = None,
+        save: bool = False,
+        trace: Any = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Send one query to several providers/models at once
+        
+        Every target streams concurrently, so the wall-clock time is that of
+        the slowest target rather than the sum. Events carry a "target"
+        index into targets: 'provider' and 'content' as for a routed query,
+        'error' when a target fails (no fallback) and 'target_complete' with
+        its TTFT, throughput (output tokens per second after the first
+        token), usage and cost. A final 'complete' event lists every
+        target's result side by side.
+        
+        Args:
+            query: User's query
+            targets: Resolved targets (see resolve_compare_targets)
+            system: Optional system prompt
+            cancel: Optional token cancelled when the client disconnects
+            priority: Priority class for the scheduler (one slot for all
+                targets; each target takes its provider's bulkhead slot)
+            tenant: Tenant identity; every target's spend is charged to it
+            max_tokens: Optional cap on each answer's length
+            save: Append the results, answers included, to
+                COMPARE_RESULTS_FILE
+            trace: Optional request trace started by the caller
             
+        Yields:
+            Response events
+        """
+        started = time.time()
+        owns_trace = trace is None
+        if owns_trace:
+            trace = self.tracer.start('compare', tenant=tenant)
+        trace.set('compare.targets', len(targets))
+        cancel = cancel or CancelToken()
+        query_metadata = self._analyze(query)
+        try:
+            ticket = self.scheduler.acquire(priority, tenant, cancel)
+        except (SchedulerTimeout, RequestCancelled) as e:
+            if owns_trace:
+                trace.end()
+            if isinstance(e, SchedulerTimeout):
+                yield {'type': 'error', 'data': {'error': str(e), 'queued': True}}
+            return
+        
+        events: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(targets)
+        reservation = None
+        try:
+            if self.budgets.enabled:
+                output_tokens = (max_tokens or query_metadata['predicted_output_tokens']
+                                 or Config.BUDGET_ESTIMATE_MAX_TOKENS)
+                estimate = sum(
+                    self.providers[t['provider']].estimate_cost(
+                        query_metadata['token_count'], output_tokens, model=t['model']
+                    ) for t in targets
+                )
+                try:
+                    reservation = self.budgets.check(
+                        tenant, estimate, (query_metadata['token_count'] + output_tokens) * len(targets)
+                    )['reservation']
+                except BudgetExceeded as e:
+                    yield {'type': 'error', 'data': {'error': str(e), 'budget_exceeded': True}}
+                    return
+            
+            yield {
+                'type': 'compare',
+                'data': {
+                    'targets': targets,
+                    'query_metadata': query_metadata,
+                    'priority': ticket.priority,
+                    'queue_time': round(ticket.queue_time, 3)
+                }
+            }
+            for index, target in enumerate(targets):
+                threading.Thread(
+                    target=self._compare_target,
+                    args=(index, target, query, system, cancel, tenant, ticket.priority,
+                          max_tokens, events, results, trace),
+                    name=f"compare-{index}",
+                    daemon=True
+                ).start()
+            
+            running = len(targets)
+            while running:
+                event = events.get()
+                if event is None:
+                    running -= 1
+                    continue
+                yield event
+            
+            wall_time = time.time() - started
+            saved = None
+            if save:
+                saved = self._save_compare(query, system, query_metadata, results)
+            yield {
+                'type': 'complete',
+                'data': {
+                    'mode': 'compare',
+                    'wall_time': round(wall_time, 3),
+                    'sum_time': round(sum(r['elapsed'] for r in results), 3),
+                    'results': [{k: v for k, v in r.items() if k != 'answer'} for r in results],
+                    'saved': saved
+                }
+            }
+        except GeneratorExit:
+            # Consumer went away: stop every target's upstream stream
+            cancel.cancel()
+            raise
+        finally:
+            if reservation is not None:
+                self.budgets.release(tenant, reservation)
+            self.scheduler.release(ticket)
+            if owns_trace:
+                trace.end()
+    
+    def compare_once(self, query: str, targets: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        Run a compare request and collect the results
+        
+        Args:
+            query: User's query
+            targets: Resolved targets (see resolve_compare_targets)
+            **kwargs: compare options
+            
+        Returns:
+            The final 'complete' data with each target's answer added, or
+            error (and the queued / budget_exceeded flag) on failure
+        """
+        answers: Dict[int, List[str]] = {index: [] for index in range(len(targets))}
+        result: Dict[str, Any] = {'error': 'Request cancelled'}
+        for event in self.compare(query, targets, **kwargs):
+            kind, data = event['type'], event['data']
+            if kind == 'content':
+                answers[event['target']].append(data)
+            elif kind == 'error' and 'target' not in event:
+                result = dict(data)
+            elif kind == 'complete':
+                result = data
+                for item in result['results']:
+                    item['answer'] = ''.join(answers[item['target']]) if item['status'] == 'ok' else None
+        return result
+    
+    def _compare_target(
+        self,
+        index: int,
+        target: Dict[str, str],
+        query: str,
+        system: Optional[str],
+        cancel: CancelToken,
+        tenant: str,
+        priority: str,
+        max_tokens: Optional[int],
+        events: queue.Queue,
+        results: List[Optional[Dict[str, Any]]],
+        trace: Any
+    ):
+        """Thread body: stream one compare target into the shared event queue"""
+        provider_name, model = target['provider'], target['model']
+        span = trace.start_span('compare_target', provider=provider_name, model=model, target=index)
+        phases = PhaseRecorder(trace, span)
+        usage: Dict[str, Any] = {}
+        parts: List[str] = []
+        outcome = {'status': 'error', 'provider': provider_name, 'model': model,
+                   'usage': usage, 'attempts': 1, 'ttft': None}
+        error = None
+        began = time.perf_counter()
+        started = time.time()
+        slot_held = False
+        try:
+            events.put({'type': 'provider', 'target': index,
+                        'data': {'provider': provider_name, 'model': model, 'status': 'attempting'}})
+            phases.mark('bulkhead')
+            slot_held = self.scheduler.acquire_provider(provider_name, Config.BULKHEAD_WAIT_SECONDS)
+            if not slot_held:
+                raise Exception(f"{provider_name} is at its concurrency limit")
+            phases.mark('prepare')
+            # A private copy: routing elsewhere keeps changing the shared instance's model
+            provider = self.providers[provider_name].for_model(model)
+            query_kwargs = {'usage': usage, 'cancel': cancel}
+            if max_tokens:
+                query_kwargs['max_tokens'] = max_tokens
+            if system:
+                query_kwargs['system'] = system
+            if trace is not NOOP_TRACE:
+                query_kwargs['phase'] = phases.mark
+            for chunk in provider.query(query, stream=True, **query_kwargs):
+                if not parts:
+                    phases.mark('stream')
+                    outcome['ttft'] = time.perf_counter() - began
+                    events.put({'type': 'provider', 'target': index,
+                                'data': {'provider': provider_name, 'model': model, 'status': 'success'}})
+                parts.append(chunk)
+                events.put({'type': 'content', 'target': index, 'data': chunk})
+            outcome['status'] = 'ok'
+        except Exception as e:
+            if isinstance(e, RequestCancelled) or cancel.cancelled:
+                outcome['status'] = 'cancelled'
+            else:
+                error = str(e)
+                span.fail(e)
+                events.put({'type': 'error', 'target': index, 'data': {'provider': provider_name, 'error': error}})
+        finally:
+            phases.close()
+            span.end()
+            if slot_held:
+                self.scheduler.release_provider(provider_name)
+        
+        try:
+            elapsed = time.perf_counter() - began
+            ttft = outcome['ttft']
+            output_tokens = usage.get('output_tokens', 0)
+            streaming = elapsed - ttft if ttft is not None else 0.0
+            results[index] = {
+                'target': index,
+                'provider': provider_name,
+                'model': model,
+                'status': outcome['status'],
+                'ttft': round(ttft, 3) if ttft is not None else None,
+                'elapsed': round(elapsed, 3),
+                'input_tokens': usage.get('input_tokens', 0),
+                'output_tokens': output_tokens,
+                'tokens_per_second': round(output_tokens / streaming, 1) if streaming > 0 else None,
+                'cost': round(usage.get('cost', 0.0), 6),
+                'error': error,
+                'answer': ''.join(parts)
+            }
+            if 'cost' in usage and self.budgets.enabled:
+                self.budgets.record(tenant, usage['cost'], usage.get('input_tokens', 0) + output_tokens)
+            self._record_ledger(tenant, priority, outcome, started)
+            if outcome['status'] == 'ok':
+                events.put({'type': 'target_complete', 'target': index,
+                            'data': {k: v for k, v in results[index].items() if k != 'answer'}})
+        finally:
+            # The request thread counts these to know when every target is done
+            events.put(None)
+    
+    def _save_compare(
+        self,
+        query: str,
+        system: Optional[str],
+        query_metadata: Dict[str, Any],
+        results: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Append a compare run to COMPARE_RESULTS_FILE (JSON lines)
+        
+        Each line holds the query, its analysis (what routing rules match
+        on) and every target's answer and measurements, so runs can be
+        replayed offline, e.g. by benchmarks/eval_cascade.py.
+        
+        Returns:
+            Path written
+        """
+        record = {
+            'ts': time.time(),
+            'query': query,
+            'system': system,
+            'query_metadata': query_metadata,
+            'results': results
+        }
+        with open(Config.COMPARE_RESULTS_FILE, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return Config.COMPARE_RESULTS_FILE
+    
+    def _query_with_fallback(
+        self,
+        query: str,
+        user_preference: Optional[str],
+        stream: bool,
+        session_id: Optional[str],
+        system: Optional[str],
+        cancel: Optional[CancelToken],
+        tenant: str,
+        max_tokens: Optional[int],
+        cascade: Any = None,
+        trace: Any = NOOP_TRACE
+    ) -> Generator[Dict[str, Any], None, None]:
+        """Route and stream an admitted request (see query_with_fallback)"""
+        conversation = self.conversations.get_or_create(session_id) if session_id else None
+        
+        # Get routing decision
+        routing = self.route_query(query, user_preference, conversation, cascade, trace)
+        if conversation is not None:
+            routing['session_id'] = conversation.session_id
+        
+        # Compact long inputs for rules that opt in, before anything counts their tokens
+        query = self._compact_query(query, routing, trace)
+        
+        # Cap the answer at its predicted length unless the caller set a cap
+        predicted = routing['query_metadata']['predicted_output_tokens']
+        if not max_tokens and predicted and Config.OUTPUT_PREDICTION == 'enforce':
+            max_tokens = predicted
+            routing['max_tokens'] = predicted
+        response_tokens = max_tokens or predicted
+        
+        # Budget check before dispatch; may downgrade to a cheaper model
+        stream_budget = None
+        if self.budgets.enabled:
             try:
-                # Yield provider info
+                with trace.span('budget'):
+                    stream_budget = self._apply_budget(routing, tenant, max_tokens)
+            except BudgetExceeded as e:
                 yield {
-                    'type': 'provider',
-                    'data': {
-                        'provider': provider_name,
-                        'model': provider.model,
-                        'status': 'attempting'
-                    }
+                    'type': 'error',
+                    'data': {'error': str(e), 'budget_exceeded': True}
                 }
+                return
+            final_stage = routing.get('cascade', {}).get('stages', [{}])[-1]
+            if final_stage and (final_stage['provider'], final_stage['model']) != (routing['provider'], routing['model']):
+                # Downgraded by the budget: go straight to the cheap model
+                del routing['cascade']
+        try:
+            fallback_order = routing['fallback_order']
+            cache_plan = self._prompt_cache_plan(query, system)
+            resume_enabled = self.routing_rules.get('resume_on_failure', True)
+            # Answer text already delivered, across attempts
+            emitted_chunks: List[str] = []
+            
+            # Yield routing decision
+            yield {
+                'type': 'routing',
+                'data': routing
+            }
+            
+            if 'cascade' in routing:
+                accepted = yield from self._run_cascade(
+                    routing, query, conversation, system, cancel, tenant, max_tokens, stream_budget, trace
+                )
+                if accepted is not False:
+                    return
+            
+            # Try each provider in fallback order
+            for attempt_index, provider_name in enumerate(fallback_order):
+                if provider_name not in self.providers:
+                    continue
                 
-                # Query the provider
-                start_time = time.time()
-                response_started = False
+                provider = self.providers[provider_name]
+                if provider_name == routing['provider']:
+                    # Pin the routed model on a copy; other requests share the instance
+                    provider = provider.for_model(routing['model'])
+                chunks = None
+                slot_held = False
+                attempt_span = trace.start_span(
+                    'attempt', provider=provider_name, model=provider.model, attempt=attempt_index
+                )
+                phases = PhaseRecorder(trace, attempt_span)
                 
-                for chunk in provider.query(query, stream=stream):
-                    if not response_started:
-                        response_started = True
+                try:
+                    # Yield provider info
+                    yield {
+                        'type': 'provider',
+                        'data': {
+                            'provider': provider_name,
+                            'model': provider.model,
+                            'status': 'attempting'
+                        }
+                    }
+                    
+                    # Bulkhead: a saturated provider is skipped, not queued behind
+                    phases.mark('bulkhead')
+                    slot_held = self.scheduler.acquire_provider(provider_name, Config.BULKHEAD_WAIT_SECONDS)
+                    if not slot_held:
+                        raise Exception(f"{provider_name} is at its concurrency limit")
+                    
+                    phases.mark('prepare')
+                    usage = {}
+                    query_kwargs = {'usage': usage}
+                    if trace is not NOOP_TRACE:
+                        query_kwargs['phase'] = phases.mark
+                    if max_tokens:
+                        query_kwargs['max_tokens'] = max_tokens
+                    if cancel is not None:
+                        query_kwargs['cancel'] = cancel
+                    if system:
+                        query_kwargs['system'] = system
+                    if conversation is not None:
+                        with conversation.lock:
+                            query_kwargs['messages'] = conversation.window(
+                                query, self._history_budget(provider.model, response_tokens)
+                            )
+                    partial = ''.join(emitted_chunks)
+                    if partial:
+                        # An earlier provider failed mid-answer: continue from
+                        # its output instead of restarting
+                        base_messages = query_kwargs.get('messages') or [{'role': 'user', 'content': query}]
+                        query_kwargs['messages'] = build_continuation(
+                            base_messages, partial, provider.SUPPORTS_ASSISTANT_PREFILL
+                        )
                         yield {
-                            'type': 'provider',
+                            'type': 'resume',
                             'data': {
                                 'provider': provider_name,
                                 'model': provider.model,
-                                'status': 'success'
+                                'offset': len(partial)
+                            }
+                        }
+                    elif provider.SUPPORTS_PROMPT_CACHE:
+                        query_kwargs.update(
+                            self._prompt_cache_kwargs(cache_plan, query, query_kwargs.get('messages'))
+                        )
+                    
+                    # Query the provider
+                    start_time = time.time()
+                    response_started = False
+                    if stream_budget is not None:
+                        attempt_spend = (stream_budget.cost, stream_budget.tokens)
+                        input_tokens = routing['query_metadata']['token_count']
+                        stream_budget.add(input_tokens, provider.estimate_cost(input_tokens, 0))
+                    
+                    chunks = provider.query(query, stream=stream, **query_kwargs)
+                    charge = self._chunk_charge(tenant, provider, stream_budget)
+                    if stream:
+                        chunks = self._buffer_stream(chunks, phases, charge)
+                    elif charge is not None:
+                        chunks = checked_stream(chunks, charge)
+                    for chunk in trim_repeated_prefix(chunks, partial) if partial else chunks:
+                        if not response_started:
+                            response_started = True
+                            if not isinstance(chunks, BufferedStream):
+                                phases.mark('stream')
+                            yield {
+                                'type': 'provider',
+                                'data': {
+                                    'provider': provider_name,
+                                    'model': provider.model,
+                                    'status': 'success'
+                                }
                             }
+                        
+                        emitted_chunks.append(chunk)
+                        yield {
+                            'type': 'content',
+                            'data': chunk
                         }
                     
+                    # Success! No need to try fallback
+                    elapsed_time = time.time() - start_time
+                    phases.close()
+                    attempt_span.set('output_tokens', usage.get('output_tokens'))
+                    if stream_budget is not None:
+                        self._record_spend(tenant, stream_budget, attempt_spend, usage)
+                    if conversation is not None:
+                        self.conversations.record_turn(
+                            conversation, query, ''.join(emitted_chunks), provider_name, provider.model
+                        )
                     yield {
-                        'type': 'content',
-                        'data': chunk
+                        'type': 'complete',
+                        'data': {
+                            'provider': provider_name,
+                            'model': provider.model,
+                            'elapsed_time': round(elapsed_time, 2),
+                            'usage': usage,
+                            'stats': provider.get_stats()
+                        }
                     }
+                    return
                 
-                # Success! No need to try fallback
-                elapsed_time = time.time() - start_time
-                yield {
-                    'type': 'complete',
-                    'data': {
-                        'provider': provider_name,
-                        'model': provider.model,
-                        'elapsed_time': round(elapsed_time, 2),
-                        'stats': provider.get_stats()
+                except GeneratorExit:
+                    # Consumer went away: stop the upstream generation now
+                    attempt_span.set('cancelled', True)
+                    self._cancel_attempt(provider, chunks, cancel)
+                    if stream_budget is not None and chunks is not None:
+                        self._record_spend(tenant, stream_budget, attempt_spend, usage)
+                    raise
+                
+                except Exception as e:
+                    if stream_budget is not None and chunks is not None:
+                        self._record_spend(tenant, stream_budget, attempt_spend, usage)
+                    
+                    if isinstance(e, RequestCancelled) or (cancel is not None and cancel.cancelled):
+                        # Client disconnected; nobody is left to read a fallback
+                        attempt_span.set('cancelled', True)
+                        self._cancel_attempt(provider, chunks, cancel)
+                        return
+                    attempt_span.fail(e)
+                    
+                    if isinstance(e, BudgetExceeded):
+                        # Stop the upstream generation; a fallback would spend more
+                        chunks.close()
+                        yield {
+                            'type': 'error',
+                            'data': {
+                                'provider': provider_name,
+                                'error': str(e),
+                                'budget_exceeded': True
+                            }
+                        }
+                        return
+                    
+                    # Provider failed, try next one
+                    yield {
+                        'type': 'error',
+                        'data': {
+                            'provider': provider_name,
+                            'error': str(e),
+                            'attempting_fallback': True
+                        }
                     }
+                    if emitted_chunks and not resume_enabled:
+                        # The next provider starts over; tell the client to discard
+                        # the partial answer rather than show it twice
+                        emitted_chunks = []
+                        yield {
+                            'type': 'reset',
+                            'data': {'provider': provider_name}
+                        }
+                    continue
+                
+                finally:
+                    phases.close()
+                    self._record_stream_buffer(provider_name, chunks, attempt_span)
+                    attempt_span.end()
+                    if slot_held:
+                        self.scheduler.release_provider(provider_name)
+            
+            # All providers failed
+            yield {
+                'type': 'error',
+                'data': {
+                    'error': 'All providers failed',
+                    'attempted_providers': fallback_order
                 }
-                return
+            }
+        finally:
+            if stream_budget is not None:
+                stream_budget.close()
+    
+    def _run_cascade(
+        self,
+        routing: Dict[str, Any],
+        query: str,
+        conversation: Optional[Conversation],
+        system: Optional[str],
+        cancel: Optional[CancelToken],
+        tenant: str,
+        max_tokens: Optional[int],
+        stream_budget: Optional[StreamBudget],
+        trace: Any = NOOP_TRACE
+    ) -> Generator[Dict[str, Any], None, Optional[bool]]:
+        """
+        Try a cascade's cheaper stages, keeping the first acceptable answer
+        
+        Each stage's answer is checked locally by AnswerChecker. With
+        "speculative": true the stage streams to the client as it arrives
+        and a rejected answer is withdrawn with a 'reset' event; otherwise it
+        is held back until accepted. Acceptances, escalations, cost saved and
+        latency added by rejected stages are counted per cascade.
+        
+        Yields:
+            Response events
+            
+        Returns:
+            True if a stage's answer was accepted, False to escalate to the
+            final stage, None if the request was cancelled or ran out of
+            budget
+        """
+        cascade = routing['cascade']
+        name = cascade['name']
+        final = cascade['stages'][-1]
+        store = get_stats_store()
+        store.incr('cascades', name, 'requests')
+        
+        for index, stage in enumerate(cascade['stages'][:-1]):
+            provider_name, model = stage['provider'], stage['model']
+            # A private copy: other requests keep using the shared instance
+            provider = self.providers[provider_name].for_model(model)
+            yield {
+                'type': 'provider',
+                'data': {
+                    'provider': provider_name,
+                    'model': model,
+                    'status': 'attempting',
+                    'cascade_stage': index
+                }
+            }
+            
+            chunks = None
+            usage = {}
+            parts: List[str] = []
+            error = None
+            budget_exceeded = False
+            attempt_spend = None
+            stage_started = time.time()
+            stage_span = trace.start_span(
+                'cascade_stage', cascade=name, stage=index, provider=provider_name, model=model
+            )
+            phases = PhaseRecorder(trace, stage_span)
+            phases.mark('bulkhead')
+            slot_held = self.scheduler.acquire_provider(provider_name, Config.BULKHEAD_WAIT_SECONDS)
+            try:
+                if not slot_held:
+                    raise Exception(f"{provider_name} is at its concurrency limit")
+                phases.mark('prepare')
+                query_kwargs = {'usage': usage}
+                if trace is not NOOP_TRACE:
+                    query_kwargs['phase'] = phases.mark
+                if max_tokens:
+                    query_kwargs['max_tokens'] = max_tokens
+                if cancel is not None:
+                    query_kwargs['cancel'] = cancel
+                if system:
+                    query_kwargs['system'] = system
+                if conversation is not None:
+                    with conversation.lock:
+                        query_kwargs['messages'] = conversation.window(query, self._history_budget(model, max_tokens))
+                
+                if stream_budget is not None:
+                    attempt_spend = (stream_budget.cost, stream_budget.tokens)
+                    input_tokens = routing['query_metadata']['token_count']
+                    stream_budget.add(input_tokens, provider.estimate_cost(input_tokens, 0))
                 
+                chunks = self._buffer_stream(
+                    provider.query(query, stream=True, **query_kwargs),
+                    phases,
+                    self._chunk_charge(tenant, provider, stream_budget)
+                )
+                for chunk in chunks:
+                    parts.append(chunk)
+                    if len(parts) == 1 and not isinstance(chunks, BufferedStream):
+                        phases.mark('stream')
+                    if cascade['speculative']:
+                        if len(parts) == 1:
+                            yield {
+                                'type': 'provider',
+                                'data': {'provider': provider_name, 'model': model, 'status': 'success'}
+                            }
+                        yield {'type': 'content', 'data': chunk}
+            except GeneratorExit:
+                stage_span.set('cancelled', True)
+                self._cancel_attempt(provider, chunks, cancel)
+                raise
             except Exception as e:
-                # Provider failed, try next one
+                if isinstance(e, RequestCancelled) or (cancel is not None and cancel.cancelled):
+                    stage_span.set('cancelled', True)
+                    self._cancel_attempt(provider, chunks, cancel)
+                    return None
+                if isinstance(e, BudgetExceeded):
+                    # Stop the upstream generation; escalating would spend more
+                    chunks.close()
+                    budget_exceeded = True
+                error = e
+            finally:
+                phases.close()
+                self._record_stream_buffer(provider_name, chunks, stage_span)
+                stage_span.end()
+                if slot_held:
+                    self.scheduler.release_provider(provider_name)
+                if attempt_spend is not None:
+                    self._record_spend(tenant, stream_budget, attempt_spend, usage)
+            
+            if budget_exceeded:
                 yield {
                     'type': 'error',
+                    'data': {'provider': provider_name, 'error': str(error), 'budget_exceeded': True}
+                }
+                return None
+            
+            answer = ''.join(parts)
+            if error is not None:
+                verdict = {'accepted': False, 'confidence': 0.0, 'reasons': [f"error: {error}"]}
+            else:
+                try:
+                    with trace.span('cascade_check', stage=index):
+                        verdict = AnswerChecker.evaluate(query, answer, routing['query_metadata'], cascade['checks'])
+                except Exception as e:
+                    # A broken check must not lose the request: escalate as if rejected
+                    print(f"✗ Cascade {name} check failed: {e}")
+                    verdict = {'accepted': False, 'confidence': 0.0, 'reasons': [f"check failed: {e}"]}
+            stage_span.set('accepted', verdict['accepted'])
+            stage_span.set('confidence', verdict['confidence'])
+            yield {
+                'type': 'cascade',
+                'data': {'name': name, 'stage': index, 'provider': provider_name, 'model': model, **verdict}
+            }
+            
+            stage_cost = usage.get('cost', 0.0)
+            if verdict['accepted']:
+                if not cascade['speculative']:
+                    yield {
+                        'type': 'provider',
+                        'data': {'provider': provider_name, 'model': model, 'status': 'success'}
+                    }
+                    yield {'type': 'content', 'data': answer}
+                # What the final stage would have charged for the same tokens
+                saved = self.providers[final['provider']].estimate_cost(
+                    usage.get('input_tokens', 0) + usage.get('cache_read_tokens', 0)
+                    + usage.get('cache_write_tokens', 0),
+                    usage.get('output_tokens', 0),
+                    model=final['model']
+                ) - stage_cost
+                store.incr_many('cascades', name, {'accepted': 1, 'cost_saved': saved})
+                if conversation is not None:
+                    self.conversations.record_turn(conversation, query, answer, provider_name, model)
+                yield {
+                    'type': 'complete',
                     'data': {
                         'provider': provider_name,
-                        'error': str(e),
-                        'attempting_fallback': True
+                        'model': model,
+                        'elapsed_time': round(time.time() - stage_started, 2),
+                        'usage': usage,
+                        'stats': provider.get_stats(),
+                        'cascade': {'name': name, 'stage': index, 'cost_saved': round(saved, 6)}
                     }
                 }
+                return True
+            
+            # Rejected: the stage's spend and time are the price of trying
+            store.incr_many('cascades', name, {
+                'stage_rejections': 1,
+                'cost_saved': -stage_cost,
+                'added_latency': time.time() - stage_started
+            })
+            if cascade['speculative'] and parts:
+                yield {
+                    'type': 'reset',
+                    'data': {'provider': provider_name, 'reason': 'cascade_escalation'}
+                }
+        
+        store.incr('cascades', name, 'escalated')
+        return False
+    
+    def get_cascade_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide cascade outcomes
+        
+        Returns:
+            Dictionary of cascade name to requests, acceptance rate, cost
+            saved (net of rejected stages' spend) and average time lost to
+            each rejected stage
+        """
+        stats = {}
+        for name, fields in get_stats_store().get('cascades').items():
+            requests = fields.get('requests', 0)
+            rejections = fields.get('stage_rejections', 0)
+            stats[name] = {
+                'requests': requests,
+                'accepted': fields.get('accepted', 0),
+                'escalated': fields.get('escalated', 0),
+                'acceptance_rate': round(fields.get('accepted', 0) / requests, 3) if requests else None,
+                'cost_saved': round(fields.get('cost_saved', 0.0), 6),
+                'avg_added_latency': round(fields.get('added_latency', 0.0) / rejections, 3) if rejections else None
+            }
+        return stats
+    
+    def _match_shadow(self, routing: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Pick the shadow (if any) that mirrors a routed request
+        
+        A shadow names the routing rule it evaluates a replacement for
+        ("rule"), matching requests that rule sent to its provider/model, or
+        gives its own "condition". Matching requests are then sampled at
+        the shadow's sample_rate. Session requests are not mirrored, since
+        the candidate would not see the conversation.
+        
+        Args:
+            routing: Routing decision
+            
+        Returns:
+            Shadow spec, or None
+        """
+        if 'session_id' in routing:
+            return None
+        query_metadata = routing['query_metadata']
+        for shadow in self.routing_rules.get('shadows', []):
+            candidate = shadow.get('candidate', {})
+            if not shadow.get('enabled', True) or candidate.get('provider') not in self.providers:
+                continue
+            if (candidate['provider'], candidate.get('model')) == (routing['provider'], routing['model']):
                 continue
+            if 'rule' in shadow:
+                rule = next((r for r in self.routing_rules.get('rules', []) if r['name'] == shadow['rule']), None)
+                if rule is None or (rule['provider'], rule['model']) != (routing['provider'], routing['model']):
+                    continue
+                if not self._rule_matches(rule, query_metadata):
+                    continue
+            elif not self._rule_matches(shadow, query_metadata):
+                continue
+            if random.random() < shadow.get('sample_rate', 0.0):
+                return shadow
+        return None
+    
+    def _start_shadow(
+        self,
+        query: str,
+        system: Optional[str],
+        max_tokens: Optional[int],
+        routing: Dict[str, Any]
+    ) -> Optional[PrimaryResult]:
+        """
+        Mirror a routed request to a shadow candidate, if one is sampled
+        
+        Never waits: if the worker's shadow pool is full the request is
+        simply not mirrored (and counted as dropped).
+        
+        Returns:
+            PrimaryResult for the caller to fill in, or None
+        """
+        shadow = self._match_shadow(routing)
+        if shadow is None:
+            return None
+        primary = PrimaryResult(keep_text=bool(shadow.get('similarity')))
+        if not self.shadow_pool.try_submit(self._run_shadow, shadow, primary, query, system, max_tokens):
+            get_stats_store().incr('shadows', shadow['name'], 'dropped')
+            return None
+        return primary
+    
+    def _run_shadow(
+        self,
+        shadow: Dict[str, Any],
+        primary: PrimaryResult,
+        query: str,
+        system: Optional[str],
+        max_tokens: Optional[int]
+    ):
+        """Pool thread: query the candidate, then record how it compares with the primary"""
+        name = shadow['name']
+        provider_name, model = shadow['candidate']['provider'], shadow['candidate']['model']
+        store = get_stats_store()
+        # Production keeps SHADOW_PROVIDER_HEADROOM of the candidate's slots
+        if not self.scheduler.acquire_provider(provider_name, 0, reserve=Config.SHADOW_PROVIDER_HEADROOM):
+            store.incr('shadows', name, 'dropped')
+            return
+        
+        usage: Dict[str, Any] = {}
+        parts: List[str] = []
+        cancel = CancelToken()
+        timer = threading.Timer(Config.SHADOW_TIMEOUT, cancel.cancel)
+        timer.daemon = True
+        timer.start()
+        ttft = None
+        error = None
+        began = time.perf_counter()
+        try:
+            provider = self.providers[provider_name].for_model(model)
+            # Shadow results go to the 'shadows' stats only, never the provider's
+            provider.record_stats = False
+            query_kwargs = {'usage': usage, 'cancel': cancel}
+            if max_tokens:
+                query_kwargs['max_tokens'] = max_tokens
+            if system:
+                query_kwargs['system'] = system
+            for chunk in provider.query(query, stream=True, **query_kwargs):
+                if ttft is None:
+                    ttft = time.perf_counter() - began
+                parts.append(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            timer.cancel()
+            self.scheduler.release_provider(provider_name)
+        elapsed = time.perf_counter() - began
         
-        # All providers failed
-        yield {
-            'type': 'error',
-            'data': {
-                'error': 'All providers failed',
-                'attempted_providers': fallback_order
+        if error is not None:
+            store.incr_many('shadows', name, {'mirrored': 1, 'errors': 1, 'timeouts': int(cancel.cancelled)})
+            print(f"⚠ Shadow {name} ({provider_name}/{model}) failed: {error}")
+            return
+        
+        output_tokens = usage.get('output_tokens', 0)
+        cost = usage.get('cost', 0.0)
+        fields = {
+            'mirrored': 1,
+            'ok': 1,
+            f"latency:{self.latency_buckets.bucket_field(elapsed)}": 1,
+            'latency:sum': elapsed,
+            'output_tokens': output_tokens,
+            'streaming_seconds': elapsed - ttft if ttft is not None else 0.0,
+            'cost': cost
+        }
+        if ttft is not None:
+            fields[f"ttft:{self.latency_buckets.bucket_field(ttft)}"] = 1
+            fields['ttft:sum'] = ttft
+        
+        # Side-by-side figures only for requests whose primary answered
+        if primary.wait(Config.SHADOW_TIMEOUT) and primary.status == 'ok':
+            fields.update({
+                'paired': 1,
+                'paired:latency': elapsed,
+                'paired:ttft': ttft or elapsed,
+                'paired:cost': cost,
+                'paired:primary_latency': primary.latency,
+                'paired:primary_ttft': primary.ttft or primary.latency,
+                'paired:primary_cost': primary.usage.get('cost', 0.0)
+            })
+            similarity = self._shadow_similarity(shadow.get('similarity'), primary.answer, ''.join(parts))
+            if similarity is not None:
+                fields[f"similarity:{self.similarity_buckets.bucket_field(similarity)}"] = 1
+                fields['similarity:sum'] = similarity
+                fields['similarity:count'] = 1
+        store.incr_many('shadows', name, fields)
+    
+    def _shadow_similarity(self, method: Any, primary_answer: str, shadow_answer: str) -> Optional[float]:
+        """
+        Similarity of the shadow's answer to the primary's
+        
+        Args:
+            method: 'lexical' (word-count cosine), 'embedding' (cosine of
+                the answers' embeddings) or a false value to skip
+            primary_answer: Answer the client received
+            shadow_answer: Candidate's answer
+            
+        Returns:
+            Similarity between 0 and 1, or None when skipped or unavailable
+        """
+        if not method or not primary_answer or not shadow_answer:
+            return None
+        if method == 'embedding':
+            result = self.embed([primary_answer, shadow_answer])
+            if 'error' in result:
+                return None
+            return max(0.0, vector_similarity(*result['embeddings']))
+        return lexical_similarity(primary_answer, shadow_answer)
+    
+    def get_shadow_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide shadow traffic results
+        
+        Returns:
+            Dictionary of shadow name to its candidate, request counts
+            (mirrored, dropped by the concurrency caps, errors, timeouts),
+            the candidate's TTFT/latency percentiles, throughput and average
+            cost, averages side by side with the primary over paired
+            requests, and output similarity when enabled
+        """
+        specs = {shadow['name']: shadow for shadow in self.routing_rules.get('shadows', [])}
+        stats = {}
+        for name, fields in get_stats_store().get('shadows').items():
+            ok = fields.get('ok', 0)
+            paired = fields.get('paired', 0)
+            streaming = fields.get('streaming_seconds', 0.0)
+            entry = {
+                'candidate': specs.get(name, {}).get('candidate'),
+                'rule': specs.get(name, {}).get('rule'),
+                'mirrored': fields.get('mirrored', 0),
+                'dropped': fields.get('dropped', 0),
+                'errors': fields.get('errors', 0),
+                'timeouts': fields.get('timeouts', 0),
+                'tokens_per_second': round(fields.get('output_tokens', 0) / streaming, 1) if streaming > 0 else None,
+                'avg_cost': round(fields.get('cost', 0.0) / ok, 6) if ok else None
+            }
+            for metric in ('ttft', 'latency'):
+                histogram = Histogram.from_fields(fields, f"{metric}:", self.latency_buckets.buckets)
+                entry[metric] = {'p50': histogram.percentile(50), 'p95': histogram.percentile(95)}
+            if paired:
+                vs_primary = {'paired': paired}
+                for metric, digits in (('ttft', 3), ('latency', 3), ('cost', 6)):
+                    vs_primary[f"avg_{metric}"] = round(fields.get(f"paired:{metric}", 0.0) / paired, digits)
+                    vs_primary[f"primary_avg_{metric}"] = round(fields.get(f"paired:primary_{metric}", 0.0) / paired, digits)
+                entry['vs_primary'] = vs_primary
+            compared = fields.get('similarity:count', 0)
+            if compared:
+                similarity = Histogram.from_fields(fields, 'similarity:', self.similarity_buckets.buckets)
+                entry['similarity'] = {
+                    'compared': compared,
+                    'mean': round(fields.get('similarity:sum', 0.0) / compared, 3),
+                    'p10': similarity.percentile(10),
+                    'p50': similarity.percentile(50)
+                }
+            stats[name] = entry
+        return stats
+    
+    def get_output_length_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide answer lengths and output length prediction error
+        
+        Returns:
+            Dictionary of 'query_type/complexity' to answer length
+            percentiles, the current prediction and its error (empty when
+            prediction is off)
+        """
+        if self.length_predictor is None:
+            return {}
+        return self.length_predictor.get_stats()
+    
+    def get_latency_baseline(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Startup probe measurements the workers are seeded with
+        
+        Returns:
+            Dictionary of provider name to probed model, connect time, TTFT,
+            latency, tokens/sec and probe time, plus 'probe_failed' for
+            providers still demoted in the fallback order
+        """
+        baseline = {}
+        for name, entry in get_stats_store().get('latency_baseline').items():
+            if entry.get('probe_failed'):
+                baseline[name] = {'probe_failed': True}
+                continue
+            if 'model' not in entry:
+                continue
+            baseline[name] = {
+                'model': entry['model'],
+                'generated_at': entry['generated_at'],
+                'connect_ms': entry['connect_ms'],
+                'ttft_p50': self._baseline_histogram(entry, 'ttft').percentile(50),
+                'latency_p50': self._baseline_histogram(entry, 'latency').percentile(50),
+                'tokens_per_second': entry['tokens_per_second'],
+                'probe_failed': False
             }
+        return baseline
+    
+    def _baseline_histogram(self, entry: Dict[str, Any], metric: str) -> Histogram:
+        """A probed metric as a histogram seeded with its median"""
+        histogram = Histogram(self.latency_buckets.buckets)
+        histogram.seed(entry[f"{metric}_ms"] / 1000, entry['samples'])
+        return histogram
+    
+    @staticmethod
+    def _probe_failed() -> set:
+        """Providers whose startup probe failed and that have not answered since"""
+        return {name for name, entry in get_stats_store().get('latency_baseline').items() if entry.get('probe_failed')}
+    
+    @staticmethod
+    def _finish_trace(trace: Any, outcome: Dict[str, Any], owns_trace: bool):
+        """Put the request's outcome on its root span (and end it if ours)"""
+        trace.set('status', outcome['status'])
+        trace.set('provider', outcome['provider'])
+        trace.set('model', outcome['model'])
+        trace.set('attempts', outcome['attempts'])
+        trace.set('ttft_ms', round(outcome['ttft'] * 1000, 1) if outcome['ttft'] is not None else None)
+        if outcome['status'] == 'error':
+            trace.root.fail('request failed')
+        if owns_trace:
+            trace.end()
+    
+    @staticmethod
+    def _track_outcome(event: Dict[str, Any], outcome: Dict[str, Any], started: float):
+        """Collect what the usage ledger needs from the event stream"""
+        kind, data = event['type'], event['data']
+        if kind == 'provider' and data['status'] == 'attempting':
+            outcome['attempts'] += 1
+            outcome['provider'] = data['provider']
+            outcome['model'] = data['model']
+        elif kind == 'content' and outcome['ttft'] is None:
+            outcome['ttft'] = time.time() - started
+        elif kind == 'complete':
+            outcome.update({
+                'status': 'ok',
+                'provider': data['provider'],
+                'model': data['model'],
+                'usage': data['usage']
+            })
+        elif kind == 'error' and data.get('budget_exceeded'):
+            outcome['status'] = 'budget_exceeded'
+    
+    def _record_latency(self, outcome: Dict[str, Any], started: float):
+        """Count a successful request's latency and TTFT in fleet-wide histograms"""
+        latency = time.time() - started
+        fields = {f"latency:{self.latency_buckets.bucket_field(latency)}": 1, 'latency:sum': latency}
+        if outcome['ttft'] is not None:
+            fields[f"ttft:{self.latency_buckets.bucket_field(outcome['ttft'])}"] = 1
+            fields['ttft:sum'] = outcome['ttft']
+        store = get_stats_store()
+        store.incr_many('latency', outcome['provider'], fields)
+        if store.get('latency_baseline', outcome['provider']).get('probe_failed'):
+            store.set('latency_baseline', outcome['provider'], 'probe_failed', False)
+    
+    def _record_output_length(self, routing: Dict[str, Any], outcome: Dict[str, Any]):
+        """Feed an answer's length back to the predictor (requests without a caller's cap only)"""
+        output_tokens = outcome['usage'].get('output_tokens')
+        if self.length_predictor is None or not output_tokens:
+            return
+        query_metadata = routing['query_metadata']
+        self.length_predictor.record(query_metadata, output_tokens, query_metadata.get('predicted_output_tokens'))
+    
+    def _record_ledger(self, tenant: str, priority: str, outcome: Dict[str, Any], started: float):
+        """Queue a ledger entry for a request that reached a provider"""
+        if self.ledger is None or outcome['provider'] is None:
+            return
+        usage = outcome['usage']
+        self.ledger.record({
+            'ts': started,
+            'tenant': tenant,
+            'priority': priority,
+            'provider': outcome['provider'],
+            'model': outcome['model'],
+            'status': outcome['status'],
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'cache_read_tokens': usage.get('cache_read_tokens', 0),
+            'cache_write_tokens': usage.get('cache_write_tokens', 0),
+            'cost': usage.get('cost', 0.0),
+            'ttft': outcome['ttft'],
+            'latency': time.time() - started,
+            'fallback_depth': max(outcome['attempts'] - 1, 0)
+        })
+    
+    def _compact_query(self, query: str, routing: Dict[str, Any], trace: Any = NOOP_TRACE) -> str:
+        """
+        Run the prompt compactor if the matched routing rule opts in
+        
+        A rule opts in with "compact": true, or a dict of PromptCompactor
+        options plus min_chars (inputs shorter than that are left alone).
+        The routing decision is kept; its token count is updated and a
+        'compaction' entry reports what was removed.
+        
+        Args:
+            query: User's query
+            routing: Routing decision (updated in place)
+            trace: Request trace for the 'compact' span
+            
+        Returns:
+            Query to send: the compacted text, or the original
+        """
+        rule = next((r for r in self.routing_rules.get('rules', []) if r['name'] == routing.get('rule')), None)
+        settings = rule.get('compact') if rule is not None else None
+        if not settings:
+            return query
+        min_chars = settings.get('min_chars', Config.COMPACT_MIN_CHARS) if isinstance(settings, dict) else Config.COMPACT_MIN_CHARS
+        if len(query) < min_chars:
+            return query
+        
+        with trace.span('compact', rule=rule['name'], chars=len(query)) as span:
+            began = time.perf_counter()
+            compacted, stats = PromptCompactor.from_settings(settings, Config.COMPACT_MAX_BLOCK_LINES).compact(query)
+            elapsed = time.perf_counter() - began
+            # Counted like query_metadata's token_count, so routing, budgets and the stats agree
+            token_change = QueryAnalyzer.count_tokens(compacted) - QueryAnalyzer.count_tokens(query)
+            tokens_saved = max(0, -token_change)
+            span.set('tokens_saved', tokens_saved)
+        
+        query_metadata = routing['query_metadata']
+        query_metadata['token_count'] += token_change
+        routing['compaction'] = {**stats, 'tokens_saved': tokens_saved, 'elapsed_ms': round(elapsed * 1000, 2)}
+        get_stats_store().incr_many('compaction', rule['name'], {
+            'requests': 1,
+            'chars_before': stats['chars_before'],
+            'chars_after': stats['chars_after'],
+            'tokens_saved': tokens_saved,
+            'duplicate_blocks': stats['duplicate_blocks'],
+            'repeated_lines': stats['repeated_lines'],
+            'truncated_lines': stats['truncated_lines'],
+            'seconds': elapsed
+        })
+        return compacted
+    
+    def get_compaction_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide prompt compaction results per routing rule
+        
+        Returns:
+            Dictionary of rule name to compacted requests, tokens saved
+            (total and per request), the share of characters removed and
+            the average compaction time
+        """
+        stats = {}
+        for name, fields in get_stats_store().get('compaction').items():
+            requests = fields.get('requests', 0)
+            chars_before = fields.get('chars_before', 0)
+            stats[name] = {
+                'requests': requests,
+                'tokens_saved': fields.get('tokens_saved', 0),
+                'avg_tokens_saved': round(fields.get('tokens_saved', 0) / requests, 1) if requests else None,
+                'chars_removed_ratio': round(1 - fields.get('chars_after', 0) / chars_before, 3) if chars_before else None,
+                'duplicate_blocks': fields.get('duplicate_blocks', 0),
+                'repeated_lines': fields.get('repeated_lines', 0),
+                'truncated_lines': fields.get('truncated_lines', 0),
+                'avg_ms': round(fields.get('seconds', 0.0) / requests * 1000, 2) if requests else None
+            }
+        return stats
+    
+    def _apply_budget(self, routing: Dict[str, Any], tenant: str, max_tokens: Optional[int]) -> StreamBudget:
+        """
+        Check a routed request against the tenant's budget and reserve it
+        
+        The estimate is the prompt plus max_tokens of output (or the
+        predicted answer length when no cap is given). A tenant close
+        to a limit, or whose request only fits on a cheaper model, is moved
+        to the cheapest model named in the routing rules.
+        
+        Args:
+            routing: Routing decision (updated in place on downgrade)
+            tenant: Tenant identity
+            max_tokens: Requested answer length cap, if any
+            
+        Returns:
+            Running cap to check while streaming, holding the request's
+            reservation (close it when the request ends)
+            
+        Raises:
+            BudgetExceeded: The request does not fit even on the cheapest model
+        """
+        input_tokens = routing['query_metadata']['token_count']
+        output_tokens = (max_tokens or routing['query_metadata'].get('predicted_output_tokens')
+                         or Config.BUDGET_ESTIMATE_MAX_TOKENS)
+        
+        def estimate(target: tuple) -> float:
+            provider = self.providers.get(target[0])
+            return provider.estimate_cost(input_tokens, output_tokens, model=target[1]) if provider else 0.0
+        
+        current = (routing['provider'], routing['model'])
+        cheapest = self._cheapest_model()
+        try:
+            status = self.budgets.check(tenant, estimate(current), input_tokens + output_tokens)
+        except BudgetExceeded:
+            if cheapest is None or cheapest == current:
+                raise
+            status = self.budgets.check(tenant, estimate(cheapest), input_tokens + output_tokens)
+            status['downgrade'] = True
+        
+        if status['downgrade'] and cheapest is not None and estimate(cheapest) < estimate(current):
+            # Only this request's routing changes; the attempt runs on a for_model() copy
+            provider_name, model = cheapest
+            reservation = status['reservation']
+            if reservation['cost'] > estimate(cheapest):
+                # Reserved at the original model's price: keep only the cheaper model's estimate
+                self.budgets.release(tenant, {'cost': reservation['cost'] - estimate(cheapest), 'tokens': 0})
+                reservation['cost'] = estimate(cheapest)
+            routing.update({
+                'provider': provider_name,
+                'model': model,
+                'reason': f"Budget downgrade ({status['ratio']:.0%} used): {provider_name}/{model}",
+                'fallback_order': self._get_fallback_order(provider_name)
+            })
+        
+        routing['budget'] = {
+            'remaining_cost': None if status['cost'] is None else round(status['cost'], 6),
+            'remaining_tokens': status['tokens'],
+            'usage_ratio': round(status['ratio'], 3)
+        }
+        return self.budgets.start_stream(tenant, status['reservation'])
+    
+    def _cheapest_model(self) -> Optional[tuple]:
+        """Cheapest available (provider, model) named in the routing rules"""
+        candidates = [(rule['provider'], rule['model']) for rule in self.routing_rules.get('rules', [])]
+        candidates.append((
+            self.routing_rules.get('default_provider', 'openai'),
+            self.routing_rules.get('default_model', 'gpt-3.5-turbo')
+        ))
+        candidates = [c for c in candidates if c[0] in self.providers]
+        if not candidates:
+            return None
+        # Price a fixed request: providers quote per 1K or per 1M tokens
+        return min(candidates, key=lambda c: self.providers[c[0]].estimate_cost(1000, 1000, model=c[1]))
+    
+    def _record_spend(self, tenant: str, stream_budget: StreamBudget, attempt_spend: tuple, usage: Dict[str, Any]):
+        """Charge one attempt to the tenant, preferring the provider's exact usage"""
+        streamed_cost = stream_budget.cost - attempt_spend[0]
+        streamed_tokens = stream_budget.tokens - attempt_spend[1]
+        if 'cost' in usage:
+            tokens = (usage['input_tokens'] + usage['output_tokens']
+                      + usage['cache_read_tokens'] + usage['cache_write_tokens'])
+            self.budgets.record(tenant, usage['cost'], tokens)
+        else:
+            self.budgets.record(tenant, streamed_cost, streamed_tokens)
+        # Charged now, so the request's reservation no longer has to cover it
+        stream_budget.settle(streamed_cost, streamed_tokens)
+    
+    @staticmethod
+    def _chunk_charge(tenant: str, provider: BaseProvider, stream_budget: Optional[StreamBudget]):
+        """
+        Running cap for a stream: a per-chunk check that raises BudgetExceeded
+        once the tenant's budget is spent (None without a budget)
+        """
+        if stream_budget is None:
+            return None
+        
+        def charge(chunk: str):
+            chunk_tokens = max(1, len(chunk) // 4)
+            if not stream_budget.add(chunk_tokens, provider.estimate_cost(0, chunk_tokens)):
+                raise BudgetExceeded(f"Budget exhausted for {tenant} while streaming")
+        return charge
+    
+    @staticmethod
+    def _buffer_stream(chunks, phases: PhaseRecorder, on_chunk: Optional[Callable[[str], None]] = None):
+        """
+        Read a provider stream on its own thread so the client's pace does not hold the upstream
+
+        on_chunk runs as each chunk arrives from upstream, before the client
+        reads it, so a budget cap stops the generation itself rather than
+        the (possibly far behind) client.
+        """
+        if not Config.STREAM_BUFFER_ENABLED:
+            return chunks if on_chunk is None else checked_stream(chunks, on_chunk)
+        return BufferedStream(
+            chunks,
+            max_memory_bytes=Config.STREAM_BUFFER_MAX_BYTES,
+            spill_dir=Config.STREAM_BUFFER_SPILL_DIR or None,
+            max_spill_bytes=Config.STREAM_BUFFER_SPILL_MAX_BYTES,
+            on_first_chunk=lambda: phases.mark('stream'),
+            on_chunk=on_chunk
+        )
+    
+    def _record_stream_buffer(self, provider_name: str, chunks, span: Any):
+        """Count a finished stream's buffer use in the shared stats"""
+        if not isinstance(chunks, BufferedStream):
+            return
+        stats = chunks.get_stats()
+        high_water = stats['high_water_bytes']
+        span.set('buffer.high_water_bytes', high_water)
+        span.set('buffer.spilled_bytes', stats['spilled_bytes'])
+        fields = {
+            'streams': 1,
+            f"high_water:{self.buffer_buckets.bucket_field(high_water)}": 1,
+            'high_water:sum': high_water,
+            'spilled_streams': int(stats['spilled_bytes'] > 0),
+            'spilled_bytes': stats['spilled_bytes'],
+            'stalls': stats['stalls'],
+            'stalled_seconds': stats['stalled_seconds']
         }
+        if stats['drain_lead'] is not None:
+            fields['drain_lead'] = stats['drain_lead']
+        get_stats_store().incr_many('stream_buffers', provider_name, fields)
+    
+    def get_stream_buffer_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide stream buffer use per provider
+        
+        Returns:
+            Dictionary of provider name to stream count, high-water mark
+            percentiles (bytes), spill counts, reader stalls on a full
+            buffer and the average time the upstream finished before the
+            client did
+        """
+        stats = {}
+        for name, fields in get_stats_store().get('stream_buffers').items():
+            streams = fields.get('streams', 0)
+            high_water = Histogram.from_fields(fields, 'high_water:', self.buffer_buckets.buckets)
+            stats[name] = {
+                'streams': streams,
+                'high_water_bytes': {
+                    'mean': round(fields.get('high_water:sum', 0) / streams) if streams else 0,
+                    'p50': high_water.percentile(50),
+                    'p95': high_water.percentile(95),
+                    'p99': high_water.percentile(99)
+                },
+                'spilled_streams': fields.get('spilled_streams', 0),
+                'spilled_bytes': fields.get('spilled_bytes', 0),
+                'stalls': fields.get('stalls', 0),
+                'stalled_seconds': round(fields.get('stalled_seconds', 0.0), 3),
+                'avg_drain_lead': round(fields.get('drain_lead', 0.0) / streams, 3) if streams else None
+            }
+        return stats
+    
+    def _cancel_attempt(self, provider: BaseProvider, chunks, cancel: Optional[CancelToken]):
+        """Close a provider's upstream stream and record the cancelled outcome"""
+        if cancel is not None:
+            cancel.cancel()
+        if chunks is not None:
+            chunks.close()
+        provider.record_cancelled()
+    
+    def _prompt_cache_plan(self, query: str, system: Optional[str]) -> Dict[str, Any]:
+        """
+        Decide which long prefixes of a request are worth caching
+        
+        The system prompt and, for single prompts, everything before the final
+        paragraph (e.g. a pasted document followed by a question) are checked
+        against the prefix index; only recurring prefixes are cached.
+        """
+        plan = {'cache_system': False, 'cache_prefix_chars': None}
+        if not Config.PROMPT_CACHE_ENABLED:
+            return plan
+        
+        if system:
+            plan['cache_system'] = self.prefix_index.observe(system)
+        split = query.rfind('\n\n')
+        if split > 0 and self.prefix_index.observe(query[:split]):
+            plan['cache_prefix_chars'] = split
+        return plan
+    
+    def _prompt_cache_kwargs(
+        self,
+        plan: Dict[str, Any],
+        query: str,
+        messages: Optional[List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Cache breakpoint options for providers with explicit prompt caching"""
+        if not Config.PROMPT_CACHE_ENABLED:
+            return {}
+        
+        kwargs = {}
+        if plan['cache_system']:
+            kwargs['cache_system'] = True
+        
+        if messages and len(messages) > 1:
+            # Conversation: cache everything up to the previous turn, since a
+            # sticky session will send the same prefix next time
+            if sum(m['tokens'] for m in messages[:-1]) >= self.prefix_index.min_tokens:
+                messages = [dict(m) for m in messages]
+                messages[-2]['cache'] = True
+                kwargs['messages'] = messages
+        elif plan['cache_prefix_chars']:
+            kwargs['messages'] = [{
+                'role': 'user',
+                'content': query,
+                'cache_prefix_chars': plan['cache_prefix_chars']
+            }]
+        return kwargs
+    
+    def _history_budget(self, model: str, response_tokens: Optional[int] = None) -> int:
+        """Tokens available for conversation history plus the new message"""
+        limit = TokenCounter.get_context_limit(model)
+        return max(limit - (response_tokens or Config.SESSION_RESPONSE_RESERVE_TOKENS), limit // 2)
+    
+    def end_session(self, session_id: str) -> bool:
+        """Forget a conversation session"""
+        return self.conversations.delete(session_id)
     
     def get_provider_stats(self) -> List[Dict[str, Any]]:
         """Get statistics for all providers (including unavailable ones)"""
         stats = []
         
         # Return stats for all providers, not just initialized ones
-        for name in ['openai', 'anthropic', 'google']:
+        for name in self.provider_status:
             if name in self.providers:
                 # Provider is working
                 provider_stats = self.providers[name].get_stats()
@@ -353,6 +2076,153 @@ class LLMRouter:
         
         return stats
     
+    def get_live_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Compact fleet-wide stats per provider for the live stats stream
+        
+        Reads each stats store namespace once, instead of once per provider.
+        
+        Returns:
+            Dictionary of provider name to counters, cost and latency
+            percentiles (from the latency baseline while a provider has no
+            live samples, with latency_source 'baseline')
+        """
+        store = get_stats_store()
+        counters = store.get('providers')
+        timings = store.get('latency')
+        seeds = store.get('latency_baseline')
+        
+        live = {}
+        for name, status in self.provider_status.items():
+            available = name in self.providers
+            shared = counters.get(name, {})
+            entry = {
+                'provider': name,
+                'model': self.providers[name].model if available else status['model'],
+                'available': available,
+                'error': None if available else status['error'],
+                'request_count': shared.get('request_count', 0),
+                'error_count': shared.get('error_count', 0),
+                'cancelled_count': shared.get('cancelled_count', 0),
+                'total_tokens': shared.get('total_tokens', 0),
+                'total_cost': round(shared.get('total_cost', 0.0), 4)
+            }
+            seed = seeds.get(name, {})
+            baseline = seed if 'model' in seed and name not in timings else None
+            entry['latency_source'] = 'baseline' if baseline else 'live'
+            for metric in ('latency', 'ttft'):
+                if baseline:
+                    histogram = self._baseline_histogram(baseline, metric)
+                else:
+                    histogram = Histogram.from_fields(timings.get(name, {}), f"{metric}:", self.latency_buckets.buckets)
+                entry[f"{metric}_p50"] = histogram.percentile(50)
+                entry[f"{metric}_p95"] = histogram.percentile(95)
+            live[name] = entry
+        return live
+    
+    def get_routing_rules_version(self) -> str:
+        """Short hash of the routing rules; changes whenever the rules do"""
+        encoded = json.dumps(self.routing_rules, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()[:12]
+    
+    def embed(
+        self,
+        texts: List[str],
+        provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed texts, coalescing concurrent requests into upstream batches
+        
+        Cached vectors are returned without an upstream call. The remaining
+        texts go through the (provider, model) micro-batcher, so many small
+        concurrent requests become a few batched embedding calls.
+        
+        Vectors from different models are not comparable, so a failed
+        provider only falls back to the next one in the embeddings
+        provider_order when the rules set "fallback": true.
+        
+        Args:
+            texts: Texts to embed
+            provider: Optional provider name (defaults to the first
+                available provider in the embeddings provider_order)
+            model: Optional embedding model (defaults to the rules' model
+                for the provider, then the provider's default)
+            
+        Returns:
+            Dictionary with embeddings, provider, model and the number of
+            cached vectors, or with an error message
+        """
+        rules = self.routing_rules.get('embeddings', {})
+        if provider:
+            candidates = [provider]
+        else:
+            order = rules.get('provider_order') or self.routing_rules.get('fallback_order', [])
+            candidates = [name for name in order if name in self.providers] or list(self.providers)
+        
+        errors = []
+        for name in candidates:
+            target = self.providers.get(name)
+            target_model = model or rules.get('models', {}).get(name) or (target and target.embedding_model)
+            if target is None or not target_model:
+                errors.append(f"{name}: embeddings not available")
+                continue
+            
+            cache_model = f"{name}:{target_model}"
+            vectors = self.embedding_cache.get_many(cache_model, texts)
+            cached = len(vectors)
+            missing = [index for index in range(len(texts)) if index not in vectors]
+            if missing:
+                batcher = self._embedding_batcher(target, name, target_model)
+                futures = batcher.submit_many([texts[index] for index in missing])
+                try:
+                    results = [future.result(timeout=Config.REQUEST_TIMEOUT) for future in futures]
+                except Exception as e:
+                    print(f"✗ {name} embeddings failed: {e}")
+                    errors.append(f"{name}: {e}")
+                    if not rules.get('fallback', False):
+                        break
+                    continue
+                self.embedding_cache.put_many(cache_model, [texts[index] for index in missing], results)
+                vectors.update(zip(missing, results))
+            
+            return {
+                'embeddings': [vectors[index] for index in range(len(texts))],
+                'provider': name,
+                'model': target_model,
+                'cached': cached
+            }
+        
+        return {'error': 'Embedding failed: ' + '; '.join(errors) if errors else 'No embedding provider available'}
+    
+    def _embedding_batcher(self, provider: BaseProvider, name: str, model: str) -> MicroBatcher:
+        """Micro-batcher for a provider and embedding model, created on first use"""
+        key = (name, model)
+        batcher = self._embedding_batchers.get(key)
+        if batcher is None:
+            with self._embedding_lock:
+                batcher = self._embedding_batchers.get(key)
+                if batcher is None:
+                    batcher = MicroBatcher(
+                        lambda texts: provider.embed(texts, model=model),
+                        max_batch_size=Config.EMBED_MAX_BATCH_SIZE,
+                        max_wait_ms=Config.EMBED_MAX_WAIT_MS,
+                        max_in_flight=Config.EMBED_MAX_IN_FLIGHT,
+                        name=f"embed-{name}"
+                    )
+                    self._embedding_batchers[key] = batcher
+        return batcher
+    
+    def get_embedding_stats(self) -> Dict[str, Any]:
+        """Embedding cache hit rate and per-model batching stats (this worker)"""
+        return {
+            'cache': self.embedding_cache.get_stats(),
+            'batchers': {
+                f"{name}:{model}": batcher.get_stats()
+                for (name, model), batcher in self._embedding_batchers.items()
+            }
+        }
+    
     def health_check(self) -> Dict[str, bool]:
         """Check health of all providers"""
         health = {}
@@ -1,12 +1,28 @@
 # Provider package initialization
+#
+# Provider classes are resolved lazily so that importing this package does
+# not pull in every vendor SDK (openai, anthropic, google.generativeai).
 from providers.base_provider import BaseProvider
-from providers.openai_provider import OpenAIProvider
-from providers.anthropic_provider import AnthropicProvider
-from providers.google_provider import GoogleProvider
+from providers.registry import PROVIDER_REGISTRY, get_provider_class
+
+_LAZY_CLASSES = {
+    'OpenAIProvider': 'openai',
+    'AnthropicProvider': 'anthropic',
+    'GoogleProvider': 'google'
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        return get_provider_class(_LAZY_CLASSES[name])
+    raise AttributeError(f"module 'providers' has no attribute '{name}'")
+
 
 __all__ = [
     'BaseProvider',
     'OpenAIProvider',
     'AnthropicProvider',
-    'GoogleProvider'
+    'GoogleProvider',
+    'PROVIDER_REGISTRY',
+    'get_provider_class'
 ]
@@ -1,5 +1,4 @@
-from typing import Generator, Dict, Any
-import anthropic
+from typing import Generator, Dict, Any, List, Optional
 from providers.base_provider import BaseProvider
 
 class AnthropicProvider(BaseProvider):
@@ -12,50 +11,138 @@ class AnthropicProvider(BaseProvider):
         'claude-3-haiku-20240307': {'input': 0.25, 'output': 1.25},
     }
     
+    # Prompt caching: writes cost 25% more than input, reads 10% of input
+    SUPPORTS_PROMPT_CACHE = True
+    CACHE_WRITE_MULTIPLIER = 1.25
+    CACHE_READ_MULTIPLIER = 0.1
+    PROMPT_CACHING_BETA = 'prompt-caching-2024-07-31'
+    
+    SUPPORTS_ASSISTANT_PREFILL = True
+    
+    # The API requires max_tokens; used when the router sends no cap
+    DEFAULT_MAX_TOKENS = 4096
+    
     def __init__(self, api_key: str, model: str = 'claude-3-sonnet-20240229'):
         super().__init__(api_key, model)
-        self.client = anthropic.Anthropic(api_key=api_key)
+    
+    def _create_client(self):
+        """Create the Anthropic client"""
+        import anthropic
+        return anthropic.Anthropic(api_key=self.api_key)
     
     def query(self, prompt: str, stream: bool = True, **kwargs) -> Generator[str, None, None]:
         """Send query to Anthropic Claude"""
+        options, _ = self._split_kwargs(kwargs)
         try:
-            max_tokens = kwargs.get('max_tokens', 4096)
+            max_tokens = kwargs.get('max_tokens') or self.DEFAULT_MAX_TOKENS
+            messages, input_tokens = self._prepare_messages(
+                prompt, options.get('messages'), options.get('system')
+            )
+            request = {
+                'model': self.model,
+                'max_tokens': max_tokens,
+                'messages': self._to_anthropic_messages(options.get('messages'), messages)
+            }
+            if options.get('system'):
+                system_block = {'type': 'text', 'text': options['system']}
+                if options.get('cache_system'):
+                    system_block['cache_control'] = {'type': 'ephemeral'}
+                request['system'] = [system_block]
+            if self._uses_cache_control(options):
+                request['extra_headers'] = {'anthropic-beta': self.PROMPT_CACHING_BETA}
             
             if stream:
                 full_response = ""
-                with self.client.messages.stream(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": prompt}]
-                ) as stream:
-                    for text in stream.text_stream:
-                        full_response += text
-                        yield text
+                # Leaving the with block (including on early close) closes the stream
+                self._phase(options, 'connect')
+                with self.client.messages.stream(**request) as stream:
+                    self._phase(options, 'ttft')
+                    unwatch = self._watch_cancel(options, stream)
+                    try:
+                        for text in stream.text_stream:
+                            full_response += text
+                            yield text
+                        final_message = self._final_message(stream)
+                    finally:
+                        unwatch()
                 
-                # Update stats after streaming complete
-                input_tokens = self.count_tokens(prompt)
-                output_tokens = self.count_tokens(full_response)
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                # Update stats after streaming complete, preferring exact usage
+                self._phase(options, 'usage')
+                usage = getattr(final_message, 'usage', None)
+                if usage is not None:
+                    self._record_usage(options.get('usage'), *self._usage_tokens(usage))
+                else:
+                    self._record_usage(options.get('usage'), input_tokens, self.count_tokens(full_response))
             else:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": prompt}]
-                )
+                self._phase(options, 'connect')
+                response = self.client.messages.create(**request)
+                self._phase(options, 'ttft')
                 content = response.content[0].text
                 
                 # Update stats
-                input_tokens = response.usage.input_tokens
-                output_tokens = response.usage.output_tokens
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                self._record_usage(options.get('usage'), *self._usage_tokens(response.usage))
                 
                 yield content
                 
         except Exception as e:
-            self.update_stats(0, 0, is_error=True)
-            raise Exception(f"Anthropic error: {str(e)}")
+            raise self._wrap_error("Anthropic", e, options)
+    
+    @staticmethod
+    def _uses_cache_control(options: Dict[str, Any]) -> bool:
+        """Whether any cache breakpoint is requested"""
+        if options.get('cache_system') and options.get('system'):
+            return True
+        return any(m.get('cache') or m.get('cache_prefix_chars') for m in options.get('messages') or [])
+    
+    @staticmethod
+    def _to_anthropic_messages(
+        raw_messages: Optional[List[Dict[str, Any]]],
+        messages: List[Dict[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn cache marks on messages into cache_control content blocks
+        
+        'cache': True places a breakpoint after the whole message;
+        'cache_prefix_chars': n splits the message and places a breakpoint
+        after its first n characters (e.g. a shared document before a question).
+        """
+        if not raw_messages:
+            return messages
+        
+        converted = []
+        for raw, message in zip(raw_messages, messages):
+            split = raw.get('cache_prefix_chars')
+            if split:
+                content = [
+                    {'type': 'text', 'text': message['content'][:split],
+                     'cache_control': {'type': 'ephemeral'}},
+                    {'type': 'text', 'text': message['content'][split:]}
+                ]
+            elif raw.get('cache'):
+                content = [{'type': 'text', 'text': message['content'],
+                            'cache_control': {'type': 'ephemeral'}}]
+            else:
+                content = message['content']
+            converted.append({'role': message['role'], 'content': content})
+        return converted
+    
+    @staticmethod
+    def _final_message(stream):
+        """Final message of a stream (with usage), if the SDK exposes it"""
+        try:
+            return stream.get_final_message()
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _usage_tokens(usage) -> tuple:
+        """(input, output, cache read, cache write) token counts from an API usage object"""
+        return (
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, 'cache_read_input_tokens', None) or 0,
+            getattr(usage, 'cache_creation_input_tokens', None) or 0
+        )
     
     def count_tokens(self, text: str) -> int:
         """Estimate token count for Claude"""
@@ -63,9 +150,17 @@ class AnthropicProvider(BaseProvider):
         # Rough estimation: ~4 characters per token
         return len(text) // 4
     
-    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        model: Optional[str] = None
+    ) -> float:
         """Estimate cost based on token usage"""
-        pricing = self.PRICING.get(self.model, self.PRICING['claude-3-sonnet-20240229'])
+        pricing = self.PRICING.get(model or self.model, self.PRICING['claude-3-sonnet-20240229'])
+        input_tokens += self._cached_input_tokens(cache_read_tokens, cache_write_tokens)
         input_cost = (input_tokens / 1_000_000) * pricing['input']
         output_cost = (output_tokens / 1_000_000) * pricing['output']
         return input_cost + output_cost
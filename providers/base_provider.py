@@ -1,10 +1,38 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Generator
+from typing import Dict, Any, Optional, Generator, List, Tuple
+import copy
+import threading
 import time
+from utils.shared_state import get_stats_store
+from utils.cancellation import CancelToken, RequestCancelled
 
 class BaseProvider(ABC):
     """Abstract base class for LLM providers"""
     
+    # Router-level options passed through query() kwargs; providers must not
+    # forward these to their SDK
+    ROUTER_KWARGS = ('messages', 'system', 'cache_system', 'usage', 'cancel', 'phase')
+    
+    # Whether the provider honours explicit cache breakpoints (cache_system,
+    # per-message 'cache' / 'cache_prefix_chars' marks)
+    SUPPORTS_PROMPT_CACHE = False
+    
+    # Whether the provider continues a trailing assistant message (used to
+    # resume a partial answer after a mid-stream failure)
+    SUPPORTS_ASSISTANT_PREFILL = False
+    
+    # Price of cached input tokens relative to the normal input price
+    CACHE_WRITE_MULTIPLIER = 1.0
+    CACHE_READ_MULTIPLIER = 1.0
+    
+    # Embedding model used when embed() is not given one (None if the
+    # provider has no embeddings API)
+    DEFAULT_EMBEDDING_MODEL: Optional[str] = None
+    
+    # Set to False on a for_model() copy whose requests must stay out of the
+    # provider's fleet-wide stats (e.g. shadow traffic, counted separately)
+    record_stats = True
+    
     def __init__(self, api_key: str, model: str):
         """
         Initialize provider
@@ -20,6 +48,55 @@ class BaseProvider(ABC):
         self.total_cost = 0.0
         self.request_count = 0
         self.error_count = 0
+        self.embedding_model = self.DEFAULT_EMBEDDING_MODEL
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """SDK client, created (and its SDK imported) on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
+    @abstractmethod
+    def _create_client(self):
+        """
+        Import the vendor SDK and build its client
+        
+        Returns:
+            SDK client object
+        """
+        pass
+    
+    def warm(self):
+        """Import the SDK and build the client ahead of the first request"""
+        _ = self.client
+    
+    def for_model(self, model: str) -> 'BaseProvider':
+        """
+        Copy of this provider pinned to a model
+        
+        The copy shares the SDK client (built here if needed) and the
+        provider's fleet-wide stats, but setting its model does not affect
+        requests running on this instance.
+        
+        Args:
+            model: Model the copy queries
+            
+        Returns:
+            Provider copy
+        """
+        self.warm()
+        clone = copy.copy(self)
+        clone.model = model
+        return clone
     
     @abstractmethod
     def query(self, prompt: str, stream: bool = True, **kwargs) -> Generator[str, None, None]:
@@ -29,7 +106,14 @@ class BaseProvider(ABC):
         Args:
             prompt: The user's query
             stream: Whether to stream the response
-            **kwargs: Additional provider-specific parameters
+            **kwargs: Additional provider-specific parameters. Router options:
+                messages: conversation (role/content/tokens dicts), sent
+                    instead of the bare prompt when given
+                system: system prompt
+                cache_system: mark the system prompt as a cache breakpoint
+                usage: dict filled with this request's token usage and cost
+                cancel: CancelToken; cancelling it closes the upstream stream
+                    and makes the query raise RequestCancelled
             
         Yields:
             Response chunks if streaming, or full response
@@ -50,13 +134,23 @@ class BaseProvider(ABC):
         pass
     
     @abstractmethod
-    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        model: Optional[str] = None
+    ) -> float:
         """
         Estimate cost for a request
         
         Args:
-            input_tokens: Number of input tokens
+            input_tokens: Number of uncached input tokens
             output_tokens: Number of output tokens
+            cache_read_tokens: Input tokens served from the prompt cache
+            cache_write_tokens: Input tokens written to the prompt cache
+            model: Model to price (defaults to the current model)
             
         Returns:
             Estimated cost in USD
@@ -73,6 +167,187 @@ class BaseProvider(ABC):
         """
         pass
     
+    def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> List[List[float]]:
+        """
+        Embed a batch of texts in one upstream call
+        
+        Args:
+            texts: Texts to embed
+            model: Embedding model (defaults to embedding_model)
+            usage: Optional dict filled with the call's token usage and cost
+            
+        Returns:
+            One vector per text, in order
+        """
+        raise NotImplementedError(f"{self.get_provider_name()} does not support embeddings")
+    
+    def _record_embedding_usage(
+        self,
+        usage: Optional[Dict[str, Any]],
+        texts: int,
+        tokens: int,
+        model: str
+    ):
+        """Price an embedding call, update stats and fill the caller's usage dict"""
+        cost = self.estimate_cost(tokens, 0, model=model)
+        self.total_tokens_used += tokens
+        self.total_cost += cost
+        get_stats_store().incr_many('providers', self.get_provider_name(), {
+            'embedding_requests': 1,
+            'embedding_texts': texts,
+            'total_tokens': tokens,
+            'total_cost': cost
+        })
+        if usage is not None:
+            usage.update({'input_tokens': tokens, 'cost': cost})
+    
+    def _embedding_error(self, label: str, error: Exception) -> Exception:
+        """Count a failed embedding call and build the exception to raise"""
+        get_stats_store().incr('providers', self.get_provider_name(), 'embedding_errors')
+        return Exception(f"{label} embedding error: {str(error)}")
+    
+    def _cached_input_tokens(self, cache_read_tokens: int, cache_write_tokens: int) -> float:
+        """Cached token counts expressed as equivalent normal input tokens"""
+        return (cache_read_tokens * self.CACHE_READ_MULTIPLIER
+                + cache_write_tokens * self.CACHE_WRITE_MULTIPLIER)
+    
+    def _split_kwargs(self, kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Separate router options from SDK parameters"""
+        options = {k: v for k, v in kwargs.items() if k in self.ROUTER_KWARGS}
+        sdk_kwargs = {k: v for k, v in kwargs.items() if k not in self.ROUTER_KWARGS}
+        return options, sdk_kwargs
+    
+    def _record_usage(
+        self,
+        usage: Optional[Dict[str, Any]],
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ):
+        """
+        Price a completed request, update stats and fill the caller's usage dict
+        
+        Args:
+            usage: Optional dict passed by the caller through query(usage=...)
+            input_tokens: Number of uncached input tokens
+            output_tokens: Number of output tokens
+            cache_read_tokens: Input tokens served from the prompt cache
+            cache_write_tokens: Input tokens written to the prompt cache
+        """
+        cost = self.estimate_cost(input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+        uncached_cost = self.estimate_cost(
+            input_tokens + cache_read_tokens + cache_write_tokens, output_tokens
+        )
+        total_tokens = input_tokens + cache_read_tokens + cache_write_tokens + output_tokens
+        self.update_stats(
+            total_tokens, cost,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+            cache_savings=uncached_cost - cost
+        )
+        
+        if usage is not None:
+            usage.update({
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'cache_read_tokens': cache_read_tokens,
+                'cache_write_tokens': cache_write_tokens,
+                'cost': cost,
+                'cache_savings': uncached_cost - cost
+            })
+    
+    @staticmethod
+    def _close_stream(stream):
+        """Close an SDK stream so its upstream connection is released"""
+        if stream is None:
+            return
+        closers = [getattr(stream, 'close', None), getattr(getattr(stream, 'response', None), 'close', None)]
+        for closer in closers:
+            if callable(closer):
+                try:
+                    closer()
+                    return
+                except Exception:
+                    pass
+        # Gemini responses wrap a grpc streaming call
+        cancel = getattr(getattr(stream, '_iterator', None), 'cancel', None)
+        if callable(cancel):
+            cancel()
+    
+    @staticmethod
+    def _phase(options: Dict[str, Any], name: str):
+        """
+        Tell the caller's tracer a new phase of the request has begun
+        
+        Phases: 'connect' when the upstream request is sent (until the SDK
+        returns the response), 'ttft' while waiting for the first token, and
+        'usage' for token counting after the stream ends.
+        """
+        phase = options.get('phase')
+        if phase is not None:
+            phase(name)
+    
+    def _watch_cancel(self, options: Dict[str, Any], stream):
+        """
+        Close the stream as soon as the request's cancel token fires
+        
+        Returns:
+            Function that stops watching (call once the stream is finished)
+        """
+        cancel: Optional[CancelToken] = options.get('cancel')
+        if cancel is None:
+            return lambda: None
+        return cancel.on_cancel(lambda: self._close_stream(stream))
+    
+    def _wrap_error(self, label: str, error: Exception, options: Dict[str, Any]) -> Exception:
+        """Exception to raise for a failed query; cancellations are not errors"""
+        cancel: Optional[CancelToken] = options.get('cancel')
+        if isinstance(error, RequestCancelled) or (cancel is not None and cancel.cancelled):
+            return RequestCancelled(f"{label} request cancelled")
+        self.update_stats(0, 0, is_error=True)
+        return Exception(f"{label} error: {str(error)}")
+    
+    def record_cancelled(self):
+        """Count a request abandoned because the client went away"""
+        if not self.record_stats:
+            return
+        get_stats_store().incr('providers', self.get_provider_name(), 'cancelled_count')
+    
+    def _prepare_messages(
+        self,
+        prompt: str,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        system: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Build the chat messages to send and count their input tokens
+        
+        Args:
+            prompt: The user's query, used when there is no conversation
+            messages: Optional conversation messages; their cached 'tokens'
+                counts are reused instead of re-tokenizing the history
+            system: Optional system prompt (counted, not included)
+            
+        Returns:
+            Tuple of (role/content messages, input token count)
+        """
+        system_tokens = self.count_tokens(system) if system else 0
+        if not messages:
+            return [{"role": "user", "content": prompt}], self.count_tokens(prompt) + system_tokens
+        
+        api_messages = [{"role": m['role'], "content": m['content']} for m in messages]
+        input_tokens = sum(
+            m['tokens'] if 'tokens' in m else self.count_tokens(m['content'])
+            for m in messages
+        )
+        return api_messages, input_tokens + system_tokens
+    
     def get_provider_name(self) -> str:
         """Get the provider name"""
         return self.__class__.__name__.replace('Provider', '').lower()
@@ -81,21 +356,41 @@ class BaseProvider(ABC):
         """
         Get provider statistics
         
+        Counters are read from the stats store so that every worker
+        reports the same fleet-wide numbers.
+        
         Returns:
             Dictionary with provider stats
         """
+        shared = get_stats_store().get('providers', self.get_provider_name())
+        request_count = shared.get('request_count', 0)
+        error_count = shared.get('error_count', 0)
         return {
             'provider': self.get_provider_name(),
             'model': self.model,
-            'total_tokens': self.total_tokens_used,
-            'total_cost': round(self.total_cost, 4),
-            'request_count': self.request_count,
-            'error_count': self.error_count,
-            'error_rate': round(self.error_count / max(self.request_count, 1), 2)
+            'total_tokens': shared.get('total_tokens', 0),
+            'total_cost': round(shared.get('total_cost', 0.0), 4),
+            'request_count': request_count,
+            'error_count': error_count,
+            'error_rate': round(error_count / max(request_count, 1), 2),
+            'cancelled_count': shared.get('cancelled_count', 0),
+            'cache_read_tokens': shared.get('cache_read_tokens', 0),
+            'cache_write_tokens': shared.get('cache_write_tokens', 0),
+            'cache_savings': round(shared.get('cache_savings', 0.0), 4)
         }
     
-    def update_stats(self, tokens: int, cost: float, is_error: bool = False):
+    def update_stats(
+        self,
+        tokens: int,
+        cost: float,
+        is_error: bool = False,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        cache_savings: float = 0.0
+    ):
         """Update provider statistics"""
+        if not self.record_stats:
+            return
         self.request_count += 1
         if is_error:
             self.error_count += 1
@@ -103,6 +398,16 @@ class BaseProvider(ABC):
             self.total_tokens_used += tokens
             self.total_cost += cost
         self.last_request_time = time.time()
+        
+        get_stats_store().incr_many('providers', self.get_provider_name(), {
+            'request_count': 1,
+            'error_count': 1 if is_error else 0,
+            'total_tokens': 0 if is_error else tokens,
+            'total_cost': 0.0 if is_error else cost,
+            'cache_read_tokens': cache_read_tokens,
+            'cache_write_tokens': cache_write_tokens,
+            'cache_savings': cache_savings
+        })
     
     def __str__(self):
         return f"{self.get_provider_name()}({self.model})"
@@ -1,5 +1,4 @@
-from typing import Generator, Dict, Any
-import google.generativeai as genai
+from typing import Generator, Dict, Any, List, Optional
 from providers.base_provider import BaseProvider
 
 class GoogleProvider(BaseProvider):
@@ -10,45 +9,116 @@ class GoogleProvider(BaseProvider):
         'gemini-1.5-pro': {'input': 3.50, 'output': 10.50},
         'gemini-1.5-flash': {'input': 0.35, 'output': 1.05},
         'gemini-pro': {'input': 0.50, 'output': 1.50},
+        'text-embedding-004': {'input': 0.0, 'output': 0.0},
     }
     
+    DEFAULT_EMBEDDING_MODEL = 'text-embedding-004'
+    
     def __init__(self, api_key: str, model: str = 'gemini-1.5-flash'):
         super().__init__(api_key, model)
-        genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel(model)
+        # Gemini clients are bound to one model: one per model name, shared
+        # with for_model() copies
+        self._model_clients: Dict[str, Any] = {}
+    
+    @property
+    def client(self):
+        """Gemini model client for the current model, created on first use of that model"""
+        client = self._model_clients.get(self.model)
+        if client is None:
+            with self._client_lock:
+                client = self._model_clients.get(self.model)
+                if client is None:
+                    client = self._model_clients[self.model] = self._create_client()
+        return client
+    
+    def _create_client(self):
+        """Create the Gemini model client for self.model (imports grpc)"""
+        import google.generativeai as genai
+        genai.configure(api_key=self.api_key)
+        return genai.GenerativeModel(self.model)
     
     def query(self, prompt: str, stream: bool = True, **kwargs) -> Generator[str, None, None]:
         """Send query to Google Gemini"""
+        options, sdk_kwargs = self._split_kwargs(kwargs)
         try:
+            messages, input_tokens = self._prepare_messages(
+                prompt, options.get('messages'), options.get('system')
+            )
+            if options.get('system'):
+                # This SDK version has no system instruction; prepend it instead
+                messages[0] = {
+                    'role': messages[0]['role'],
+                    'content': f"{options['system']}\n\n{messages[0]['content']}"
+                }
+            contents = self._to_contents(messages) if len(messages) > 1 else messages[0]['content']
+            generation_config = {}
+            if sdk_kwargs.get('max_tokens'):
+                generation_config['max_output_tokens'] = sdk_kwargs['max_tokens']
+            
             if stream:
                 full_response = ""
-                response = self.client.generate_content(prompt, stream=True)
+                self._phase(options, 'connect')
+                response = self.client.generate_content(
+                    contents, stream=True, generation_config=generation_config or None
+                )
+                self._phase(options, 'ttft')
                 
-                for chunk in response:
-                    if chunk.text:
-                        full_response += chunk.text
-                        yield chunk.text
+                unwatch = self._watch_cancel(options, response)
+                try:
+                    for chunk in response:
+                        if chunk.text:
+                            full_response += chunk.text
+                            yield chunk.text
+                finally:
+                    unwatch()
+                    self._close_stream(response)
                 
                 # Update stats after streaming complete
-                input_tokens = self.count_tokens(prompt)
+                self._phase(options, 'usage')
                 output_tokens = self.count_tokens(full_response)
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                self._record_usage(options.get('usage'), input_tokens, output_tokens)
             else:
-                response = self.client.generate_content(prompt)
+                self._phase(options, 'connect')
+                response = self.client.generate_content(contents, generation_config=generation_config or None)
+                self._phase(options, 'ttft')
                 content = response.text
                 
                 # Update stats
-                input_tokens = self.count_tokens(prompt)
                 output_tokens = self.count_tokens(content)
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                self._record_usage(options.get('usage'), input_tokens, output_tokens)
                 
                 yield content
                 
         except Exception as e:
-            self.update_stats(0, 0, is_error=True)
-            raise Exception(f"Google error: {str(e)}")
+            raise self._wrap_error("Google", e, options)
+    
+    def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> List[List[float]]:
+        """Embed a batch of texts with one embed_content call"""
+        model = model or self.embedding_model
+        try:
+            import google.generativeai as genai
+            _ = self.client  # Configures the SDK's API key
+            result = genai.embed_content(model=f"models/{model}", content=list(texts))
+        except Exception as e:
+            raise self._embedding_error("Google", e)
+        
+        # The API reports no usage; estimate rather than call count_tokens per text
+        tokens = sum(len(text) for text in texts) // 4
+        self._record_embedding_usage(usage, len(texts), tokens, model)
+        return result['embedding']
+    
+    @staticmethod
+    def _to_contents(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Convert chat messages to Gemini contents (assistant -> model role)"""
+        return [
+            {'role': 'model' if m['role'] == 'assistant' else 'user', 'parts': [m['content']]}
+            for m in messages
+        ]
     
     def count_tokens(self, text: str) -> int:
         """Estimate token count for Gemini"""
@@ -60,9 +130,17 @@ class GoogleProvider(BaseProvider):
             # Fallback: rough estimation
             return len(text) // 4
     
-    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        model: Optional[str] = None
+    ) -> float:
         """Estimate cost based on token usage"""
-        pricing = self.PRICING.get(self.model, self.PRICING['gemini-1.5-flash'])
+        pricing = self.PRICING.get(model or self.model, self.PRICING['gemini-1.5-flash'])
+        input_tokens += self._cached_input_tokens(cache_read_tokens, cache_write_tokens)
         input_cost = (input_tokens / 1_000_000) * pricing['input']
         output_cost = (output_tokens / 1_000_000) * pricing['output']
         return input_cost + output_cost
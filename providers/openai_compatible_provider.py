@@ -0,0 +1,77 @@
+from typing import Dict, Any, Optional
+from providers.openai_provider import OpenAIProvider
+from utils.token_counter import TokenCounter
+
+class OpenAICompatibleProvider(OpenAIProvider):
+    """Generic provider for servers implementing the OpenAI chat completions API
+    
+    Covers local inference servers such as vLLM, llama.cpp and Ollama, as
+    well as hosted OpenAI-compatible endpoints. Base URL, model list,
+    pricing and context limits all come from configuration.
+    """
+    
+    # Not every OpenAI-compatible server supports stream_options
+    STREAM_USAGE = False
+    CACHE_READ_MULTIPLIER = 1.0
+    
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        name: str = 'local',
+        base_url: str = 'http://localhost:8000/v1',
+        models: Optional[Dict[str, Dict[str, Any]]] = None,
+        timeout: Optional[float] = None,
+        embedding_model: Optional[str] = None
+    ):
+        """
+        Initialize provider
+        
+        Args:
+            api_key: API key (local servers usually accept any value)
+            model: Default model name
+            name: Provider name used for routing rules and stats
+            base_url: Base URL of the OpenAI-compatible API
+            models: Per-model settings: 'input'/'output' price per 1M tokens
+                and 'context' window size
+            timeout: Request timeout in seconds
+            embedding_model: Model served at /embeddings (None disables
+                embeddings)
+        """
+        super().__init__(api_key or 'not-needed', model)
+        self.name = name
+        self.base_url = base_url
+        self.models = models or {}
+        self.timeout = timeout
+        self.embedding_model = embedding_model
+        
+        for model_name, settings in self.models.items():
+            if 'context' in settings:
+                TokenCounter.register_context_limit(model_name, settings['context'])
+    
+    def _create_client(self):
+        """Create an OpenAI client pointed at the configured base URL"""
+        import openai
+        options = {'api_key': self.api_key, 'base_url': self.base_url}
+        if self.timeout is not None:
+            options['timeout'] = self.timeout
+        return openai.OpenAI(**options)
+    
+    def get_provider_name(self) -> str:
+        """Get the configured provider name"""
+        return self.name
+    
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        model: Optional[str] = None
+    ) -> float:
+        """Estimate cost from configured per-1M-token pricing (free if unset)"""
+        pricing = self.models.get(model or self.model, {})
+        input_tokens += cache_read_tokens + cache_write_tokens
+        input_cost = (input_tokens / 1_000_000) * pricing.get('input', 0.0)
+        output_cost = (output_tokens / 1_000_000) * pricing.get('output', 0.0)
+        return input_cost + output_cost
@@ -1,6 +1,7 @@
-from typing import Generator, Dict, Any
-import openai
-import tiktoken
+from typing import Generator, Dict, Any, List, Optional
+from array import array
+import base64
+import sys
 from providers.base_provider import BaseProvider
 
 class OpenAIProvider(BaseProvider):
@@ -12,67 +13,177 @@ class OpenAIProvider(BaseProvider):
         'gpt-4-turbo-preview': {'input': 0.01, 'output': 0.03},
         'gpt-3.5-turbo': {'input': 0.0005, 'output': 0.0015},
         'gpt-3.5-turbo-16k': {'input': 0.003, 'output': 0.004},
+        'text-embedding-3-small': {'input': 0.00002, 'output': 0.0},
+        'text-embedding-3-large': {'input': 0.00013, 'output': 0.0},
+        'text-embedding-ada-002': {'input': 0.0001, 'output': 0.0},
     }
     
+    # Automatic prefix caching bills cached input tokens at half price
+    CACHE_READ_MULTIPLIER = 0.5
+    
+    # Ask for a final usage chunk when streaming (exact and cached token counts)
+    STREAM_USAGE = True
+    
+    DEFAULT_EMBEDDING_MODEL = 'text-embedding-3-small'
+    
     def __init__(self, api_key: str, model: str = 'gpt-3.5-turbo'):
         super().__init__(api_key, model)
-        openai.api_key = api_key
-        self.client = openai.OpenAI(api_key=api_key)
-        
-        # Initialize tokenizer
-        try:
-            self.encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self._encoding = None
+    
+    def _create_client(self):
+        """Create the OpenAI client"""
+        import openai
+        openai.api_key = self.api_key
+        return openai.OpenAI(api_key=self.api_key)
+    
+    @property
+    def encoding(self):
+        """Tokenizer for the model, loaded on first use (None if unavailable)"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                # Don't retry (and re-download) on every call
+                self._encoding = False
+        return self._encoding or None
+    
+    def warm(self):
+        """Build the client and load the tokenizer"""
+        super().warm()
+        _ = self.encoding
     
     def query(self, prompt: str, stream: bool = True, **kwargs) -> Generator[str, None, None]:
         """Send query to OpenAI"""
+        options, sdk_kwargs = self._split_kwargs(kwargs)
         try:
-            messages = [{"role": "user", "content": prompt}]
+            messages, input_tokens = self._prepare_messages(
+                prompt, options.get('messages'), options.get('system')
+            )
+            if options.get('system'):
+                # OpenAI caches stable prefixes automatically; the system
+                # prompt goes first so it is part of that prefix
+                messages.insert(0, {"role": "system", "content": options['system']})
             
+            if stream and self.STREAM_USAGE:
+                extra_body = dict(sdk_kwargs.pop('extra_body', None) or {})
+                extra_body.setdefault('stream_options', {'include_usage': True})
+                sdk_kwargs['extra_body'] = extra_body
+            
+            self._phase(options, 'connect')
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 stream=stream,
-                **kwargs
+                **sdk_kwargs
             )
+            self._phase(options, 'ttft')
             
             if stream:
                 full_response = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield content
+                usage = None
+                unwatch = self._watch_cancel(options, response)
+                try:
+                    for chunk in response:
+                        # The usage chunk (if requested) arrives last, without choices
+                        if getattr(chunk, 'usage', None):
+                            usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            full_response += content
+                            yield content
+                finally:
+                    # Also runs when the consumer closes this generator early
+                    unwatch()
+                    self._close_stream(response)
                 
-                # Update stats after streaming complete
-                input_tokens = self.count_tokens(prompt)
-                output_tokens = self.count_tokens(full_response)
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                # Update stats after streaming complete, preferring exact usage
+                self._phase(options, 'usage')
+                if usage is not None:
+                    self._record_usage(options.get('usage'), *self._usage_tokens(usage))
+                else:
+                    self._record_usage(options.get('usage'), input_tokens, self.count_tokens(full_response))
             else:
                 content = response.choices[0].message.content
-                input_tokens = self.count_tokens(prompt)
-                output_tokens = self.count_tokens(content)
-                cost = self.estimate_cost(input_tokens, output_tokens)
-                self.update_stats(input_tokens + output_tokens, cost)
+                if getattr(response, 'usage', None) is not None:
+                    self._record_usage(options.get('usage'), *self._usage_tokens(response.usage))
+                else:
+                    self._record_usage(options.get('usage'), input_tokens, self.count_tokens(content))
                 yield content
                 
         except Exception as e:
-            self.update_stats(0, 0, is_error=True)
-            raise Exception(f"OpenAI error: {str(e)}")
+            raise self._wrap_error("OpenAI", e, options)
+    
+    def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> List[List[float]]:
+        """Embed a batch of texts with the embeddings API"""
+        model = model or self.embedding_model
+        try:
+            # base64 float32 instead of JSON floats: the SDK would otherwise
+            # build every float through its response models, which costs
+            # more CPU than the upstream call for large batches
+            response = self.client.embeddings.create(model=model, input=list(texts), encoding_format='base64')
+        except Exception as e:
+            raise self._embedding_error("OpenAI", e)
+        
+        tokens = getattr(getattr(response, 'usage', None), 'prompt_tokens', None)
+        if tokens is None:
+            tokens = sum(self.count_tokens(text) for text in texts)
+        self._record_embedding_usage(usage, len(texts), tokens, model)
+        return [self._decode_embedding(item.embedding) for item in sorted(response.data, key=lambda item: item.index)]
+    
+    @staticmethod
+    def _decode_embedding(embedding) -> List[float]:
+        """Vector from a base64 float32 payload (or a plain list, for servers that ignore encoding_format)"""
+        if not isinstance(embedding, str):
+            return list(embedding)
+        vector = array('f')
+        vector.frombytes(base64.b64decode(embedding))
+        if sys.byteorder == 'big':
+            vector.byteswap()
+        return vector.tolist()
+    
+    @staticmethod
+    def _usage_tokens(usage) -> tuple:
+        """(uncached input, output, cache read) token counts from an API usage object"""
+        def field(obj, name):
+            if obj is None:
+                return None
+            return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        
+        prompt_tokens = field(usage, 'prompt_tokens') or 0
+        cached_tokens = field(field(usage, 'prompt_tokens_details'), 'cached_tokens') or 0
+        return prompt_tokens - cached_tokens, field(usage, 'completion_tokens') or 0, cached_tokens
     
     def count_tokens(self, text: str) -> int:
         """Count tokens using tiktoken"""
+        encoding = self.encoding
+        if encoding is None:
+            return len(text) // 4
         try:
-            return len(self.encoding.encode(text))
+            return len(encoding.encode(text))
         except:
             # Fallback: rough estimation
             return len(text) // 4
     
-    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        model: Optional[str] = None
+    ) -> float:
         """Estimate cost based on token usage"""
-        pricing = self.PRICING.get(self.model, self.PRICING['gpt-3.5-turbo'])
+        pricing = self.PRICING.get(model or self.model, self.PRICING['gpt-3.5-turbo'])
+        input_tokens += self._cached_input_tokens(cache_read_tokens, cache_write_tokens)
         input_cost = (input_tokens / 1000) * pricing['input']
         output_cost = (output_tokens / 1000) * pricing['output']
         return input_cost + output_cost
@@ -0,0 +1,149 @@
+import importlib
+from importlib import metadata
+from typing import Dict, Any, Optional, Type
+
+from providers.base_provider import BaseProvider
+
+# Entry point group third-party packages use to register provider classes
+ENTRY_POINT_GROUP = 'llm_router.providers'
+
+# Provider types usable from the "providers" section of routing_rules.json
+PROVIDER_TYPES = {
+    'openai_compatible': ('providers.openai_compatible_provider', 'OpenAICompatibleProvider')
+}
+
+# Built-in providers. Modules are only imported when a provider with a
+# configured API key is created, so unused SDKs never load.
+PROVIDER_REGISTRY: Dict[str, Dict[str, Any]] = {
+    'openai': {
+        'module': 'providers.openai_provider',
+        'class': 'OpenAIProvider',
+        'api_key_setting': 'OPENAI_API_KEY',
+        'default_model': 'gpt-4',
+        'label': 'OpenAI'
+    },
+    'anthropic': {
+        'module': 'providers.anthropic_provider',
+        'class': 'AnthropicProvider',
+        'api_key_setting': 'ANTHROPIC_API_KEY',
+        'default_model': 'claude-3-sonnet-20240229',
+        'label': 'Anthropic'
+    },
+    'google': {
+        'module': 'providers.google_provider',
+        'class': 'GoogleProvider',
+        'api_key_setting': 'GOOGLE_API_KEY',
+        'default_model': 'gemini-2.5-flash',
+        'label': 'Google'
+    }
+}
+
+
+def register_provider(
+    name: str,
+    module: str,
+    class_name: str,
+    api_key_setting: Optional[str] = None,
+    default_model: str = '',
+    label: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None
+):
+    """
+    Register (or replace) a provider
+    
+    Args:
+        name: Provider name used in routing rules and fallback order
+        module: Module containing the provider class
+        class_name: Provider class name
+        api_key_setting: Config attribute or environment variable holding the
+            API key; None for providers that need no key (local servers)
+        default_model: Model used until a routing rule selects another
+        label: Display name for logs
+        options: Extra keyword arguments passed to the provider constructor
+    """
+    PROVIDER_REGISTRY[name] = {
+        'module': module,
+        'class': class_name,
+        'api_key_setting': api_key_setting,
+        'default_model': default_model,
+        'label': label or name,
+        'options': options or {}
+    }
+
+
+def register_config_providers(provider_configs: Dict[str, Dict[str, Any]]):
+    """
+    Register providers declared in the "providers" section of routing rules
+    
+    Example entry:
+        "local": {
+            "type": "openai_compatible",
+            "base_url": "http://127.0.0.1:8000/v1",
+            "default_model": "llama-3-8b-instruct",
+            "models": {"llama-3-8b-instruct": {"input": 0, "output": 0, "context": 8192}},
+            "embedding_model": "nomic-embed-text"
+        }
+    
+    "type" is either a known provider type or "package.module:ClassName".
+    
+    Args:
+        provider_configs: Mapping of provider name to its settings
+    """
+    for name, settings in provider_configs.items():
+        provider_type = settings.get('type', 'openai_compatible')
+        if provider_type in PROVIDER_TYPES:
+            module, class_name = PROVIDER_TYPES[provider_type]
+        else:
+            module, _, class_name = provider_type.partition(':')
+        
+        models = settings.get('models', {})
+        default_model = settings.get('default_model') or next(iter(models), '')
+        options = {'name': name, 'models': models}
+        for key in ('base_url', 'timeout', 'embedding_model'):
+            if key in settings:
+                options[key] = settings[key]
+        
+        register_provider(
+            name,
+            module,
+            class_name,
+            api_key_setting=settings.get('api_key_env'),
+            default_model=default_model,
+            label=settings.get('label', name),
+            options=options
+        )
+
+
+def register_entry_point_providers():
+    """Register provider classes exposed by installed packages via entry points"""
+    try:
+        entry_points = metadata.entry_points(group=ENTRY_POINT_GROUP)
+    except Exception as e:
+        print(f"✗ Failed to read provider entry points: {e}")
+        return
+    
+    for entry_point in entry_points:
+        if entry_point.name in PROVIDER_REGISTRY:
+            continue
+        module, _, class_name = entry_point.value.partition(':')
+        register_provider(
+            entry_point.name,
+            module,
+            class_name,
+            api_key_setting=f"{entry_point.name.upper()}_API_KEY"
+        )
+
+
+def get_provider_class(name: str) -> Type[BaseProvider]:
+    """
+    Import and return the provider class registered under a name
+
+    Args:
+        name: Registered provider name
+
+    Returns:
+        Provider class
+    """
+    spec = PROVIDER_REGISTRY[name]
+    module = importlib.import_module(spec['module'])
+    return getattr(module, spec['class'])
@@ -8,6 +8,9 @@ class LLMRouterApp {
         this.currentModel = null;
         this.isProcessing = false;
         this.providers = [];
+        this.sessionId = 'new'; // Server-side conversation session
+        this.liveStats = {}; // Provider stats kept current by /api/stats/stream
+        this.statsSource = null;
 
         this.init();
     }
@@ -26,8 +29,8 @@ class LLMRouterApp {
         // Set up event listeners
         this.setupEventListeners();
 
-        // Load initial data
-        this.loadProviders();
+        // Load initial data, then follow stats updates pushed by the server
+        this.loadProviders().then(version => this.subscribeStats(version));
 
         // Auto-resize textarea
         this.setupTextareaAutoResize();
@@ -62,13 +65,68 @@ class LLMRouterApp {
             this.updateProviderStatus(data.stats);
             this.updateProviderSelect(data.providers);
             this.updateProviderCount(data.providers.length);
+            return data.routing_rules_version;
 
         } catch (error) {
             console.error('Error loading providers:', error);
             this.showError('Failed to load providers');
+            return null;
         }
     }
 
+    subscribeStats(rulesVersion) {
+        // EventSource reconnects on its own; the first event after a
+        // (re)connect carries the full stats, later ones only changed fields
+        const params = rulesVersion ? `?rules_version=${encodeURIComponent(rulesVersion)}` : '';
+        this.statsSource = new EventSource(`/api/stats/stream${params}`);
+
+        this.statsSource.onmessage = (e) => {
+            const event = JSON.parse(e.data);
+            if (event.type === 'stats') {
+                if (event.data.full) {
+                    this.liveStats = {};
+                }
+                for (const [provider, fields] of Object.entries(event.data.providers)) {
+                    this.liveStats[provider] = { ...this.liveStats[provider], ...fields };
+                }
+                this.updateProviderStatus(Object.values(this.liveStats));
+            } else if (event.type === 'rules') {
+                this.routingRules = event.data.routing_rules;
+            }
+        };
+
+        this.statsSource.onerror = () => {
+            // EventSource gives up on an error status (e.g. 503 when the
+            // server has no stream slot free): poll for a while instead
+            if (this.statsSource.readyState === EventSource.CLOSED) {
+                this.pollStats(rulesVersion);
+            }
+        };
+    }
+
+    async pollStats(rulesVersion) {
+        const retryStreamAt = Date.now() + 60000;
+        while (Date.now() < retryStreamAt) {
+            try {
+                const params = rulesVersion ? `?rules_version=${encodeURIComponent(rulesVersion)}` : '';
+                const response = await fetch(`/api/stats/live${params}`);
+                if (response.ok) {
+                    const data = await response.json();
+                    if (data.routing_rules) {
+                        this.routingRules = data.routing_rules;
+                        rulesVersion = data.routing_rules_version;
+                    }
+                    this.liveStats = data.providers;
+                    this.updateProviderStatus(Object.values(this.liveStats));
+                }
+            } catch (error) {
+                console.error('Error polling stats:', error);
+            }
+            await new Promise(resolve => setTimeout(resolve, 5000));
+        }
+        this.subscribeStats(rulesVersion);
+    }
+
     updateProviderStatus(stats) {
         if (!stats || stats.length === 0) {
             this.providerStatus.innerHTML = `
@@ -102,6 +160,10 @@ class LLMRouterApp {
                         <div class="provider-stat">
                             Cost: <strong>$${stat.total_cost}</strong>
                         </div>
+                        ${stat.request_count > 0 && stat.latency_p50 ? `
+                        <div class="provider-stat">
+                            p50: <strong>${stat.latency_p50.toFixed(2)}s</strong>
+                        </div>` : ''}
                     </div>
                 `;
             } else {
@@ -180,9 +242,6 @@ class LLMRouterApp {
             this.sendButton.disabled = false;
             this.userInput.disabled = false;
             this.userInput.focus();
-
-            // Reload provider stats
-            this.loadProviders();
         }
     }
 
@@ -194,7 +253,10 @@ class LLMRouterApp {
             },
             body: JSON.stringify({
                 query: query,
-                provider: preferredProvider
+                provider: preferredProvider,
+                session_id: this.sessionId,
+                // Chat is latency-sensitive; bulk API callers default to 'standard'
+                priority: 'interactive'
             })
         });
 
@@ -205,66 +267,89 @@ class LLMRouterApp {
         let routingData = null;
         let selectedProvider = null;
         let selectedModel = null;
+        let renderer = null; // Created on the first content chunk
 
-        while (true) {
-            const { done, value } = await reader.read();
-
-            if (done) break;
-
-            buffer += decoder.decode(value, { stream: true });
-            const lines = buffer.split('\n');
-            buffer = lines.pop(); // Keep incomplete line in buffer
-
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    try {
-                        const event = JSON.parse(line.slice(6));
-
-                        if (event.type === 'routing') {
-                            routingData = event.data;
-                            this.updateRoutingInfo(routingData);
-                        } else if (event.type === 'provider') {
-                            if (event.data.status === 'success') {
-                                selectedProvider = event.data.provider;
-                                selectedModel = event.data.model;
-                            } else if (event.data.status === 'attempting') {
-                                this.updateAssistantMessage(
-                                    messageId,
-                                    `Trying ${event.data.provider}...`,
-                                    event.data.provider,
-                                    event.data.model
-                                );
-                            }
-                        } else if (event.type === 'content') {
-                            fullResponse += event.data;
-                            this.updateAssistantMessage(
-                                messageId,
-                                fullResponse,
-                                selectedProvider,
-                                selectedModel
-                            );
-                        } else if (event.type === 'error') {
-                            if (event.data.attempting_fallback) {
-                                // Show fallback attempt
-                                console.log(`Provider ${event.data.provider} failed, trying fallback...`);
-                            } else {
-                                // Final error
-                                this.updateAssistantMessage(
-                                    messageId,
-                                    `Error: ${event.data.error}`,
-                                    null,
-                                    null
-                                );
+        try {
+            while (true) {
+                const { done, value } = await reader.read();
+
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop(); // Keep incomplete line in buffer
+
+                for (const line of lines) {
+                    if (line.startsWith('data: ')) {
+                        try {
+                            const event = JSON.parse(line.slice(6));
+
+                            if (event.type === 'routing') {
+                                routingData = event.data;
+                                if (routingData.session_id) {
+                                    this.sessionId = routingData.session_id;
+                                }
+                                this.updateRoutingInfo(routingData);
+                            } else if (event.type === 'provider') {
+                                if (event.data.status === 'success') {
+                                    selectedProvider = event.data.provider;
+                                    selectedModel = event.data.model;
+                                    this.updateAssistantMeta(messageId, selectedProvider);
+                                } else if (event.data.status === 'attempting' && !fullResponse) {
+                                    this.updateAssistantMessage(
+                                        messageId,
+                                        `Trying ${event.data.provider}...`,
+                                        event.data.provider,
+                                        event.data.model
+                                    );
+                                }
+                            } else if (event.type === 'content') {
+                                fullResponse += event.data;
+                                if (!renderer) {
+                                    renderer = this.createRenderer(messageId);
+                                }
+                                renderer.append(event.data);
+                            } else if (event.type === 'resume') {
+                                // Fallback provider continues the partial answer
+                                console.log(`Resuming with ${event.data.provider} at offset ${event.data.offset}`);
+                            } else if (event.type === 'reset') {
+                                // Fallback provider restarts the answer from scratch
+                                fullResponse = '';
+                                if (renderer) {
+                                    renderer.reset();
+                                }
+                            } else if (event.type === 'error') {
+                                if (event.data.attempting_fallback) {
+                                    // Show fallback attempt
+                                    console.log(`Provider ${event.data.provider} failed, trying fallback...`);
+                                } else {
+                                    // Final error
+                                    if (renderer) {
+                                        renderer.cancelFrame();
+                                        renderer = null;
+                                    }
+                                    this.updateAssistantMessage(
+                                        messageId,
+                                        `Error: ${event.data.error}`,
+                                        null,
+                                        null
+                                    );
+                                }
+                            } else if (event.type === 'complete') {
+                                // Response complete
+                                console.log('Response complete:', event.data);
                             }
-                        } else if (event.type === 'complete') {
-                            // Response complete
-                            console.log('Response complete:', event.data);
+                        } catch (e) {
+                            console.error('Error parsing SSE:', e);
                         }
-                    } catch (e) {
-                        console.error('Error parsing SSE:', e);
                     }
                 }
             }
+        } finally {
+            // Show any text still waiting for the next frame
+            if (renderer) {
+                renderer.finish();
+            }
         }
     }
 
@@ -321,19 +406,31 @@ class LLMRouterApp {
         if (!messageDiv) return;
 
         const bubble = messageDiv.querySelector('.message-bubble');
-        const meta = messageDiv.querySelector('.message-meta');
 
         // Update content
         bubble.innerHTML = this.formatMessage(text);
 
         // Update metadata
+        this.updateAssistantMeta(messageId, provider);
+
+        this.scrollToBottom();
+    }
+
+    createRenderer(messageId) {
+        // Streamed answers are rendered incrementally, once per frame
+        const bubble = document.getElementById(messageId).querySelector('.message-bubble');
+        return new IncrementalRenderer(bubble, () => this.scrollToBottom());
+    }
+
+    updateAssistantMeta(messageId, provider) {
+        const messageDiv = document.getElementById(messageId);
+        if (!messageDiv) return;
+
         let metaHtml = `<span>${this.getCurrentTime()}</span>`;
         if (provider) {
             metaHtml += `<span class="provider-badge ${provider}">${provider}</span>`;
         }
-        meta.innerHTML = metaHtml;
-
-        this.scrollToBottom();
+        messageDiv.querySelector('.message-meta').innerHTML = metaHtml;
     }
 
     updateRoutingInfo(routingData) {
@@ -366,24 +463,8 @@ class LLMRouterApp {
     }
 
     formatMessage(text) {
-        // Simple markdown-like formatting
-        let formatted = this.escapeHtml(text);
-
-        // Code blocks
-        formatted = formatted.replace(/```(\w+)?\n([\s\S]*?)```/g, (match, lang, code) => {
-            return `<pre><code class="language-${lang || 'text'}">${code.trim()}</code></pre>`;
-        });
-
-        // Inline code
-        formatted = formatted.replace(/`([^`]+)`/g, '<code>$1</code>');
-
-        // Bold
-        formatted = formatted.replace(/\*\*([^*]+)\*\*/g, '<strong>$1</strong>');
-
-        // Line breaks
-        formatted = formatted.replace(/\n/g, '<br>');
-
-        return formatted;
+        // Same formatting as streamed answers (see renderer.js)
+        return IncrementalRenderer.format(text);
     }
 
     escapeHtml(text) {
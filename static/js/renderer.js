@@ -0,0 +1,126 @@
+// ============================================
+// LLM Router - Incremental Message Renderer
+// ============================================
+
+// Renders a streamed answer without re-formatting the whole message per
+// token. Text is split into blocks at paragraph breaks and closed code
+// fences. Finished blocks are formatted once and never touched again; only
+// the open trailing block is re-rendered, at most once per animation frame.
+class IncrementalRenderer {
+    constructor(container, onRender = null) {
+        this.container = container;
+        this.onRender = onRender;
+        this.frame = null;
+        this.reset();
+    }
+
+    append(text) {
+        this.source += text;
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    reset() {
+        this.cancelFrame();
+        this.source = '';
+        this.committed = 0; // Length of source already rendered into finished blocks
+        this.container.innerHTML = '';
+        this.tail = this.createBlock();
+    }
+
+    finish() {
+        // Render pending text now instead of on the next frame
+        this.cancelFrame();
+        this.render();
+    }
+
+    cancelFrame() {
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+            this.frame = null;
+        }
+    }
+
+    render() {
+        const open = this.source.slice(this.committed);
+        const boundary = IncrementalRenderer.lastBlockBoundary(open);
+        if (boundary > 0) {
+            const block = this.createBlock(this.tail);
+            block.innerHTML = IncrementalRenderer.format(open.slice(0, boundary));
+            this.committed += boundary;
+        }
+        this.tail.innerHTML = IncrementalRenderer.format(this.source.slice(this.committed));
+
+        if (this.onRender) {
+            this.onRender();
+        }
+    }
+
+    createBlock(before = null) {
+        const block = document.createElement('div');
+        block.className = 'md-block';
+        this.container.insertBefore(block, before);
+        return block;
+    }
+
+    // Offset just past the last complete blank line or closing code fence
+    // that is outside a code block (0 if there is none yet)
+    static lastBlockBoundary(text) {
+        let boundary = 0;
+        let inFence = false;
+        let lineStart = 0;
+        let lineEnd = text.indexOf('\n');
+
+        while (lineEnd !== -1) {
+            const line = text.slice(lineStart, lineEnd);
+            if (line.trimStart().startsWith('```')) {
+                inFence = !inFence;
+                if (!inFence) {
+                    boundary = lineEnd + 1;
+                }
+            } else if (!inFence && line.trim() === '' && lineStart > 0) {
+                boundary = lineEnd + 1;
+            }
+            lineStart = lineEnd + 1;
+            lineEnd = text.indexOf('\n', lineStart);
+        }
+        return boundary;
+    }
+
+    static escapeHtml(text) {
+        return text
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;');
+    }
+
+    static format(text) {
+        // Simple markdown-like formatting
+        let formatted = IncrementalRenderer.escapeHtml(text);
+
+        // Close a code fence that is still streaming so it renders as code
+        if ((formatted.match(/```/g) || []).length % 2 === 1) {
+            formatted += formatted.endsWith('\n') ? '```' : '\n```';
+        }
+
+        // Code blocks
+        formatted = formatted.replace(/```(\w+)?\n([\s\S]*?)```/g, (match, lang, code) => {
+            return `<pre><code class="language-${lang || 'text'}">${code.trim()}</code></pre>`;
+        });
+
+        // Inline code
+        formatted = formatted.replace(/`([^`]+)`/g, '<code>$1</code>');
+
+        // Bold
+        formatted = formatted.replace(/\*\*([^*]+)\*\*/g, '<strong>$1</strong>');
+
+        // Line breaks
+        formatted = formatted.replace(/\n/g, '<br>');
+
+        return formatted;
+    }
+}
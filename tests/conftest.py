@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Run from any directory: the app's modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from utils.shared_state import get_stats_store  # noqa: E402
+
+
+@pytest.fixture
+def make_router(tmp_path, monkeypatch):
+    """Build an in-process LLMRouter whose "openai" provider is the fake server at base_url"""
+    def make(base_url, **rules):
+        rules_file = tmp_path / 'routing_rules.json'
+        rules_file.write_text(json.dumps({
+            'default_provider': 'openai',
+            'default_model': 'gpt-3.5-turbo',
+            'fallback_order': ['openai'],
+            **rules
+        }))
+        monkeypatch.setenv('OPENAI_BASE_URL', base_url)
+        monkeypatch.delenv('ANTHROPIC_API_KEY', raising=False)
+        monkeypatch.delenv('GOOGLE_API_KEY', raising=False)
+        monkeypatch.setattr(Config, 'OPENAI_API_KEY', 'sk-test')
+        monkeypatch.setattr(Config, 'ANTHROPIC_API_KEY', '')
+        monkeypatch.setattr(Config, 'GOOGLE_API_KEY', '')
+        monkeypatch.setattr(Config, 'SHARED_STATE_SOCKET', '')
+        monkeypatch.setattr(Config, 'ROUTING_RULES_FILE', str(rules_file))
+        monkeypatch.setattr(Config, 'USAGE_LEDGER_PATH', str(tmp_path / 'usage.db'))
+        monkeypatch.setattr(Config, 'BUDGET_STATE_FILE', '')
+        monkeypatch.setattr(Config, 'LATENCY_BASELINE_FILE', '')
+        from llm_router import LLMRouter
+
+        get_stats_store().clear()
+        router = LLMRouter()
+        router.ledger.flush_interval = 0.05
+        return router
+
+    yield make
+    get_stats_store().clear()
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """The Flask app module, imported without a ledger, budget file or shared state"""
+    monkeypatch.setattr(Config, 'USAGE_LEDGER_PATH', '')
+    monkeypatch.setattr(Config, 'BUDGET_STATE_FILE', '')
+    monkeypatch.setattr(Config, 'LATENCY_BASELINE_FILE', '')
+    monkeypatch.setattr(Config, 'SHARED_STATE_SOCKET', '')
+    import app
+    return app
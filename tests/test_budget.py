@@ -0,0 +1,38 @@
+"""
+Budget endpoint access and reservations on downgrade
+"""
+import pytest
+
+from config import Config
+from utils.budget import RESERVED_NAMESPACE
+from utils.shared_state import get_stats_store
+
+
+def test_budgets_are_visible_to_their_own_tenant_only(app_module, monkeypatch):
+    client = app_module.app.test_client()
+    monkeypatch.setattr(Config, 'TENANT_API_KEYS', {'secret-1': 'acme'})
+    headers = {'X-API-Key': 'secret-1'}
+    assert client.get('/api/budgets/acme', headers=headers).status_code == 200
+    assert client.get('/api/budgets/globex', headers=headers).status_code == 403
+
+    monkeypatch.setattr(Config, 'DEBUG_PROFILE_TOKEN', 'operator')
+    assert client.get('/api/budgets/globex', headers={'X-Debug-Token': 'wrong'}).status_code == 403
+    assert client.get('/api/budgets/globex', headers={'X-Debug-Token': 'operator'}).status_code == 200
+
+
+def test_downgrade_reserves_the_cheaper_models_estimate(make_router):
+    router = make_router(
+        'http://127.0.0.1:9/v1',
+        default_model='gpt-3.5-turbo',
+        budgets={'default': {'cost_per_day': 10.0}, 'downgrade_at': 0.0}
+    )
+    routing = {'provider': 'openai', 'model': 'gpt-4', 'query_metadata': {'token_count': 1000}}
+    stream_budget = router._apply_budget(routing, 'acme', 1000)
+
+    cheap = router.providers['openai'].estimate_cost(1000, 1000, model='gpt-3.5-turbo')
+    assert routing['model'] == 'gpt-3.5-turbo'
+    assert cheap < router.providers['openai'].estimate_cost(1000, 1000, model='gpt-4')
+    assert stream_budget.reserved_cost == cheap
+    assert get_stats_store().get(RESERVED_NAMESPACE, 'acme')['cost'] == pytest.approx(cheap)
+    stream_budget.close()
+    assert abs(get_stats_store().get(RESERVED_NAMESPACE, 'acme')['cost']) < 1e-12
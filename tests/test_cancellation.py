@@ -0,0 +1,112 @@
+"""
+Client disconnects stop the upstream stream and are recorded as cancelled
+
+The router runs in-process against the local fake provider. A
+DisconnectWatcher polls one end of a socket pair standing in for the
+client connection; closing the other end plays the client hanging up.
+"""
+import os
+import resource
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_provider_server import start_fake_server
+from config import Config
+from utils.cancellation import CancelToken, DisconnectWatcher, is_disconnected
+
+# Upper bound from the hang-up to the fake provider seeing its connection closed
+CLOSE_WITHIN = 1.0
+WATCH_INTERVAL = 0.05
+
+
+@pytest.fixture
+def fake_server():
+    # Long enough that the stream is still running when the client hangs up
+    server, base_url = start_fake_server(tokens=2000, delay_ms=10)
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def router(fake_server, make_router):
+    return make_router(fake_server[1])
+
+
+def ledger_statuses(path, timeout=5.0):
+    """Statuses of the ledger's events, once the writer has stored any"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                rows = conn.execute('SELECT status FROM usage_events').fetchall()
+            finally:
+                conn.close()
+            if rows:
+                return [row[0] for row in rows]
+        except sqlite3.OperationalError:
+            pass  # schema not created yet
+        time.sleep(0.05)
+    return []
+
+
+def test_disconnect_closes_upstream_and_records_cancelled(fake_server, router):
+    handler = fake_server[0].RequestHandlerClass
+    client, peer = socket.socketpair()
+    token = CancelToken()
+    watcher = DisconnectWatcher(client, token, interval=WATCH_INTERVAL)
+    events = []
+    first_content = threading.Event()
+
+    def consume():
+        for event in router.query_with_fallback('hello', cancel=token):
+            events.append(event)
+            if event['type'] == 'content':
+                first_content.set()
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    watcher.start()
+    consumer.start()
+    try:
+        assert first_content.wait(10), 'no content streamed before the hang-up'
+        hung_up_at = time.time()
+        peer.close()
+
+        consumer.join(CLOSE_WITHIN + 1)
+        assert not consumer.is_alive(), 'query kept streaming after the client hung up'
+        assert token.cancelled
+        deadline = time.monotonic() + CLOSE_WITHIN
+        while not handler.disconnect_times and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert handler.disconnect_times, 'upstream connection was never closed'
+        assert handler.disconnect_times[0] - hung_up_at < CLOSE_WITHIN
+        assert not handler.stream_durations
+        assert not any(event['type'] == 'complete' for event in events)
+    finally:
+        watcher.stop()
+        client.close()
+
+    assert ledger_statuses(Config.USAGE_LEDGER_PATH) == ['cancelled']
+    assert router.providers['openai'].get_stats()['cancelled_count'] == 1
+
+
+def test_is_disconnected_above_fd_setsize():
+    high_fd = 1500
+    if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= high_fd:
+        pytest.skip('open file limit too low for a descriptor above FD_SETSIZE')
+    client, peer = socket.socketpair()
+    high = socket.socket(fileno=os.dup2(client.fileno(), high_fd))
+    client.close()
+    try:
+        assert not is_disconnected(high)
+        peer.sendall(b'x')
+        assert not is_disconnected(high)
+        peer.close()
+        high.recv(1)
+        assert is_disconnected(high)
+    finally:
+        high.close()
@@ -0,0 +1,57 @@
+"""
+PromptCompactor fences and repeated-line markers, and the router's token count after compaction
+"""
+from utils.compactor import PromptCompactor
+
+
+def compact(text, **options):
+    return PromptCompactor(**options).compact(text)[0]
+
+
+def test_repeat_marker_stays_inside_the_log_block():
+    text = "```log\nerror: connection refused\n" + "error: connection refused\n" * 3 + "```"
+    assert compact(text) == "```log\nerror: connection refused\n[previous line repeated 3 more times]\n```"
+
+
+def test_repeats_kept_when_the_marker_would_be_longer():
+    text = "```log\nerr x\nerr x\nerr x\nerr x\n```"
+    assert compact(text) == text
+
+
+def test_longer_fence_wraps_a_nested_fence():
+    text = (
+        "````markdown\n"
+        "Example:\n"
+        "```python\n"
+        "x  =  1\n"
+        "```\n"
+        "same line with   spaces that are long enough\n"
+        "same line with   spaces that are long enough\n"
+        "same line with   spaces that are long enough\n"
+        "same line with   spaces that are long enough\n"
+        "````\n"
+        "after   the block"
+    )
+    compacted = compact(text)
+    assert compacted.split('\n')[:-1] == text.split('\n')[:-1]
+    assert compacted.endswith('after the block')
+
+
+def test_tilde_fence_is_not_closed_by_backticks():
+    text = "~~~text\n```\nkeep   spacing\n~~~"
+    assert compact(text) == text
+
+
+def test_compaction_updates_token_count_like_the_analyzer(make_router):
+    from utils import QueryAnalyzer
+
+    router = make_router('http://127.0.0.1:9/v1')
+    router.routing_rules['rules'] = [{'name': 'logs', 'condition': {}, 'provider': 'openai',
+                                      'model': 'gpt-3.5-turbo', 'compact': {'min_chars': 0}}]
+    query = "Why does this fail?\n\n```log\n" + "worker 7 lost its connection to the database\n" * 50 + "```"
+    routing = {'rule': 'logs', 'query_metadata': QueryAnalyzer.analyze(query)}
+    compacted = router._compact_query(query, routing)
+
+    assert routing['query_metadata']['token_count'] == QueryAnalyzer.count_tokens(compacted)
+    saved = QueryAnalyzer.count_tokens(query) - QueryAnalyzer.count_tokens(compacted)
+    assert routing['compaction']['tokens_saved'] == saved > 0
@@ -0,0 +1,76 @@
+"""
+Sessions live in the shared stats store, so any worker can continue them
+"""
+import multiprocessing
+import time
+
+import pytest
+
+from utils import shared_state
+from utils.conversation_store import SESSIONS_NAMESPACE, ConversationStore
+from utils.shared_state import get_stats_store, start_shared_state_server
+
+
+@pytest.fixture
+def shared_server(tmp_path, monkeypatch):
+    """Run the shared state server and point this process's stats store at it"""
+    address = str(tmp_path / 'state.sock')
+    start_shared_state_server(address, 'test-key')
+    monkeypatch.setenv('SHARED_STATE_SOCKET', address)
+    monkeypatch.setenv('SHARED_STATE_AUTHKEY', 'test-key')
+    monkeypatch.setattr(shared_state, '_store', None)
+    yield
+    monkeypatch.setattr(shared_state, '_store', None)
+
+
+def continue_in_worker(session_id, results):
+    """Second turn of a session, in another process"""
+    store = ConversationStore()
+    conversation = store.get_or_create(session_id)
+    results.put((conversation.session_id, [m['content'] for m in conversation.messages], conversation.model))
+    store.record_turn(conversation, 'and again', 'second answer', 'openai', 'gpt-4o')
+
+
+def test_follow_up_on_another_worker_keeps_history(shared_server):
+    store = ConversationStore()
+    conversation = store.get_or_create('new')
+    store.record_turn(conversation, 'hello', 'first answer', 'openai', 'gpt-4o-mini')
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    worker = context.Process(target=continue_in_worker, args=(conversation.session_id, results))
+    worker.start()
+    worker.join(10)
+    assert worker.exitcode == 0
+
+    assert results.get(timeout=1) == (conversation.session_id, ['hello', 'first answer'], 'gpt-4o-mini')
+    resumed = store.get_or_create(conversation.session_id)
+    assert [m['content'] for m in resumed.messages] == ['hello', 'first answer', 'and again', 'second answer']
+    assert (resumed.provider, resumed.model) == ('openai', 'gpt-4o')
+
+
+def test_unknown_and_expired_ids_start_new_sessions():
+    get_stats_store().clear()
+    store = ConversationStore(ttl_seconds=60)
+    assert store.get_or_create('missing').session_id != 'missing'
+
+    conversation = store.get_or_create('new')
+    store.record_turn(conversation, 'hello', 'answer')
+    get_stats_store().set(SESSIONS_NAMESPACE, conversation.session_id, 'last_active', time.time() - 120)
+    assert store.get_or_create(conversation.session_id).session_id != conversation.session_id
+    get_stats_store().clear()
+
+
+def test_least_recently_used_sessions_are_evicted():
+    get_stats_store().clear()
+    store = ConversationStore(max_sessions=3)
+    first = store.get_or_create('new')
+    others = [store.get_or_create('new') for _ in range(2)]
+    time.sleep(0.01)
+    assert store.get_or_create(first.session_id).session_id == first.session_id
+    store.get_or_create('new')
+    assert len(store) == 3
+    assert store.get_or_create(first.session_id).session_id == first.session_id
+    assert not store.delete(others[0].session_id)
+    assert store.delete(first.session_id)
+    get_stats_store().clear()
@@ -0,0 +1,42 @@
+"""
+The startup probe's seed is shared by every worker's router
+"""
+import time
+
+from llm_router import LLMRouter
+
+RULES = {
+    'fallback_order': ['openai', 'local'],
+    'providers': {'local': {'type': 'openai_compatible', 'base_url': 'http://127.0.0.1:9/v1',
+                            'default_model': 'local-model'}}
+}
+
+
+def probe_results(generated_at):
+    return {
+        'generated_at': generated_at,
+        'results': {
+            'openai/gpt-3.5-turbo': {'provider': 'openai', 'model': 'gpt-3.5-turbo', 'ok': False},
+            'local/local-model': {'provider': 'local', 'model': 'local-model', 'ok': True, 'connect_ms': 1.0,
+                                  'ttft_ms': 40.0, 'latency_ms': 200.0, 'samples': 3, 'tokens_per_second': 50.0}
+        }
+    }
+
+
+def test_probe_on_one_worker_seeds_the_others(make_router):
+    probing = make_router('http://127.0.0.1:9/v1', **RULES)
+    other = LLMRouter()
+    probing.apply_latency_baseline(probe_results(time.time()))
+
+    assert other._get_fallback_order('openai') == ['local', 'openai']
+    assert other.get_live_stats()['local']['latency_source'] == 'baseline'
+    assert other.get_latency_baseline()['openai'] == {'probe_failed': True}
+
+    # A worker restarted later loads an older file; it must not replace the probe
+    LLMRouter().apply_latency_baseline({'generated_at': time.time() - 60, 'results': {}})
+    assert probing._get_fallback_order('openai') == ['local', 'openai']
+
+    # An answer on any worker moves the provider back everywhere
+    other._record_latency({'provider': 'openai', 'ttft': 0.1}, time.time() - 0.2)
+    assert probing._get_fallback_order('openai') == ['openai', 'local']
+    assert 'openai' not in probing.get_latency_baseline()
@@ -0,0 +1,33 @@
+"""
+MicroBatcher batches grow while every slot is busy
+"""
+import threading
+
+from utils.micro_batcher import MicroBatcher
+
+
+def test_items_queued_behind_a_busy_slot_join_one_batch():
+    release = threading.Event()
+    sizes = []
+
+    def batch_fn(items):
+        sizes.append(len(items))
+        if len(sizes) == 1:
+            release.wait(5)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=64, max_wait_ms=1, max_in_flight=1)
+    first = batcher.submit(0)
+    while not sizes:
+        threading.Event().wait(0.001)
+    rest = []
+    for item in range(1, 21):
+        # Each item arrives after the previous one's max_wait has passed
+        rest.append(batcher.submit(item))
+        threading.Event().wait(0.005)
+    release.set()
+
+    assert [f.result(5) for f in [first] + rest] == list(range(21))
+    assert sizes == [1, 20]
+    assert batcher.get_stats()['batches'] == 2
+    assert batcher.get_stats()['items'] == 21
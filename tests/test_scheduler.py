@@ -0,0 +1,79 @@
+"""
+Scheduler queue bound and tenant identity
+"""
+import threading
+
+import pytest
+
+from config import Config
+from utils.scheduler import RequestScheduler, SchedulerFull
+
+
+def fill(scheduler, priority, count):
+    """Hold count slots (or queue places) from background threads; returns their tickets"""
+    tickets = []
+    threads = [threading.Thread(target=lambda: tickets.append(scheduler.acquire(priority, 'filler')), daemon=True)
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return tickets, threads
+
+
+def wait_for(condition, timeout=5.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        event.wait(0.01)
+    raise AssertionError('condition not reached')
+
+
+def test_batch_cannot_take_the_queue_places_interactive_needs():
+    scheduler = RequestScheduler(max_concurrent=2, queue_timeout=5, max_queued=4)
+    held, _ = fill(scheduler, 'interactive', 2)
+    wait_for(lambda: len(held) == 2)
+    # Batch may fill half the queue
+    queued, _ = fill(scheduler, 'batch', 2)
+    wait_for(lambda: scheduler.get_stats()['classes']['batch']['queued'] == 2)
+
+    with pytest.raises(SchedulerFull):
+        scheduler.acquire('batch', 'late')
+    assert scheduler.get_stats()['classes']['batch']['rejected'] == 1
+
+    # Interactive may still queue, and is admitted first
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(scheduler.acquire('interactive', 'chat')), daemon=True)
+    waiter.start()
+    wait_for(lambda: scheduler.get_stats()['classes']['interactive']['queued'] == 1)
+    scheduler.release(held[0])
+    waiter.join(5)
+    assert admitted and admitted[0].priority == 'interactive'
+
+
+def test_unbounded_queue_by_default():
+    scheduler = RequestScheduler(max_concurrent=1, queue_timeout=5)
+    held = scheduler.acquire('batch', 'a')
+    queued, _ = fill(scheduler, 'batch', 10)
+    wait_for(lambda: scheduler.get_stats()['classes']['batch']['queued'] == 10)
+    scheduler.release(held)
+    wait_for(lambda: len(queued) == 1)
+
+
+def test_tenant_comes_from_trusted_sources_only(app_module, monkeypatch):
+    request_tenant = app_module.request_tenant
+    with app_module.app.test_request_context(
+        json={'tenant': 'acme'}, headers={'X-Tenant-ID': 'acme'}, environ_base={'REMOTE_ADDR': '10.0.0.7'}
+    ):
+        assert request_tenant() == '10.0.0.7'
+
+    monkeypatch.setattr(Config, 'TENANT_HEADER', 'X-Gateway-Tenant')
+    with app_module.app.test_request_context(headers={'X-Gateway-Tenant': 'globex'}):
+        assert request_tenant() == 'globex'
+
+    monkeypatch.setattr(Config, 'TENANT_API_KEYS', {'secret-1': 'acme'})
+    with app_module.app.test_request_context(headers={'X-API-Key': 'secret-1', 'X-Gateway-Tenant': 'globex'}):
+        assert request_tenant() == 'acme'
+    with app_module.app.test_request_context(headers={'X-API-Key': 'guess'}):
+        assert request_tenant() is None
+    response = app_module.app.test_client().post('/api/query', json={'query': 'hi'}, headers={'X-API-Key': 'guess'})
+    assert response.status_code == 401
@@ -0,0 +1,51 @@
+"""
+A tenant's running spend cap stops the upstream, not just the client
+
+With stream buffering on, the provider stream is read ahead of the
+client. The cap must apply as chunks arrive from upstream, so a slow
+client cannot let the whole answer be generated (and billed) first.
+"""
+import time
+
+import pytest
+
+from benchmarks.fake_provider_server import start_fake_server
+from config import Config
+
+
+@pytest.fixture
+def fake_server():
+    server, base_url = start_fake_server(tokens=2000, delay_ms=1)
+    yield server
+    server.shutdown()
+
+
+@pytest.mark.parametrize('buffered', [True, False])
+def test_slow_consumer_hits_cap_and_upstream_stops(fake_server, make_router, monkeypatch, buffered):
+    monkeypatch.setattr(Config, 'STREAM_BUFFER_ENABLED', buffered)
+    monkeypatch.setattr(Config, 'BUDGET_ESTIMATE_MAX_TOKENS', 100)
+    router = make_router(
+        f"http://127.0.0.1:{fake_server.server_address[1]}/v1",
+        budgets={'default': {'tokens_per_minute': 300}}
+    )
+    handler = fake_server.RequestHandlerClass
+
+    contents = 0
+    errors = []
+    for event in router.query_with_fallback('hello', tenant='acme'):
+        if event['type'] == 'content':
+            contents += 1
+            if contents == 1:
+                # A slow client: by now an unchecked reader would have run far past the cap
+                time.sleep(1.0)
+                if buffered:
+                    assert handler.disconnect_times, 'upstream still streaming while the client lags'
+        elif event['type'] == 'error':
+            errors.append(event['data'])
+
+    assert errors and errors[0].get('budget_exceeded')
+    assert contents < 400
+    assert not handler.stream_durations, 'upstream streamed the whole answer'
+    assert handler.disconnect_times
+    usage = router.budgets.usage('acme')['minute']['tokens']
+    assert usage < 400
@@ -0,0 +1,161 @@
+"""
+BufferedStream: memory and spill paths, early upstream release, cleanup
+"""
+import threading
+import time
+
+import pytest
+
+from config import Config
+from utils import stream_buffer
+from utils.stream_buffer import BufferedStream
+
+CHUNK = 'x' * 1000
+
+
+@pytest.fixture
+def spill_files(monkeypatch):
+    """Spill files BufferedStream opens, to check they are closed"""
+    files = []
+    original = stream_buffer.tempfile.TemporaryFile
+
+    def tracked(*args, **kwargs):
+        files.append(original(*args, **kwargs))
+        return files[-1]
+
+    monkeypatch.setattr(stream_buffer.tempfile, 'TemporaryFile', tracked)
+    return files
+
+
+def chunks(count, state=None, fail_after=None):
+    """Upstream generator; state records when it finished and whether it was closed"""
+    state = state if state is not None else {}
+    try:
+        for index in range(count):
+            if fail_after is not None and index == fail_after:
+                raise RuntimeError('upstream failed')
+            yield f"{index:05d}{CHUNK}"
+    except GeneratorExit:
+        state['closed'] = True
+        raise
+    finally:
+        state['finished_at'] = time.monotonic()
+
+
+def expected(count):
+    return [f"{index:05d}{CHUNK}" for index in range(count)]
+
+
+def wait_for_upstream(buffered, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while buffered.upstream_done_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffered.upstream_done_at is not None, 'reader did not drain the upstream'
+
+
+def test_memory_path(spill_files, tmp_path):
+    buffered = BufferedStream(chunks(50), max_memory_bytes=1 << 20, spill_dir=str(tmp_path))
+    wait_for_upstream(buffered)
+    assert list(buffered) == expected(50)
+    stats = buffered.get_stats()
+    assert stats['spilled_bytes'] == 0
+    assert stats['stalls'] == 0
+    assert stats['high_water_bytes'] == 50 * len(expected(1)[0])
+    assert not spill_files
+
+
+def test_spills_past_default_memory_cap(spill_files, tmp_path):
+    # Twice STREAM_BUFFER_MAX_BYTES, read only after the upstream finished
+    count = 2 * Config.STREAM_BUFFER_MAX_BYTES // len(expected(1)[0])
+    buffered = BufferedStream(
+        chunks(count),
+        max_memory_bytes=Config.STREAM_BUFFER_MAX_BYTES,
+        spill_dir=str(tmp_path),
+        max_spill_bytes=4 * Config.STREAM_BUFFER_MAX_BYTES
+    )
+    wait_for_upstream(buffered)
+    stats = buffered.get_stats()
+    assert stats['stalls'] == 0
+    assert stats['spilled_bytes'] > Config.STREAM_BUFFER_MAX_BYTES // 2
+    assert stats['high_water_bytes'] > Config.STREAM_BUFFER_MAX_BYTES
+    assert len(spill_files) == 1
+
+    assert list(buffered) == expected(count)
+    assert spill_files[0].closed
+    assert not list(tmp_path.iterdir())
+
+
+def test_without_spill_dir_reader_waits_for_consumer(spill_files):
+    buffered = BufferedStream(chunks(20), max_memory_bytes=5 * len(expected(1)[0]))
+    time.sleep(0.1)
+    assert buffered.upstream_done_at is None
+    assert list(buffered) == expected(20)
+    stats = buffered.get_stats()
+    assert stats['stalls'] > 0
+    assert stats['spilled_bytes'] == 0
+    assert not spill_files
+
+
+def test_full_spill_file_pushes_back(spill_files, tmp_path):
+    size = len(expected(1)[0])
+    buffered = BufferedStream(chunks(30), max_memory_bytes=5 * size, spill_dir=str(tmp_path), max_spill_bytes=5 * size)
+    time.sleep(0.1)
+    assert buffered.upstream_done_at is None
+    assert buffered.get_stats()['high_water_bytes'] == 10 * size
+    assert list(buffered) == expected(30)
+    assert buffered.get_stats()['stalls'] > 0
+    assert spill_files[0].closed
+
+
+def test_upstream_released_before_slow_consumer_finishes(tmp_path):
+    state = {}
+    buffered = BufferedStream(chunks(200, state), max_memory_bytes=10 * len(expected(1)[0]),
+                              spill_dir=str(tmp_path))
+    received = []
+    for chunk in buffered:
+        received.append(chunk)
+        time.sleep(0.002)
+    assert received == expected(200)
+    assert state['finished_at'] < buffered.consumer_done_at
+    stats = buffered.get_stats()
+    assert stats['drain_lead'] > 0
+    assert stats['stalls'] == 0
+
+
+def test_close_stops_upstream_and_removes_spill_file(spill_files, tmp_path):
+    state = {}
+    release = threading.Event()
+
+    def slow_source():
+        yield from chunks(20, state)
+        release.wait(5)
+        yield from chunks(1000, state)
+
+    buffered = BufferedStream(slow_source(), max_memory_bytes=5 * len(expected(1)[0]), spill_dir=str(tmp_path))
+    assert next(buffered) == expected(1)[0]
+    deadline = time.monotonic() + 5
+    while buffered.get_stats()['spilled_bytes'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spill_files
+
+    buffered.close()
+    release.set()
+    wait_for_upstream(buffered)
+    assert state.get('closed')
+    assert spill_files[0].closed
+    assert not list(tmp_path.iterdir())
+    with pytest.raises(StopIteration):
+        next(buffered)
+
+
+def test_upstream_error_reaches_consumer_after_chunks_and_removes_spill_file(spill_files, tmp_path):
+    buffered = BufferedStream(chunks(30, fail_after=25), max_memory_bytes=5 * len(expected(1)[0]),
+                              spill_dir=str(tmp_path))
+    wait_for_upstream(buffered)
+    received = []
+    with pytest.raises(RuntimeError, match='upstream failed'):
+        for chunk in buffered:
+            received.append(chunk)
+    assert received == expected(25)
+    assert spill_files[0].closed
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,70 @@
+"""
+UsageLedger rollup counters and schema creation on open
+"""
+import sqlite3
+import time
+
+from utils.usage_ledger import UsageLedger
+
+OLD_ROLLUP = """
+CREATE TABLE usage_rollup (
+    granularity TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    tenant TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    ttft_sum REAL NOT NULL,
+    ttft_count INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    PRIMARY KEY (granularity, tenant, bucket_start, provider, model)
+) WITHOUT ROWID;
+"""
+
+
+def record_and_wait(ledger, statuses):
+    now = time.time()
+    for status in statuses:
+        ledger.record({'ts': now, 'tenant': 'acme', 'provider': 'openai', 'model': 'gpt-4o',
+                       'status': status, 'latency': 0.1})
+    deadline = time.monotonic() + 5
+    while ledger.written < len(statuses) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ledger.written == len(statuses)
+    return now
+
+
+def test_statuses_are_counted_separately(tmp_path):
+    ledger = UsageLedger(str(tmp_path / 'usage.db'), flush_interval=0.01)
+    now = record_and_wait(ledger, ['ok', 'ok', 'error', 'cancelled', 'cancelled', 'budget_exceeded'])
+    [row] = ledger.query(now - 60, now + 60)
+    assert row['requests'] == 6
+    assert row['errors'] == 1
+    assert row['cancelled'] == 2
+    assert row['rejected'] == 1
+
+
+def test_query_creates_missing_schema(tmp_path):
+    path = tmp_path / 'usage.db'
+    sqlite3.connect(path).close()
+    assert UsageLedger(str(path)).query(0, time.time()) == []
+
+
+def test_adds_counters_to_existing_rollups(tmp_path):
+    path = tmp_path / 'usage.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_ROLLUP)
+    conn.execute("INSERT INTO usage_rollup VALUES ('hour', 3600, '*', 'openai', 'gpt-4o', 2, 1, 10, 5, 0.5, 0, 0, 0.2)")
+    conn.commit()
+    conn.close()
+
+    ledger = UsageLedger(str(path), flush_interval=0.01)
+    [row] = ledger.query(0, 7200)
+    assert (row['requests'], row['errors'], row['cancelled'], row['rejected']) == (2, 1, 0, 0)
+    now = record_and_wait(ledger, ['cancelled'])
+    [row] = ledger.query(now - 60, now + 60)
+    assert row['cancelled'] == 1
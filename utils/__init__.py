@@ -1,5 +1,7 @@
 # Utils package initialization
 from utils.query_analyzer import QueryAnalyzer
 from utils.token_counter import TokenCounter
+from utils.conversation_store import ConversationStore, Conversation
+from utils.prefix_index import PrefixIndex
 
-__all__ = ['QueryAnalyzer', 'TokenCounter']
+__all__ = ['QueryAnalyzer', 'TokenCounter', 'ConversationStore', 'Conversation', 'PrefixIndex']
@@ -0,0 +1,352 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from utils.shared_state import get_stats_store
+
+# Budget windows and their length in seconds
+WINDOWS = {'minute': 60, 'day': 86400}
+
+# Limit names accepted in the "budgets" section of the routing rules
+LIMIT_KEYS = ('cost_per_minute', 'cost_per_day', 'tokens_per_minute', 'tokens_per_day')
+
+NAMESPACE = 'budgets'
+
+# Budget held by requests in flight, per tenant (not windowed or persisted)
+RESERVED_NAMESPACE = 'budget_reservations'
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request would take a tenant over one of its limits"""
+    pass
+
+
+class StreamBudget:
+    """Running spend of one streaming request, checked as chunks arrive
+
+    The request holds a reservation in the tenant's budget (taken by
+    BudgetManager.check). Spend within the reservation is free to check;
+    past it, the reservation is grown from what the tenant has left, so
+    parallel streams cannot each spend the same remaining budget.
+    """
+
+    def __init__(self, manager: 'BudgetManager', tenant: str, reservation: Dict[str, float]):
+        self.manager = manager
+        self.tenant = tenant
+        self.reserved_cost = reservation['cost']
+        self.reserved_tokens = reservation['tokens']
+        self.cost = 0.0
+        self.tokens = 0
+        # Spend already charged with BudgetManager.record (no longer reserved)
+        self.settled_cost = 0.0
+        self.settled_tokens = 0
+        # add() runs on a stream's reader thread, settle() and close() on the request's
+        self._lock = threading.Lock()
+
+    def add(self, tokens: int, cost: float) -> bool:
+        """
+        Add streamed spend
+
+        Returns:
+            False once the request has reached the tenant's remaining budget
+        """
+        with self._lock:
+            self.tokens += tokens
+            self.cost += cost
+            short_cost = self.cost - self.settled_cost - self.reserved_cost
+            short_tokens = self.tokens - self.settled_tokens - self.reserved_tokens
+            if short_cost <= 0 and short_tokens <= 0:
+                return True
+            # Grow by half the reservation at a time to keep store round trips rare,
+            # or by just the shortfall when that much is no longer left
+            for cost_step, token_step in (
+                (max(short_cost, self.reserved_cost / 2), max(short_tokens, self.reserved_tokens // 2)),
+                (max(short_cost, 0.0), max(short_tokens, 0))
+            ):
+                if self.manager.reserve(self.tenant, cost_step, token_step):
+                    self.reserved_cost += cost_step
+                    self.reserved_tokens += token_step
+                    return True
+            return False
+
+    def settle(self, cost: float, tokens: int):
+        """
+        Mark streamed spend as charged (after BudgetManager.record), freeing
+        the reservation that covered it
+        """
+        with self._lock:
+            release = {'cost': min(cost, self.reserved_cost), 'tokens': min(tokens, self.reserved_tokens)}
+            self.manager.release(self.tenant, release)
+            self.reserved_cost -= release['cost']
+            self.reserved_tokens -= release['tokens']
+            self.settled_cost += cost
+            self.settled_tokens += tokens
+
+    def close(self):
+        """Release the reservation (the spend itself is charged with BudgetManager.record)"""
+        with self._lock:
+            self.manager.release(self.tenant, {'cost': self.reserved_cost, 'tokens': self.reserved_tokens})
+            self.reserved_cost = 0.0
+            self.reserved_tokens = 0
+
+
+class BudgetManager:
+    """Per-tenant dollar and token budgets per minute and per day
+
+    Spend is counted in the stats store (in memory, shared by all workers
+    when the shared state server runs) in fixed windows, so checks in the
+    request path never touch the disk. Counters are flushed to a JSON file
+    periodically and reloaded at startup, so a restart does not reset a
+    tenant's daily budget.
+
+    Requests in flight reserve their estimated spend (check, and
+    StreamBudget as it streams) until they finish, and the remaining
+    budget excludes reservations, so concurrent requests of one tenant
+    cannot all spend the same remaining budget.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Any]] = None, state_file: str = '', flush_interval: float = 30.0):
+        """
+        Initialize budgets
+
+        Args:
+            rules: The "budgets" section of the routing rules:
+                default: limits for every tenant (see LIMIT_KEYS)
+                tenants: per-tenant limits overriding the default
+                downgrade_at: usage ratio at which cheaper models are used
+            state_file: JSON file counters are flushed to (empty = none)
+            flush_interval: Seconds between flushes
+        """
+        rules = rules or {}
+        self.default_limits = self._clean(rules.get('default', {}))
+        self.tenant_limits = {
+            tenant: self._clean(limits) for tenant, limits in rules.get('tenants', {}).items()
+        }
+        self.downgrade_at = float(rules.get('downgrade_at', 0.8))
+        self.state_file = state_file
+        self.flush_interval = flush_interval
+        self._flusher_pid: Optional[int] = None
+        self._flusher_lock = threading.Lock()
+        # Serializes reserve-and-verify within this process
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clean(limits: Dict[str, Any]) -> Dict[str, float]:
+        return {key: float(limits[key]) for key in LIMIT_KEYS if limits.get(key) is not None}
+
+    @property
+    def enabled(self) -> bool:
+        """True if any tenant has a limit"""
+        return bool(self.default_limits) or any(self.tenant_limits.values())
+
+    def limits_for(self, tenant: str) -> Dict[str, float]:
+        """Limits that apply to a tenant"""
+        limits = dict(self.default_limits)
+        limits.update(self.tenant_limits.get(tenant, {}))
+        return limits
+
+    @staticmethod
+    def _key(tenant: str, window: str, now: float) -> str:
+        return f"{tenant}|{window}|{int(now // WINDOWS[window])}"
+
+    def usage(self, tenant: str) -> Dict[str, Dict[str, float]]:
+        """Spend in the current minute and day windows"""
+        self.start()
+        store = get_stats_store()
+        now = time.time()
+        usage = {}
+        for window in WINDOWS:
+            record = store.get(NAMESPACE, self._key(tenant, window, now))
+            usage[window] = {'cost': record.get('cost', 0.0), 'tokens': record.get('tokens', 0)}
+        return usage
+
+    def remaining(self, tenant: str, usage: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Optional[float]]:
+        """
+        Budget left before the tightest limit is hit, net of reservations
+
+        Returns:
+            Dict with 'cost', 'tokens' (None = unlimited) and 'ratio', the
+            highest used fraction of any limit (spend only)
+        """
+        left = self._left(tenant, usage)
+        for metric in ('cost', 'tokens'):
+            if left[metric] is not None:
+                left[metric] = max(left[metric], 0.0)
+        return left
+
+    def _left(self, tenant: str, usage: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Optional[float]]:
+        """remaining() without clamping at zero (negative = over-reserved)"""
+        limits = self.limits_for(tenant)
+        usage = usage if usage is not None else self.usage(tenant)
+        reserved = get_stats_store().get(RESERVED_NAMESPACE, tenant)
+        left = {'cost': None, 'tokens': None, 'ratio': 0.0}
+        for window in WINDOWS:
+            for metric, limit_key in (('cost', f'cost_per_{window}'), ('tokens', f'tokens_per_{window}')):
+                limit = limits.get(limit_key)
+                if limit is None:
+                    continue
+                used = usage[window][metric]
+                available = limit - used - reserved.get(metric, 0)
+                if left[metric] is None or available < left[metric]:
+                    left[metric] = available
+                left['ratio'] = max(left['ratio'], used / limit if limit else 1.0)
+        return left
+
+    def reserve(self, tenant: str, cost: float, tokens: float) -> bool:
+        """
+        Reserve budget for a request in flight
+
+        The reservation is added first and checked afterwards (and undone
+        if it does not fit), so concurrent reservations from other workers
+        are always seen by one of the two checks.
+
+        Args:
+            tenant: Tenant identity
+            cost: Dollars to reserve
+            tokens: Tokens to reserve
+
+        Returns:
+            True if reserved; False (nothing reserved) if it does not fit
+        """
+        store = get_stats_store()
+        with self._lock:
+            store.incr_many(RESERVED_NAMESPACE, tenant, {'cost': cost, 'tokens': tokens})
+            left = self._left(tenant)
+            if (left['cost'] is not None and left['cost'] < 0) or (left['tokens'] is not None and left['tokens'] < 0):
+                store.incr_many(RESERVED_NAMESPACE, tenant, {'cost': -cost, 'tokens': -tokens})
+                return False
+        return True
+
+    def release(self, tenant: str, reservation: Dict[str, float]):
+        """Give back a reservation from check() (or a StreamBudget's)"""
+        if reservation['cost'] or reservation['tokens']:
+            get_stats_store().incr_many(
+                RESERVED_NAMESPACE, tenant, {'cost': -reservation['cost'], 'tokens': -reservation['tokens']}
+            )
+
+    def check(self, tenant: str, estimated_cost: float, estimated_tokens: int) -> Dict[str, Any]:
+        """
+        Check a request against the tenant's budget and reserve its estimate
+
+        The reservation is held until it is handed to start_stream() (and
+        released by StreamBudget.close()) or given back with release().
+
+        Args:
+            tenant: Tenant identity
+            estimated_cost: Cost of the prompt plus max_tokens of output
+            estimated_tokens: Prompt tokens plus max_tokens
+
+        Returns:
+            Remaining budget before this request (see remaining()) with a
+            'downgrade' flag set when the tenant is close to a limit, and
+            the 'reservation' taken
+
+        Raises:
+            BudgetExceeded: The estimate does not fit in the remaining budget
+        """
+        if not self.reserve(tenant, estimated_cost, estimated_tokens):
+            remaining = self.remaining(tenant)
+            if remaining['cost'] is not None and estimated_cost > remaining['cost']:
+                raise BudgetExceeded(
+                    f"Cost budget exceeded for {tenant}: "
+                    f"${remaining['cost']:.4f} left, request estimated at ${estimated_cost:.4f}"
+                )
+            raise BudgetExceeded(
+                f"Token budget exceeded for {tenant}: "
+                f"{int(remaining['tokens'] or 0)} left, request estimated at {estimated_tokens}"
+            )
+        remaining = self.remaining(tenant)
+        for metric, estimate in (('cost', estimated_cost), ('tokens', estimated_tokens)):
+            if remaining[metric] is not None:
+                remaining[metric] += estimate
+        remaining['downgrade'] = remaining['ratio'] >= self.downgrade_at
+        remaining['reservation'] = {'cost': estimated_cost, 'tokens': estimated_tokens}
+        return remaining
+
+    def start_stream(self, tenant: str, reservation: Dict[str, float]) -> StreamBudget:
+        """
+        Running cap for a request that is about to stream
+
+        Args:
+            tenant: Tenant identity
+            reservation: The request's reservation from check(), now owned
+                by the returned StreamBudget
+
+        Returns:
+            StreamBudget (close it when the request ends)
+        """
+        return StreamBudget(self, tenant, reservation)
+
+    def record(self, tenant: str, cost: float, tokens: int):
+        """Add a finished request's spend to every window"""
+        self.start()
+        store = get_stats_store()
+        now = time.time()
+        for window in WINDOWS:
+            store.incr_many(NAMESPACE, self._key(tenant, window, now), {'cost': cost, 'tokens': tokens})
+
+    def flush(self):
+        """Write current counters to the state file and drop expired windows"""
+        store = get_stats_store()
+        now = time.time()
+        current = {}
+        for key, record in store.get(NAMESPACE).items():
+            _, window, window_id = key.rsplit('|', 2)
+            if int(window_id) == int(now // WINDOWS[window]):
+                current[key] = record
+            else:
+                store.delete(NAMESPACE, key)
+
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(current, f)
+        os.replace(tmp_path, self.state_file)
+
+    def load(self):
+        """Restore counters for the current windows from the state file"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  Could not read budget state {self.state_file}: {e}")
+            return
+
+        store = get_stats_store()
+        now = time.time()
+        for key, record in saved.items():
+            _, window, window_id = key.rsplit('|', 2)
+            if window not in WINDOWS or int(window_id) != int(now // WINDOWS[window]):
+                continue
+            # Absolute values, so every worker loading the file is harmless
+            if not store.get(NAMESPACE, key):
+                for field, value in record.items():
+                    store.set(NAMESPACE, key, field, value)
+
+    def start(self):
+        """
+        Load saved counters and start the periodic flush thread
+
+        Safe to call repeatedly; the thread is (re)started once per process,
+        since threads started before a fork do not run in the workers.
+        """
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        self.load()
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"✗ Budget flush failed: {e}")
+
+        threading.Thread(target=run, name='budget-flush', daemon=True).start()
@@ -0,0 +1,132 @@
+import select
+import socket
+import threading
+from typing import Callable, List, Optional
+
+
+class RequestCancelled(Exception):
+    """Raised by a provider when its request was cancelled mid-stream"""
+    pass
+
+
+class CancelToken:
+    """Cancellation signal shared by the web layer, router and providers
+
+    Providers register a callback that closes their upstream stream. When
+    the token is cancelled the callbacks run immediately, on the cancelling
+    thread, which unblocks a provider waiting on the next upstream chunk.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the request and run all registered callbacks once"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on cancellation
+
+        Args:
+            callback: Function to call (runs immediately if already cancelled)
+
+        Returns:
+            Function that unregisters the callback
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def get_client_socket(environ) -> Optional[socket.socket]:
+    """Raw client socket from the WSGI environ (gunicorn or werkzeug), if exposed"""
+    return environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+
+
+def is_disconnected(sock: socket.socket) -> bool:
+    """
+    Check whether the peer has closed the connection, without consuming data
+
+    Uses poll() rather than select(), which cannot watch descriptors at or
+    above FD_SETSIZE (busy workers easily have those).
+
+    Args:
+        sock: Client socket
+
+    Returns:
+        True if the socket reports EOF or an error
+    """
+    if sock.fileno() < 0:
+        return True
+    poller = select.poll()
+    poller.register(sock, select.POLLIN | select.POLLPRI)
+    events = poller.poll(0)
+    if not events:
+        return False
+    if events[0][1] & (select.POLLERR | select.POLLNVAL):
+        return True
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+
+class DisconnectWatcher:
+    """Poll a client socket and cancel a token once the client goes away
+
+    Writes to a dead socket only fail once the next chunk is sent, which
+    can be a long time while a provider is still thinking. Polling detects
+    the hang-up even when nothing is being written.
+    """
+
+    def __init__(self, sock: Optional[socket.socket], token: CancelToken, interval: float = 0.25):
+        self.sock = sock
+        self.token = token
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start watching (no-op if the server does not expose the socket)"""
+        if self.sock is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='disconnect-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching"""
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if self.token.cancelled:
+                return
+            if is_disconnected(self.sock):
+                self.token.cancel()
+                return
@@ -0,0 +1,119 @@
+import importlib
+import re
+from typing import Dict, Any, List, Optional, Callable
+
+# Phrases that mark a refusal or a non-answer
+REFUSAL_PATTERNS = [
+    r"\bI(?:'m| am) (?:not able|unable) to\b",
+    r"\bI can(?:not|'t) (?:help|assist|provide|answer|do that)\b",
+    r"\bas an AI(?: language model)?\b",
+    r"\bI(?:'m| am) sorry,? but\b",
+    r"\bI do(?:n't| not) have (?:access|the ability)\b"
+]
+
+# Phrases that mark low confidence; each one lowers the score
+HEDGING_PATTERNS = [
+    r"\bI(?:'m| am) not (?:sure|certain)\b",
+    r"\bI do(?:n't| not) know\b",
+    r"\bit(?:'s| is) (?:unclear|hard to say)\b",
+    r"\bI (?:think|believe|guess)\b",
+    r"\bpossibly\b",
+    r"\bmight be\b"
+]
+
+DEFAULT_CHECKS = {
+    'min_chars': 20,
+    'max_chars': None,
+    'refusal': True,
+    'hedging': True,
+    'hedging_penalty': 0.15,
+    'code_format': True,
+    'complex_min_words': 60,
+    'min_confidence': 0.6,
+    'classifier': None
+}
+
+_REFUSAL_RE = re.compile('|'.join(REFUSAL_PATTERNS), re.IGNORECASE)
+_HEDGING_RE = re.compile('|'.join(HEDGING_PATTERNS), re.IGNORECASE)
+_classifiers: Dict[str, Callable] = {}
+
+
+class AnswerChecker:
+    """Decide whether a cheap model's answer is good enough to keep
+
+    Runs local heuristics only (no model calls unless a classifier is
+    configured): length bounds, refusal and hedging phrases, code fences for
+    code queries and a minimum length for complex queries. Hard failures
+    reject the answer outright; soft signals lower a confidence score that
+    must reach min_confidence.
+    """
+
+    @staticmethod
+    def evaluate(
+        query: str,
+        answer: str,
+        query_metadata: Dict[str, Any],
+        checks: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Check an answer
+
+        Args:
+            query: User's query
+            answer: Candidate answer
+            query_metadata: QueryAnalyzer.analyze() output for the query
+            checks: Overrides for DEFAULT_CHECKS. 'classifier' may name a
+                "module:function" called as fn(query, answer, query_metadata)
+                that returns a confidence between 0 and 1
+
+        Returns:
+            Dictionary with accepted, confidence and the reasons for any
+            rejection or penalty
+        """
+        checks = {**DEFAULT_CHECKS, **(checks or {})}
+        text = answer.strip()
+        reasons: List[str] = []
+        confidence = 1.0
+
+        # Hard failures
+        if len(text) < (checks['min_chars'] or 0):
+            reasons.append('too_short')
+        if checks['max_chars'] and len(text) > checks['max_chars']:
+            reasons.append('too_long')
+        if checks['refusal'] and _REFUSAL_RE.search(text[:400]):
+            reasons.append('refusal')
+        if text.count('```') % 2 == 1:
+            reasons.append('unclosed_code_block')
+        if checks['code_format'] and query_metadata.get('query_type') == 'code' and '```' not in text:
+            reasons.append('missing_code_block')
+        hard_failure = bool(reasons)
+
+        # Soft signals
+        if checks['hedging']:
+            hedges = len(_HEDGING_RE.findall(text))
+            if hedges:
+                confidence -= checks['hedging_penalty'] * hedges
+                reasons.append(f"hedging x{hedges}")
+        if (checks['complex_min_words'] and query_metadata.get('complexity') == 'complex'
+                and len(text.split()) < checks['complex_min_words']):
+            confidence -= 0.3
+            reasons.append('short_for_complex_query')
+        if checks['classifier']:
+            score = AnswerChecker._classifier(checks['classifier'])(query, answer, query_metadata)
+            confidence = min(confidence, float(score))
+            reasons.append(f"classifier {float(score):.2f}")
+
+        confidence = max(0.0, round(confidence, 3))
+        return {
+            'accepted': not hard_failure and confidence >= checks['min_confidence'],
+            'confidence': 0.0 if hard_failure else confidence,
+            'reasons': reasons
+        }
+
+    @staticmethod
+    def _classifier(spec: str) -> Callable:
+        """Import (once) the function named by "module:function" """
+        if spec not in _classifiers:
+            module, _, name = spec.partition(':')
+            _classifiers[spec] = getattr(importlib.import_module(module), name)
+        return _classifiers[spec]
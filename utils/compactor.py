@@ -0,0 +1,246 @@
+import hashlib
+import io
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_FENCE = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+-]*)")
+_INNER_SPACE = re.compile(r"(?<=\S)[ \t]{2,}")
+
+# Fence languages whose blocks are treated as logs (repeated lines collapsed)
+LOG_FENCES = frozenset({'', 'log', 'logs', 'text', 'txt', 'console', 'output'})
+
+
+class PromptCompactor:
+    """
+    Shrink long pasted inputs (logs, code, documents) before dispatch
+
+    Works line by line in one pass, so a large input is never copied more
+    than once; memory beyond the output is bounded by one block's kept
+    lines. The input is split into blocks: fenced code blocks, and
+    paragraphs separated by blank lines. Then:
+        - whitespace: trailing whitespace is stripped, runs of blank lines
+          become one, and outside code blocks runs of spaces inside a line
+          become one space (indentation is kept)
+        - repeated lines: 3 or more identical consecutive lines in prose or
+          log blocks are kept once, followed by a count marker when that is
+          shorter than the repeats (code blocks are left alone)
+        - duplicate blocks: a block identical to an earlier one is replaced
+          by a marker
+        - oversized blocks: a block longer than max_block_lines keeps its
+          first and last lines around an omission marker
+
+    Markers are short bracketed notes so the model can tell text was removed.
+    """
+
+    def __init__(
+        self,
+        whitespace: bool = True,
+        repeated_lines: bool = True,
+        dedupe: bool = True,
+        max_block_lines: int = 400,
+        min_dedupe_chars: int = 64
+    ):
+        """
+        Initialize compactor
+
+        Args:
+            whitespace: Normalize whitespace
+            repeated_lines: Collapse runs of identical lines
+            dedupe: Replace repeated blocks with a marker
+            max_block_lines: Lines kept per block (0 disables truncation)
+            min_dedupe_chars: Smaller blocks are never deduplicated
+        """
+        self.whitespace = whitespace
+        self.repeated_lines = repeated_lines
+        self.dedupe = dedupe
+        self.max_block_lines = max_block_lines
+        self.min_dedupe_chars = min_dedupe_chars
+
+    @classmethod
+    def from_settings(cls, settings: Any, max_block_lines: int = 400) -> 'PromptCompactor':
+        """
+        Build from a routing rule's "compact" value
+
+        Args:
+            settings: True for the defaults, or a dict of constructor options
+            max_block_lines: Default for max_block_lines
+
+        Returns:
+            PromptCompactor
+        """
+        options = dict(settings) if isinstance(settings, dict) else {}
+        options.pop('min_chars', None)
+        options.setdefault('max_block_lines', max_block_lines)
+        return cls(**options)
+
+    def compact(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Compact a text
+
+        Args:
+            text: Input text
+
+        Returns:
+            Tuple of (compacted text, stats with chars_before, chars_after,
+            duplicate_blocks, repeated_lines and truncated_lines)
+        """
+        stats = {'chars_before': len(text), 'duplicate_blocks': 0, 'repeated_lines': 0, 'truncated_lines': 0}
+        compacted = '\n'.join(self.compact_lines(io.StringIO(text), stats))
+        stats['chars_after'] = len(compacted)
+        return compacted, stats
+
+    def compact_lines(self, lines: Iterable[str], stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        """
+        Compact a stream of lines
+
+        Args:
+            lines: Input lines (a file object works; line endings are stripped)
+            stats: Optional dict whose duplicate_blocks, repeated_lines and
+                truncated_lines counters are incremented
+
+        Yields:
+            Output lines, without line endings
+        """
+        if stats is None:
+            stats = {}
+        for counter in ('duplicate_blocks', 'repeated_lines', 'truncated_lines'):
+            stats.setdefault(counter, 0)
+        seen = set()
+        block = _Block(self.max_block_lines)
+        fence = None
+        blanks = 0
+        started = False
+
+        for raw in lines:
+            line = raw.rstrip('\r\n')
+            if self.whitespace:
+                line = line.rstrip()
+            opening = _FENCE.match(line)
+
+            if fence is None and not line.strip():
+                # Paragraph break outside code
+                if block.has_lines:
+                    yield from self._emit(block, seen, stats, started)
+                    started = True
+                    block = _Block(self.max_block_lines)
+                blanks += 1
+                continue
+
+            if fence is None and (opening or not block.has_lines):
+                if opening and block.has_lines:
+                    # A fence starts a block of its own
+                    yield from self._emit(block, seen, stats, started)
+                    started = True
+                    block = _Block(self.max_block_lines)
+                if started:
+                    block.blanks_before = min(blanks, 1) if self.whitespace else blanks
+                blanks = 0
+                if opening:
+                    fence = opening.group(1)
+                    block.code = opening.group(2).lower() not in LOG_FENCES
+                    block.add(line)
+                    continue
+            elif fence is not None and _closes(line, fence):
+                # The count marker of a run that reaches the fence stays inside the block
+                block.flush_repeats()
+                block.add(line)
+                fence = None
+                yield from self._emit(block, seen, stats, started)
+                started = True
+                block = _Block(self.max_block_lines)
+                continue
+
+            if fence is None and self.whitespace:
+                line = _INNER_SPACE.sub(' ', line)
+            if self.repeated_lines and not block.code:
+                block.add_collapsing(line)
+            else:
+                block.add(line)
+
+        if block.has_lines:
+            yield from self._emit(block, seen, stats, started)
+
+    def _emit(self, block: '_Block', seen: set, stats: Dict[str, int], started: bool) -> Iterator[str]:
+        """Yield one finished block (or its marker)"""
+        block.flush_repeats()
+        if started:
+            for _ in range(block.blanks_before):
+                yield ''
+        if self.dedupe and block.chars >= self.min_dedupe_chars:
+            digest = block.digest()
+            if digest in seen:
+                stats['duplicate_blocks'] += 1
+                yield f"[duplicate of an earlier block omitted: {block.count} lines]"
+                return
+            seen.add(digest)
+        stats['repeated_lines'] += block.repeated
+        yield from block.head
+        if block.omitted:
+            stats['truncated_lines'] += block.omitted
+            yield f"[... {block.omitted} lines omitted ...]"
+        yield from block.tail
+
+
+def _closes(line: str, fence: str) -> bool:
+    """Whether a line closes a fence: the same character, at least as many, nothing else"""
+    stripped = line.strip()
+    return len(stripped) >= len(fence) and stripped == fence[0] * len(stripped)
+
+
+class _Block:
+    """Lines of one block: the first lines, and a bounded tail once it grows past the limit"""
+
+    def __init__(self, max_lines: int):
+        self.max_lines = max_lines
+        self.head_size = max_lines // 2 if max_lines else None
+        self.head: List[str] = []
+        self.tail: deque = deque(maxlen=max_lines - max_lines // 2) if max_lines else deque()
+        self.count = 0
+        self.chars = 0
+        self.omitted = 0
+        self.repeated = 0
+        self.code = False
+        self.blanks_before = 0
+        self._hash = hashlib.sha1()
+        self._last: Optional[str] = None
+        self._repeats = 0
+
+    @property
+    def has_lines(self) -> bool:
+        return self.count > 0 or self._repeats > 0
+
+    def add(self, line: str):
+        """Append a line"""
+        self.count += 1
+        self.chars += len(line) + 1
+        self._hash.update(line.encode('utf-8', 'surrogatepass') + b'\n')
+        if self.head_size is None or len(self.head) < self.head_size:
+            self.head.append(line)
+            return
+        if len(self.tail) == self.tail.maxlen:
+            self.omitted += 1
+        self.tail.append(line)
+
+    def add_collapsing(self, line: str):
+        """Append a line, counting instead of keeping repeats of the previous one"""
+        if line == self._last:
+            self._repeats += 1
+            return
+        self.flush_repeats()
+        self._last = line
+        self.add(line)
+
+    def flush_repeats(self):
+        """Write out the pending repeats of the last line: a count marker, if that is shorter"""
+        marker = f"[previous line repeated {self._repeats} more times]"
+        if self._repeats >= 2 and len(marker) < self._repeats * (len(self._last) + 1) - 1:
+            self.add(marker)
+            self.repeated += self._repeats
+        else:
+            for _ in range(self._repeats):
+                self.add(self._last)
+        self._repeats = 0
+
+    def digest(self) -> bytes:
+        return self._hash.digest()
@@ -0,0 +1,175 @@
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from utils.shared_state import get_stats_store
+from utils.token_counter import TokenCounter
+
+# Stats store namespaces: per-session metadata, and each session's messages
+SESSIONS_NAMESPACE = 'sessions'
+MESSAGES_NAMESPACE = 'session_messages'
+
+
+class Conversation:
+    """History of one chat session"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.messages: List[Dict[str, Any]] = []
+        self.window_start = 0  # Index of the oldest message still sent upstream
+        self.provider: Optional[str] = None  # Sticky provider for prompt caching
+        self.model: Optional[str] = None
+        self.last_active = time.time()
+        self.lock = threading.Lock()
+
+    def append(self, role: str, content: str):
+        """Append a message, counting its tokens once"""
+        self.messages.append({
+            'role': role,
+            'content': content,
+            'tokens': TokenCounter.estimate_tokens(content, 'openai')
+        })
+        self.last_active = time.time()
+
+    def window(self, new_message: str, max_tokens: int) -> List[Dict[str, Any]]:
+        """
+        Build the messages to send for a new user turn
+
+        Drops the oldest turns when the history no longer fits. Trimming goes
+        down to 75% of the budget at once, so the prefix stays identical for
+        the next several turns and provider-side prompt caches keep hitting.
+
+        Args:
+            new_message: The new user message
+            max_tokens: Token budget for history plus the new message
+
+        Returns:
+            List of message dicts (role, content, tokens)
+        """
+        new_tokens = TokenCounter.estimate_tokens(new_message, 'openai')
+        history = self.messages[self.window_start:]
+        total = sum(m['tokens'] for m in history) + new_tokens
+
+        if total > max_tokens:
+            target = int(max_tokens * 0.75)
+            start = self.window_start
+            while start < len(self.messages) and total > target:
+                total -= self.messages[start]['tokens']
+                start += 1
+            # Always start on a user turn
+            while start < len(self.messages) and self.messages[start]['role'] != 'user':
+                total -= self.messages[start]['tokens']
+                start += 1
+            self.window_start = start
+            history = self.messages[start:]
+
+        return history + [{'role': 'user', 'content': new_message, 'tokens': new_tokens}]
+
+    def history_tokens(self) -> int:
+        """Cached token count of the history currently in the window"""
+        return sum(m['tokens'] for m in self.messages[self.window_start:])
+
+
+class ConversationStore:
+    """Memory-bounded store of chat sessions, shared by all workers
+
+    Sessions live in the stats store (the shared state server when it
+    runs), so a follow-up turn may land on any worker. Each request works
+    on its own Conversation loaded from the store, and record_turn writes
+    the session back. Session metadata and messages are kept apart, so
+    eviction only reads the metadata.
+
+    Sessions are evicted least-recently-used when the store is full and
+    expire after a period of inactivity. Each session keeps at most
+    max_messages messages.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: int = 3600, max_messages: int = 200):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Conversation:
+        """
+        Get an existing session, or start a new one
+
+        Args:
+            session_id: Session id from the client; unknown or expired ids
+                (and 'new') start a fresh session with a new id
+
+        Returns:
+            Conversation
+        """
+        store = get_stats_store()
+        meta = store.get(SESSIONS_NAMESPACE, session_id) if session_id else {}
+        if meta and meta['last_active'] >= time.time() - self.ttl_seconds:
+            conversation = Conversation(session_id)
+            conversation.messages = list(store.get(MESSAGES_NAMESPACE, session_id).get('messages', []))
+            conversation.window_start = min(meta.get('window_start', 0), len(conversation.messages))
+            conversation.provider = meta.get('provider')
+            conversation.model = meta.get('model')
+            store.set(SESSIONS_NAMESPACE, session_id, 'last_active', conversation.last_active)
+            return conversation
+
+        self._evict(store)
+        conversation = Conversation(uuid.uuid4().hex)
+        self._save(store, conversation)
+        return conversation
+
+    def record_turn(
+        self,
+        conversation: Conversation,
+        user_message: str,
+        assistant_message: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None
+    ):
+        """Append a completed user/assistant exchange to a session and store it"""
+        with conversation.lock:
+            conversation.append('user', user_message)
+            conversation.append('assistant', assistant_message)
+            overflow = len(conversation.messages) - self.max_messages
+            if overflow > 0:
+                # Drop whole turns so the history still starts with a user message
+                overflow += overflow % 2
+                del conversation.messages[:overflow]
+                conversation.window_start = max(0, conversation.window_start - overflow)
+            if provider is not None:
+                conversation.provider = provider
+                conversation.model = model
+            self._save(get_stats_store(), conversation)
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a session, returning whether it existed"""
+        store = get_stats_store()
+        existed = bool(store.get(SESSIONS_NAMESPACE, session_id))
+        store.delete(SESSIONS_NAMESPACE, session_id)
+        store.delete(MESSAGES_NAMESPACE, session_id)
+        return existed
+
+    @staticmethod
+    def _save(store, conversation: Conversation):
+        # Messages first: a reader that sees the new metadata also finds its messages
+        store.set(MESSAGES_NAMESPACE, conversation.session_id, 'messages', list(conversation.messages))
+        store.set_many(SESSIONS_NAMESPACE, conversation.session_id, {
+            'window_start': conversation.window_start,
+            'provider': conversation.provider,
+            'model': conversation.model,
+            'last_active': conversation.last_active
+        })
+
+    def _evict(self, store):
+        """Drop expired sessions, then the least recently used beyond max_sessions - 1"""
+        sessions = store.get(SESSIONS_NAMESPACE)
+        cutoff = time.time() - self.ttl_seconds
+        by_age = sorted(sessions, key=lambda session_id: sessions[session_id].get('last_active', 0))
+        excess = max(0, len(by_age) - self.max_sessions + 1)
+        for index, session_id in enumerate(by_age):
+            if index >= excess and sessions[session_id].get('last_active', 0) >= cutoff:
+                break
+            store.delete(SESSIONS_NAMESPACE, session_id)
+            store.delete(MESSAGES_NAMESPACE, session_id)
+
+    def __len__(self):
+        return len(get_stats_store().get(SESSIONS_NAMESPACE))
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class EmbeddingCache:
+    """Bounded LRU map of (model, text hash) to embedding vector
+
+    Keys hold a SHA-1 of the text rather than the text itself, so long
+    documents cost only their vector in memory.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], List[float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, text: str) -> Tuple[str, str]:
+        """Cache key for a text embedded with a model"""
+        return model, hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[int, List[float]]:
+        """
+        Look up cached vectors
+
+        Args:
+            model: Embedding model (provider-qualified)
+            texts: Texts to look up
+
+        Returns:
+            Dictionary of index in texts to cached vector (misses are absent)
+        """
+        if self.max_entries <= 0:
+            self.misses += len(texts)
+            return {}
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[index] = vector
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[List[float]]):
+        """Store vectors for texts, evicting the least recently used"""
+        if self.max_entries <= 0:
+            return
+        keys = [self.key(model, text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Optional[float]]:
+        """Entry count and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None
+        }
+
+    def __len__(self):
+        return len(self._entries)
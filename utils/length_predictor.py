@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.metrics import Histogram
+from utils.shared_state import get_stats_store
+
+# Bucket bounds (tokens) of the answer length histograms, about 1.5x apart
+# so a percentile's bucket bound stays close to the true value
+OUTPUT_TOKEN_BUCKETS = (
+    16, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024,
+    1536, 2048, 3072, 4096, 6144, 8192, 12288, 16384
+)
+
+
+class OutputLengthPredictor:
+    """
+    Predict how long an answer will be from past answers to similar queries
+
+    Queries are grouped by QueryAnalyzer's query_type and complexity. Each
+    group keeps a fleet-wide histogram of answer lengths (output tokens) in
+    the stats store; the prediction is a high percentile of that histogram
+    times a safety margin, clamped to [min_tokens, max_tokens]. Groups with
+    fewer than min_samples answers get no prediction.
+
+    Predictions are recomputed from the stats store at most every
+    refresh_seconds, so predict() is a dictionary lookup on the request path.
+    """
+
+    NAMESPACE = 'output_lengths'
+
+    def __init__(
+        self,
+        quantile: float = 95.0,
+        margin: float = 1.25,
+        min_samples: int = 50,
+        min_tokens: int = 256,
+        max_tokens: int = 4096,
+        refresh_seconds: float = 30.0
+    ):
+        """
+        Initialize predictor
+
+        Args:
+            quantile: Percentile of past answer lengths to predict from
+            margin: Multiplier applied to that percentile
+            min_samples: Answers a group needs before it is predicted
+            min_tokens: Smallest prediction
+            max_tokens: Largest prediction
+            refresh_seconds: How long predictions are reused before the
+                histograms are read again
+        """
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.refresh_seconds = refresh_seconds
+        self.buckets = Histogram(OUTPUT_TOKEN_BUCKETS)
+        self._predictions: Dict[str, int] = {}
+        self._refreshed_at = float('-inf')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(query_metadata: Dict[str, Any]) -> str:
+        """Histogram key of a query, e.g. 'code/complex'"""
+        return f"{query_metadata['query_type']}/{query_metadata['complexity']}"
+
+    def predict(self, query_metadata: Dict[str, Any]) -> Optional[int]:
+        """
+        Predicted output tokens for a query
+
+        Args:
+            query_metadata: QueryAnalyzer result
+
+        Returns:
+            Token count, or None while the query's group has too few samples
+        """
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self._refresh()
+        return self._predictions.get(self.group(query_metadata))
+
+    def _refresh(self):
+        """Recompute every group's prediction from the shared histograms"""
+        with self._lock:
+            if time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return
+            predictions = {}
+            for group, fields in get_stats_store().get(self.NAMESPACE).items():
+                if fields.get('samples', 0) < self.min_samples:
+                    continue
+                histogram = Histogram.from_fields(fields, 'tokens:', OUTPUT_TOKEN_BUCKETS)
+                predicted = int(histogram.percentile(self.quantile) * self.margin)
+                predictions[group] = max(self.min_tokens, min(predicted, self.max_tokens))
+            self._predictions = predictions
+            self._refreshed_at = time.monotonic()
+
+    def record(self, query_metadata: Dict[str, Any], output_tokens: int, predicted: Optional[int] = None):
+        """
+        Add a finished answer to its group and score the prediction made for it
+
+        Args:
+            query_metadata: QueryAnalyzer result the prediction was made from
+            output_tokens: Actual answer length
+            predicted: Prediction made for the request, if any
+        """
+        bucket = self.buckets.bucket_field(output_tokens)
+        fields = {'samples': 1, f"tokens:{bucket}": 1, 'tokens:sum': output_tokens}
+        if predicted:
+            fields.update({
+                'predicted': 1,
+                'predicted:sum': predicted,
+                'predicted:actual': output_tokens,
+                'abs_error:sum': abs(output_tokens - predicted),
+                # Answers that reached the prediction (cut short when enforced)
+                'reached': int(output_tokens >= predicted)
+            })
+        get_stats_store().incr_many(self.NAMESPACE, self.group(query_metadata), fields)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Fleet-wide answer lengths and prediction error per group
+
+        Returns:
+            Dictionary of group to sample count, mean/p50/p95 answer length,
+            current prediction, and for predicted requests the mean absolute
+            error, the share of answers that reached the prediction and the
+            tokens reserved per token actually generated
+        """
+        stats = {}
+        for group, fields in get_stats_store().get(self.NAMESPACE).items():
+            samples = fields.get('samples', 0)
+            histogram = Histogram.from_fields(fields, 'tokens:', OUTPUT_TOKEN_BUCKETS)
+            entry = {
+                'samples': samples,
+                'mean_tokens': round(fields.get('tokens:sum', 0) / samples, 1) if samples else None,
+                'p50_tokens': histogram.percentile(50),
+                'p95_tokens': histogram.percentile(95),
+                'prediction': self._predictions.get(group)
+            }
+            predicted = fields.get('predicted', 0)
+            if predicted:
+                entry.update({
+                    'predicted_requests': predicted,
+                    'mean_abs_error': round(fields.get('abs_error:sum', 0) / predicted, 1),
+                    'reached_rate': round(fields.get('reached', 0) / predicted, 3),
+                    'reserved_per_token': round(fields.get('predicted:sum', 0) / max(fields.get('predicted:actual', 0), 1), 2)
+                })
+            stats[group] = entry
+        return stats
@@ -0,0 +1,123 @@
+import bisect
+import threading
+from typing import Dict, Any, Optional, Sequence
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram
+
+    Percentiles are reported as the upper bound of the bucket the requested
+    rank falls into, which is enough to watch p50/p95/p99 trends without
+    keeping every observation.
+    """
+
+    # Bucket upper bounds in seconds, suitable for request latencies
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None):
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot: +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def seed(self, value: float, count: int = 1):
+        """Record `count` identical observations (e.g. from a stored baseline)"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += count
+            self._count += count
+            self._sum += value * count
+            self._max = max(self._max, value)
+
+    def bucket_field(self, value: float) -> str:
+        """Counter name for the bucket holding value, for histograms kept in a stats store"""
+        index = bisect.bisect_left(self.buckets, value)
+        return f"le_{self.buckets[index]}" if index < len(self.buckets) else 'le_inf'
+
+    @classmethod
+    def from_fields(cls, fields: Dict[str, float], prefix: str = '', buckets: Optional[Sequence[float]] = None) -> 'Histogram':
+        """
+        Rebuild a histogram from bucket counters written with bucket_field
+
+        Args:
+            fields: Stats store record holding the counters
+            prefix: Prefix of this histogram's fields in the record
+            buckets: Bucket bounds the counters were written with
+
+        Returns:
+            Histogram (the maximum is approximated by the largest bound)
+        """
+        histogram = cls(buckets)
+        for index, bound in enumerate(histogram.buckets):
+            histogram._counts[index] = fields.get(f"{prefix}le_{bound}", 0)
+        histogram._counts[-1] = fields.get(f"{prefix}le_inf", 0)
+        histogram._count = sum(histogram._counts)
+        histogram._sum = fields.get(f"{prefix}sum", 0.0)
+        filled = [bound for bound, count in zip(histogram.buckets, histogram._counts) if count]
+        histogram._max = histogram.buckets[-1] if histogram._counts[-1] else (filled[-1] if filled else 0.0)
+        return histogram
+
+    def percentile(self, p: float) -> float:
+        """
+        Approximate percentile
+
+        Args:
+            p: Percentile between 0 and 100
+
+        Returns:
+            Upper bound of the bucket holding the percentile (0 if empty)
+        """
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            rank = max(1, int(round(self._count * p / 100.0)))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return self.buckets[index] if index < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary suitable for JSON responses"""
+        with self._lock:
+            count, total, largest = self._count, self._sum, self._max
+        return {
+            'count': count,
+            'mean': round(total / count, 4) if count else 0.0,
+            'max': round(largest, 4),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+def diff_records(previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fields that changed between two snapshots of keyed records
+
+    Args:
+        previous: Earlier snapshot (empty for a full update)
+        current: New snapshot
+
+    Returns:
+        For each key with changes, only its changed fields
+    """
+    delta = {}
+    for key, record in current.items():
+        before = previous.get(key, {})
+        changed = {field: value for field, value in record.items() if before.get(field) != value}
+        if changed:
+            delta[key] = changed
+    return delta
@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into batched calls
+
+    submit() puts an item on a queue and returns a Future. A dispatcher
+    thread takes the first waiting item, waits for one of max_in_flight
+    slots, keeps collecting until it has max_batch_size items or max_wait_ms
+    has passed, then hands the batch to batch_fn on a small pool and
+    resolves each item's Future with its result. If batch_fn raises,
+    every Future in that batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_in_flight: int = 4,
+        name: str = 'micro-batcher'
+    ):
+        """
+        Initialize batcher
+
+        Args:
+            batch_fn: Called with a list of items; must return one result per
+                item, in order
+            max_batch_size: Most items passed to one batch_fn call
+            max_wait_ms: Longest an item waits for others to join its batch
+            max_in_flight: Batches allowed to run concurrently
+            name: Thread name prefix
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_in_flight = max(1, max_in_flight)
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[threading.Semaphore] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the dispatcher thread
+
+        Safe to call repeatedly; the thread is (re)started once per process,
+        since threads started before a fork do not run in the workers.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=self.name)
+            self._slots = threading.Semaphore(self.max_in_flight)
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue one item
+
+        Args:
+            item: Item to include in a batch
+
+        Returns:
+            Future resolved with the item's result
+        """
+        if self._pid != os.getpid():
+            self.start()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit_many(self, items: Sequence[Any]) -> List[Future]:
+        """Queue several items; they may be split across batches"""
+        return [self.submit(item) for item in items]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Wait for a free slot before collecting the rest, so items that
+            # arrive while a slow upstream holds every slot join this batch
+            # instead of queueing separate calls
+            self._slots.acquire()
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Drain items that are already waiting even past the deadline
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._pool.submit(self._execute, batch)
+
+    def _execute(self, batch: List[tuple]):
+        try:
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(items):
+                    raise ValueError(f"batch function returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            with self._lock:
+                self.batches += 1
+                self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def get_stats(self) -> dict:
+        """Batch count, item count and average batch size"""
+        with self._lock:
+            batches, items = self.batches, self.items
+        return {
+            'batches': batches,
+            'items': items,
+            'avg_batch_size': round(items / batches, 2) if batches else 0.0,
+            'queued': self._queue.qsize()
+        }
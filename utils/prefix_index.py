@@ -0,0 +1,53 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class PrefixIndex:
+    """Track how often long prompt prefixes recur
+
+    Writing a prefix to a provider's prompt cache costs more than sending it
+    normally, so a prefix is only marked cacheable once it has been seen
+    min_hits times within ttl_seconds (the provider's cache lifetime).
+    Only hashes are kept, in a bounded LRU map.
+    """
+
+    def __init__(self, min_tokens: int = 1024, min_hits: int = 2, ttl_seconds: int = 300, max_entries: int = 10000):
+        self.min_tokens = min_tokens
+        self.min_hits = min_hits
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()  # hash -> [hits, last_seen]
+        self._lock = threading.Lock()
+
+    def observe(self, prefix: str) -> bool:
+        """
+        Record a prefix and decide whether it should be cached
+
+        Args:
+            prefix: Prompt prefix text (system prompt, shared document, ...)
+
+        Returns:
+            True if the prefix is long enough and recurring
+        """
+        # Cheap length gate first: ~4 characters per token
+        if not prefix or len(prefix) // 4 < self.min_tokens:
+            return False
+
+        digest = hashlib.sha1(prefix.encode('utf-8', 'surrogatepass')).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or now - entry[1] > self.ttl_seconds:
+                entry = [0, now]
+                self._entries[digest] = entry
+            entry[0] += 1
+            entry[1] = now
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry[0] >= self.min_hits
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,200 @@
+import json
+import os
+import socket
+import ssl
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# Short, fixed prompt so every probe costs a few tokens and answers alike
+PROBE_PROMPT = 'Count from 1 to 20, separated by spaces. Reply with the numbers only.'
+PROBE_MAX_TOKENS = 64
+
+# Slowdowns smaller than this are treated as measurement noise, not regressions
+NOISE_MS = 5.0
+
+# API hosts of providers whose SDK client does not expose a base_url
+DEFAULT_HOSTS = {
+    'google': 'https://generativelanguage.googleapis.com'
+}
+
+
+def connect_time(url: str, timeout: float = 10.0) -> float:
+    """
+    Seconds to open a TCP connection (and finish the TLS handshake for https)
+
+    Args:
+        url: Any URL on the host to measure
+        timeout: Socket timeout
+
+    Returns:
+        Connect time in seconds
+    """
+    parsed = urlparse(url)
+    secure = parsed.scheme == 'https'
+    port = parsed.port or (443 if secure else 80)
+    started = time.perf_counter()
+    sock = socket.create_connection((parsed.hostname, port), timeout=timeout)
+    try:
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+        return time.perf_counter() - started
+    finally:
+        sock.close()
+
+
+def provider_url(provider: Any, name: str) -> Optional[str]:
+    """Base URL a provider's requests go to, if known"""
+    url = getattr(provider, 'base_url', None) or getattr(provider.client, 'base_url', None)
+    return str(url) if url else DEFAULT_HOSTS.get(name)
+
+
+def probe_model(provider: Any, name: str, model: str, samples: int = 3) -> Dict[str, Any]:
+    """
+    Measure one provider/model with the fixed probe prompt
+
+    Each sample is one streamed request. Connect time is measured on a
+    separate connection to the provider's host, since the SDKs do not
+    report it.
+
+    Args:
+        provider: Provider instance (a copy pinned to model is used)
+        name: Provider name
+        model: Model to probe
+        samples: Requests to send; the medians are reported
+
+    Returns:
+        Dictionary with ok, connect_ms, ttft_ms, latency_ms,
+        tokens_per_second, output_tokens, samples and error
+    """
+    result: Dict[str, Any] = {'provider': name, 'model': model, 'ok': False, 'samples': 0, 'error': None}
+    ttfts: List[float] = []
+    latencies: List[float] = []
+    rates: List[float] = []
+    output_tokens = 0
+    try:
+        target = provider.for_model(model)
+        url = provider_url(target, name)
+        if url:
+            result['connect_ms'] = round(connect_time(url) * 1000, 1)
+        for _ in range(samples):
+            usage: Dict[str, Any] = {}
+            started = time.perf_counter()
+            first = None
+            text = ''
+            for chunk in target.query(PROBE_PROMPT, stream=True, usage=usage, max_tokens=PROBE_MAX_TOKENS):
+                if first is None:
+                    first = time.perf_counter()
+                text += chunk
+            ended = time.perf_counter()
+            if first is None:
+                raise RuntimeError('empty answer')
+            output_tokens = usage.get('output_tokens') or target.count_tokens(text)
+            ttfts.append(first - started)
+            latencies.append(ended - started)
+            if ended > first and output_tokens > 1:
+                rates.append((output_tokens - 1) / (ended - first))
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['samples'] = len(ttfts)
+    if ttfts:
+        result.update({
+            'ok': result['error'] is None,
+            'ttft_ms': round(statistics.median(ttfts) * 1000, 1),
+            'latency_ms': round(statistics.median(latencies) * 1000, 1),
+            'tokens_per_second': round(statistics.median(rates), 1) if rates else None,
+            'output_tokens': output_tokens
+        })
+    return result
+
+
+def run_probe(providers: Dict[str, Any], targets: List[tuple], samples: int = 3) -> Dict[str, Any]:
+    """
+    Probe several provider/model pairs
+
+    Args:
+        providers: Provider name to instance
+        targets: (provider name, model) pairs
+        samples: Requests per target
+
+    Returns:
+        Baseline document: generated_at, prompt and results keyed by
+        "provider/model"
+    """
+    results = {}
+    for name, model in targets:
+        if name in providers:
+            results[f"{name}/{model}"] = probe_model(providers[name], name, model, samples)
+    return {
+        'generated_at': time.time(),
+        'prompt': PROBE_PROMPT,
+        'results': results
+    }
+
+
+def save_baseline(baseline: Dict[str, Any], path: str):
+    """Write a baseline file (atomically)"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    """Read a baseline file; None if it is missing or unreadable"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+        return baseline if isinstance(baseline.get('results'), dict) else None
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠ Ignoring latency baseline {path}: {e}")
+        return None
+
+
+def find_regressions(
+    current: Dict[str, Any],
+    previous: Optional[Dict[str, Any]] = None,
+    tolerance: float = 0.5,
+    max_ttft_ms: Optional[float] = None,
+    min_tokens_per_second: Optional[float] = None
+) -> List[str]:
+    """
+    Compare a probe run with a previous baseline and absolute limits
+
+    Args:
+        current: Baseline from run_probe
+        previous: Earlier baseline to compare with
+        tolerance: Allowed relative slowdown of connect/TTFT (and drop in
+            tokens/sec) against the previous baseline
+        max_ttft_ms: Absolute TTFT limit
+        min_tokens_per_second: Absolute throughput floor
+
+    Returns:
+        Human-readable regressions (empty when everything passed)
+    """
+    problems = []
+    before_results = (previous or {}).get('results', {})
+    for key, result in current['results'].items():
+        if not result['ok']:
+            problems.append(f"{key}: probe failed ({result['error']})")
+            continue
+        if max_ttft_ms is not None and result['ttft_ms'] > max_ttft_ms:
+            problems.append(f"{key}: TTFT {result['ttft_ms']} ms exceeds {max_ttft_ms} ms")
+        rate = result.get('tokens_per_second')
+        if min_tokens_per_second is not None and rate is not None and rate < min_tokens_per_second:
+            problems.append(f"{key}: {rate} tokens/s is below {min_tokens_per_second}")
+
+        before = before_results.get(key)
+        if not before or not before.get('ok'):
+            continue
+        for metric in ('connect_ms', 'ttft_ms'):
+            if (before.get(metric) and result.get(metric) and result[metric] > before[metric] * (1 + tolerance)
+                    and result[metric] - before[metric] > NOISE_MS):
+                problems.append(f"{key}: {metric} {before[metric]} -> {result[metric]}")
+        if before.get('tokens_per_second') and rate is not None and rate < before['tokens_per_second'] / (1 + tolerance):
+            problems.append(f"{key}: tokens_per_second {before['tokens_per_second']} -> {rate}")
+    return problems
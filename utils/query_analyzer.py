@@ -37,8 +37,7 @@ class QueryAnalyzer:
         # Determine query type
         query_type = QueryAnalyzer._detect_query_type(query_lower)
         
-        # Estimate token count (rough estimation)
-        token_count = len(query.split())
+        token_count = QueryAnalyzer.count_tokens(query)
         
         # Detect complexity
         complexity = QueryAnalyzer._estimate_complexity(query)
@@ -55,6 +54,11 @@ class QueryAnalyzer:
             'word_count': len(query.split())
         }
     
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """Rough token count used for token_count (whitespace-separated words)"""
+        return len(text.split())
+    
     @staticmethod
     def _detect_query_type(query_lower: str) -> str:
         """Detect the type of query"""
@@ -0,0 +1,309 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from utils.cancellation import CancelToken, RequestCancelled
+from utils.metrics import Histogram
+
+# Highest priority first
+PRIORITY_CLASSES = ('interactive', 'standard', 'batch')
+DEFAULT_PRIORITY = 'standard'
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waits in the queue longer than allowed"""
+    pass
+
+
+class SchedulerFull(SchedulerTimeout):
+    """Raised when a request would queue past its class's share of the queue"""
+    pass
+
+
+class Ticket:
+    """A request waiting for, or holding, a scheduler slot"""
+
+    def __init__(self, priority: str, tenant: str, start_tag: float, finish_tag: float):
+        self.priority = priority
+        self.tenant = tenant
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.queue_time = 0.0
+        self.admitted = False
+        self.abandoned = False
+
+
+class RequestScheduler:
+    """Admission control in front of the router
+
+    - Priority classes: free slots go to interactive requests first, then
+      standard, then batch. Each class may hold at most a share of all
+      slots, so long-running batch streams can never occupy the slots
+      interactive traffic needs.
+    - Weighted fair queuing: inside a class, requests are ordered by
+      virtual finish time per tenant, so one tenant flooding the queue
+      only delays itself.
+    - Bulkheads: each provider has its own concurrency limit; a provider at
+      its limit is skipped (fallback) rather than queued behind.
+    - Bounded queue: a waiting request holds a server thread, so at most
+      max_queued requests wait. Lower classes may only fill their share of
+      the queue, leaving room for interactive requests to queue.
+    """
+
+    # Tenant finish tags kept before stale ones are pruned
+    PRUNE_MIN_ENTRIES = 1024
+
+    def __init__(
+        self,
+        max_concurrent: int = 64,
+        queue_timeout: float = 30.0,
+        class_shares: Optional[Dict[str, float]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        provider_limits: Optional[Dict[str, int]] = None,
+        default_provider_limit: int = 32,
+        max_queued: Optional[int] = None
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            max_concurrent: Requests allowed upstream at once (all classes)
+            queue_timeout: Seconds a request may wait before being rejected
+            class_shares: Maximum share of max_concurrent per class
+            tenant_weights: Fair-share weight per tenant (default 1.0)
+            provider_limits: Concurrent requests allowed per provider
+            default_provider_limit: Limit for providers not listed
+            max_queued: Requests allowed to wait at once (None for no limit);
+                each class may fill its class share of it
+        """
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.class_shares = {'interactive': 1.0, 'standard': 0.9, 'batch': 0.5}
+        self.class_shares.update(class_shares or {})
+        self.tenant_weights = tenant_weights or {}
+        self.provider_limits = provider_limits or {}
+        self.default_provider_limit = default_provider_limit
+        self.max_queued = max_queued
+
+        self._cond = threading.Condition()
+        self._queues = {cls: [] for cls in PRIORITY_CLASSES}
+        self._active = {cls: 0 for cls in PRIORITY_CLASSES}
+        # Tickets waiting in any queue (not admitted or abandoned)
+        self._waiting = 0
+        self._virtual_time = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._max_finish = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._tenant_finish: Dict[tuple, float] = {}
+        # Size of _tenant_finish that triggers the next prune
+        self._prune_at = self.PRUNE_MIN_ENTRIES
+        self._sequence = itertools.count()
+        self._counters = {cls: {'admitted': 0, 'rejected': 0} for cls in PRIORITY_CLASSES}
+        self.queue_times = {cls: Histogram() for cls in PRIORITY_CLASSES}
+
+        self._bulkheads: Dict[str, threading.BoundedSemaphore] = {}
+        self._bulkhead_in_use: Dict[str, int] = {}
+        self._bulkhead_rejected: Dict[str, int] = {}
+        self._bulkhead_lock = threading.Lock()
+
+    @staticmethod
+    def normalize_priority(priority: Optional[str]) -> str:
+        """Map a client-supplied priority to a known class"""
+        priority = (priority or '').strip().lower()
+        return priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+    def _class_limit(self, priority: str) -> int:
+        return max(1, int(self.max_concurrent * self.class_shares.get(priority, 1.0)))
+
+    def _queue_limit(self, priority: str) -> Optional[int]:
+        if self.max_queued is None:
+            return None
+        return max(1, int(self.max_queued * self.class_shares.get(priority, 1.0)))
+
+    def acquire(
+        self,
+        priority: Optional[str] = None,
+        tenant: str = 'default',
+        cancel: Optional[CancelToken] = None
+    ) -> Ticket:
+        """
+        Wait for a slot
+
+        Args:
+            priority: Priority class (unknown values map to 'standard')
+            tenant: Tenant or API key identity used for fair sharing
+            cancel: Optional token; waiting stops if it is cancelled
+
+        Returns:
+            Admitted ticket; pass it to release() when the request ends
+
+        Raises:
+            SchedulerFull: Would wait while the queue holds its class's share
+            SchedulerTimeout: Waited longer than queue_timeout
+            RequestCancelled: The cancel token fired while waiting
+        """
+        priority = self.normalize_priority(priority)
+        weight = max(self.tenant_weights.get(tenant, 1.0), 0.001)
+
+        with self._cond:
+            start = max(self._virtual_time[priority], self._tenant_finish.get((priority, tenant), 0.0))
+            finish = start + 1.0 / weight
+            self._tenant_finish[(priority, tenant)] = finish
+            self._max_finish[priority] = max(self._max_finish[priority], finish)
+            ticket = Ticket(priority, tenant, start, finish)
+            heapq.heappush(self._queues[priority], (finish, next(self._sequence), ticket))
+            self._waiting += 1
+
+            deadline = ticket.enqueued_at + self.queue_timeout
+            self._dispatch()
+            queue_limit = self._queue_limit(priority)
+            if not ticket.admitted and queue_limit is not None and self._waiting > queue_limit:
+                ticket.abandoned = True
+                self._waiting -= 1
+                self._counters[priority]['rejected'] += 1
+                raise SchedulerFull(f"The {priority} queue is full ({self._waiting} requests waiting)")
+            while not ticket.admitted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (cancel is not None and cancel.cancelled):
+                    ticket.abandoned = True
+                    self._waiting -= 1
+                    self._counters[priority]['rejected'] += 1
+                    if remaining <= 0:
+                        raise SchedulerTimeout(
+                            f"Request waited more than {self.queue_timeout}s in the {priority} queue"
+                        )
+                    raise RequestCancelled("Request cancelled while queued")
+                # Wake periodically to notice cancellation
+                self._cond.wait(min(remaining, 0.25))
+
+        ticket.queue_time = time.monotonic() - ticket.enqueued_at
+        self.queue_times[priority].observe(ticket.queue_time)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Give a slot back and admit the next waiting request"""
+        with self._cond:
+            if not ticket.admitted:
+                return
+            ticket.admitted = False
+            self._active[ticket.priority] -= 1
+            self._dispatch()
+            if len(self._tenant_finish) >= self._prune_at:
+                self._prune_tenants()
+
+    def _prune_tenants(self):
+        """
+        Forget tenants whose finish tag the class's virtual time has passed (lock held)
+
+        Such a tenant's next request starts at the virtual time either way,
+        so dropping its entry changes nothing; without this, every distinct
+        tenant (e.g. each client address) would stay in the dict forever.
+        The threshold doubles with the entries still in use, so pruning
+        costs O(1) per request amortized.
+        """
+        self._tenant_finish = {
+            key: finish for key, finish in self._tenant_finish.items()
+            if finish > self._virtual_time[key[0]]
+        }
+        self._prune_at = max(self.PRUNE_MIN_ENTRIES, 2 * len(self._tenant_finish))
+
+    def _dispatch(self):
+        """Admit queued requests while slots are free, highest class first (lock held)"""
+        admitted_any = False
+        for priority in PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            while queue:
+                if sum(self._active.values()) >= self.max_concurrent:
+                    break
+                if self._active[priority] >= self._class_limit(priority):
+                    break
+                _, _, ticket = heapq.heappop(queue)
+                if ticket.abandoned:
+                    continue
+                ticket.admitted = True
+                self._waiting -= 1
+                self._active[priority] += 1
+                self._counters[priority]['admitted'] += 1
+                self._virtual_time[priority] = max(self._virtual_time[priority], ticket.start_tag)
+                admitted_any = True
+            if not queue:
+                # Backlog drained: past finish tags no longer matter (the
+                # end of a busy period in start-time fair queuing)
+                self._virtual_time[priority] = self._max_finish[priority]
+        if admitted_any:
+            self._cond.notify_all()
+
+    def _bulkhead(self, provider: str) -> threading.BoundedSemaphore:
+        with self._bulkhead_lock:
+            if provider not in self._bulkheads:
+                limit = self.provider_limits.get(provider, self.default_provider_limit)
+                self._bulkheads[provider] = threading.BoundedSemaphore(limit)
+                self._bulkhead_in_use[provider] = 0
+                self._bulkhead_rejected[provider] = 0
+            return self._bulkheads[provider]
+
+    def acquire_provider(self, provider: str, timeout: float = 0.0, reserve: int = 0) -> bool:
+        """
+        Take a concurrency slot for a provider
+
+        Args:
+            provider: Provider name
+            timeout: Seconds to wait for a free slot
+            reserve: Only take a slot if this many stay free for other
+                callers (refusals are not counted as rejections)
+
+        Returns:
+            True if a slot was taken (call release_provider later)
+        """
+        semaphore = self._bulkhead(provider)
+        if reserve > 0:
+            limit = self.provider_limits.get(provider, self.default_provider_limit)
+            with self._bulkhead_lock:
+                if self._bulkhead_in_use[provider] + reserve >= limit:
+                    return False
+        acquired = semaphore.acquire(timeout=timeout) if timeout > 0 else semaphore.acquire(blocking=False)
+        with self._bulkhead_lock:
+            if acquired:
+                self._bulkhead_in_use[provider] += 1
+            else:
+                self._bulkhead_rejected[provider] += 1
+        return acquired
+
+    def release_provider(self, provider: str):
+        """Give back a provider concurrency slot"""
+        with self._bulkhead_lock:
+            self._bulkhead_in_use[provider] -= 1
+        self._bulkheads[provider].release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, active requests and queue-time histograms per class"""
+        with self._cond:
+            classes = {
+                priority: {
+                    'queued': sum(1 for _, _, t in self._queues[priority] if not t.abandoned),
+                    'active': self._active[priority],
+                    'limit': self._class_limit(priority),
+                    'queue_limit': self._queue_limit(priority),
+                    **self._counters[priority]
+                }
+                for priority in PRIORITY_CLASSES
+            }
+        for priority in PRIORITY_CLASSES:
+            classes[priority]['queue_time'] = self.queue_times[priority].snapshot()
+
+        with self._bulkhead_lock:
+            providers = {
+                name: {
+                    'in_use': self._bulkhead_in_use[name],
+                    'limit': self.provider_limits.get(name, self.default_provider_limit),
+                    'rejected': self._bulkhead_rejected[name]
+                }
+                for name in self._bulkheads
+            }
+
+        return {
+            'max_concurrent': self.max_concurrent,
+            'classes': classes,
+            'providers': providers
+        }
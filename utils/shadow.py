@@ -0,0 +1,131 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+_WORD = re.compile(r"\w+")
+
+
+def lexical_similarity(a: str, b: str) -> float:
+    """Cosine similarity of two texts' word counts (0 to 1)"""
+    left = Counter(_WORD.findall(a.lower()))
+    right = Counter(_WORD.findall(b.lower()))
+    if not left or not right:
+        return 1.0 if left == right else 0.0
+    dot = sum(count * right[word] for word, count in left.items())
+    return dot / (math.sqrt(sum(c * c for c in left.values())) * math.sqrt(sum(c * c for c in right.values())))
+
+
+def vector_similarity(u: Sequence[float], v: Sequence[float]) -> float:
+    """Cosine similarity of two embedding vectors"""
+    dot = sum(x * y for x, y in zip(u, v))
+    norm = math.sqrt(sum(x * x for x in u)) * math.sqrt(sum(y * y for y in v))
+    return dot / norm if norm else 0.0
+
+
+class PrimaryResult:
+    """
+    What a shadow needs from the request it mirrors
+
+    Filled on the request thread as events go by and read by the shadow
+    once finish() is called. Timings start when the shadow is started, so
+    both sides are measured from the same moment (after queueing and
+    routing).
+    """
+
+    def __init__(self, keep_text: bool = False):
+        """
+        Initialize result
+
+        Args:
+            keep_text: Keep the answer text (for output similarity)
+        """
+        self.keep_text = keep_text
+        self.started = time.perf_counter()
+        self.parts: List[str] = []
+        self.ttft: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.status: Optional[str] = None
+        self.usage: Dict[str, Any] = {}
+        self._done = threading.Event()
+
+    def add(self, chunk: str):
+        """Record an answer chunk"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+        if self.keep_text:
+            self.parts.append(chunk)
+
+    def reset(self):
+        """Drop the answer so far (the client was told to discard it)"""
+        self.parts = []
+
+    def finish(self, status: str, usage: Dict[str, Any]):
+        """Record how the request ended and release the waiting shadow"""
+        self.latency = time.perf_counter() - self.started
+        self.status = status
+        self.usage = usage
+        self._done.set()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for the request to end; False on timeout"""
+        return self._done.wait(timeout)
+
+    @property
+    def answer(self) -> str:
+        return ''.join(self.parts)
+
+
+class ShadowPool:
+    """
+    Background runner for shadow requests with a hard concurrency cap
+
+    try_submit() never waits: when max_concurrent shadows are already
+    running the request is not mirrored, so shadow load cannot queue up
+    behind (or in front of) production traffic. Threads are started per
+    process on first use (they do not survive a fork).
+    """
+
+    def __init__(self, max_concurrent: int = 2):
+        """
+        Initialize pool
+
+        Args:
+            max_concurrent: Shadow requests running at once in this process
+        """
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max(max_concurrent, 1))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def try_submit(self, fn, *args) -> bool:
+        """
+        Run fn(*args) in the background if a slot is free
+
+        Returns:
+            False if the pool is full (or disabled) and nothing was started
+        """
+        if self.max_concurrent <= 0 or not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='shadow')
+                self._pid = os.getpid()
+            self.in_flight += 1
+
+        def run():
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._slots.release()
+
+        self._executor.submit(run)
+        return True
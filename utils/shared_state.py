@@ -0,0 +1,159 @@
+import os
+import threading
+from multiprocessing.managers import BaseManager
+from typing import Dict, Any, Optional
+
+
+class StatsStore:
+    """Thread-safe counter store keyed by namespace and key"""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, namespace: str, key: str, field: str, amount: float = 1) -> float:
+        """
+        Increment a counter field
+
+        Args:
+            namespace: Group of related records (e.g. 'providers')
+            key: Record name inside the namespace
+            field: Counter field to increment
+            amount: Value to add
+
+        Returns:
+            The new value of the counter
+        """
+        with self._lock:
+            record = self._data.setdefault(namespace, {}).setdefault(key, {})
+            record[field] = record.get(field, 0) + amount
+            return record[field]
+
+    def incr_many(self, namespace: str, key: str, fields: Dict[str, float]):
+        """Increment several counter fields of one record atomically"""
+        with self._lock:
+            record = self._data.setdefault(namespace, {}).setdefault(key, {})
+            for field, amount in fields.items():
+                record[field] = record.get(field, 0) + amount
+
+    def set(self, namespace: str, key: str, field: str, value: Any):
+        """Set a field to an absolute value"""
+        with self._lock:
+            self._data.setdefault(namespace, {}).setdefault(key, {})[field] = value
+
+    def set_many(self, namespace: str, key: str, fields: Dict[str, Any]):
+        """Set several fields of one record atomically"""
+        with self._lock:
+            self._data.setdefault(namespace, {}).setdefault(key, {}).update(fields)
+
+    def get(self, namespace: str, key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a copy of a record, or of every record in a namespace
+
+        Args:
+            namespace: Namespace to read
+            key: Optional record name; all records are returned if omitted
+
+        Returns:
+            Dictionary copy safe to use outside the lock
+        """
+        with self._lock:
+            records = self._data.get(namespace, {})
+            if key is not None:
+                return dict(records.get(key, {}))
+            return {name: dict(record) for name, record in records.items()}
+
+    def delete(self, namespace: str, key: str):
+        """Drop one record"""
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def clear(self, namespace: Optional[str] = None):
+        """Drop one namespace, or everything"""
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+            else:
+                self._data.pop(namespace, None)
+
+
+# Single store instance hosted by the shared state server process
+_server_store = StatsStore()
+
+
+def _get_server_store() -> StatsStore:
+    return _server_store
+
+
+class SharedStateManager(BaseManager):
+    """Manager serving one StatsStore to all workers over a local socket"""
+    pass
+
+
+SharedStateManager.register('get_store', callable=_get_server_store)
+
+
+def start_shared_state_server(address: str, authkey: str) -> threading.Thread:
+    """
+    Start the shared state server on a background thread
+
+    Called once from the gunicorn master before workers are forked. The
+    server runs inside the master rather than a child process, so gunicorn
+    never reaps it as if it were a worker.
+
+    Args:
+        address: Path of the unix socket to listen on
+        authkey: Shared secret workers use to connect
+
+    Returns:
+        The daemon thread serving the store
+    """
+    if os.path.exists(address):
+        os.unlink(address)
+    manager = SharedStateManager(address=address, authkey=authkey.encode())
+    server = manager.get_server()
+    thread = threading.Thread(target=server.serve_forever, name='shared-state', daemon=True)
+    thread.start()
+    return thread
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_stats_store():
+    """
+    Get the stats store for this process
+
+    Connects to the shared state server when SHARED_STATE_SOCKET is set and
+    reachable, otherwise falls back to an in-process store. The connection
+    is re-established after a fork so each worker owns its own socket.
+
+    Returns:
+        StatsStore or a proxy with the same interface
+    """
+    global _store, _store_pid
+
+    pid = os.getpid()
+    if _store is not None and _store_pid == pid:
+        return _store
+
+    with _store_lock:
+        if _store is not None and _store_pid == pid:
+            return _store
+
+        address = os.getenv('SHARED_STATE_SOCKET', '')
+        authkey = os.getenv('SHARED_STATE_AUTHKEY', '')
+        store = None
+        if address and os.path.exists(address):
+            try:
+                manager = SharedStateManager(address=address, authkey=authkey.encode())
+                manager.connect()
+                store = manager.get_store()
+            except Exception as e:
+                print(f"✗ Failed to connect to shared state at {address}: {e}")
+
+        _store = store if store is not None else StatsStore()
+        _store_pid = pid
+        return _store
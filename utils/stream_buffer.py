@@ -0,0 +1,235 @@
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class BufferedStream:
+    """
+    Drain an upstream chunk iterator on its own thread
+
+    The reader pulls chunks as fast as the provider sends them and queues
+    them for the consumer, which takes them at the client's pace. A slow
+    client therefore no longer holds the upstream connection open (or
+    trips its idle timeout) for longer than the generation takes.
+
+    Up to max_memory_bytes of chunks are held in memory. Beyond that,
+    chunks go to an unlinked temp file in spill_dir if one is set (up to
+    max_spill_bytes); otherwise, or once the spill file is full too, the
+    reader waits for the consumer, which pushes back on the upstream as
+    before. The chunks, and any upstream error after them, reach the
+    consumer in order.
+
+    The upstream iterator runs entirely on the reader thread, so it is
+    closed there too: close() asks the reader to stop at the next chunk.
+    Checks that must stop the upstream itself (such as a spend cap) go in
+    on_chunk, which runs on the reader before each chunk is queued.
+    """
+
+    def __init__(
+        self,
+        source: Iterator[str],
+        max_memory_bytes: int = 1 << 20,
+        spill_dir: Optional[str] = None,
+        max_spill_bytes: int = 64 << 20,
+        on_first_chunk: Optional[Callable[[], None]] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        name: str = 'stream-reader'
+    ):
+        """
+        Start reading
+
+        Args:
+            source: Upstream chunk iterator (a provider's query() generator)
+            max_memory_bytes: Bytes of chunks held in memory
+            spill_dir: Directory for the overflow file; None disables spilling
+            max_spill_bytes: Bytes the overflow file may hold
+            on_first_chunk: Called on the reader thread when the first chunk
+                arrives from upstream
+            on_chunk: Called on the reader thread with each chunk before it
+                is queued; if it raises, the upstream is closed and the
+                error reaches the consumer after the chunks before it
+            name: Reader thread name
+        """
+        self._source = source
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._on_first_chunk = on_first_chunk
+        self._on_chunk = on_chunk
+        # (chunk, size) for chunks in memory, (offset, size) for spilled ones
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._memory_bytes = 0
+        self._spill_bytes = 0
+        self._spill_file = None
+        self._spill_end = 0
+        self._done = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+        self.high_water_bytes = 0
+        self.spilled_bytes = 0
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.upstream_done_at: Optional[float] = None
+        self.consumer_done_at: Optional[float] = None
+
+        self._thread = threading.Thread(target=self._read, name=name, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        """Reader thread: move upstream chunks into the buffer"""
+        first = True
+        try:
+            for chunk in self._source:
+                if first and self._on_first_chunk is not None:
+                    self._on_first_chunk()
+                first = False
+                if self._on_chunk is not None:
+                    try:
+                        self._on_chunk(chunk)
+                    except BaseException:
+                        self._close_source()
+                        raise
+                if not self._put(chunk):
+                    break
+        except BaseException as e:
+            self._error = e
+        finally:
+            if self._closed:
+                self._close_source()
+            with self._cond:
+                self._done = True
+                self.upstream_done_at = time.monotonic()
+                self._cond.notify_all()
+
+    def _put(self, chunk: str) -> bool:
+        """Queue one chunk, waiting while the buffer is full; False once closed"""
+        data = chunk.encode('utf-8')
+        size = len(data)
+        stalled_at = None
+        with self._cond:
+            while not self._closed:
+                # An oversized chunk still goes through when nothing is buffered
+                if self._memory_bytes + size <= self.max_memory_bytes or not self._memory_bytes:
+                    self._items.append((chunk, size))
+                    self._memory_bytes += size
+                    break
+                if self.spill_dir is not None and self._spill_bytes + size <= self.max_spill_bytes:
+                    self._spill(data)
+                    break
+                if stalled_at is None:
+                    stalled_at = time.monotonic()
+                    self.stalls += 1
+                self._cond.wait()
+            if stalled_at is not None:
+                self.stalled_seconds += time.monotonic() - stalled_at
+            if self._closed:
+                return False
+            self.high_water_bytes = max(self.high_water_bytes, self._memory_bytes + self._spill_bytes)
+            self._cond.notify_all()
+            return True
+
+    def _spill(self, data: bytes):
+        """Append a chunk to the overflow file (caller holds the lock)"""
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+        os.pwrite(self._spill_file.fileno(), data, self._spill_end)
+        self._items.append((self._spill_end, len(data)))
+        self._spill_end += len(data)
+        self._spill_bytes += len(data)
+        self.spilled_bytes += len(data)
+
+    def __iter__(self) -> 'BufferedStream':
+        return self
+
+    def __next__(self) -> str:
+        with self._cond:
+            while not self._items and not self._done and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                self._finish()
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                raise StopIteration
+            chunk, size = self._items.popleft()
+            if isinstance(chunk, str):
+                self._memory_bytes -= size
+            else:
+                self._spill_bytes -= size
+                chunk = os.pread(self._spill_file.fileno(), size, chunk).decode('utf-8')
+            self._cond.notify_all()
+            return chunk
+
+    def close(self):
+        """Stop reading upstream and drop anything still buffered"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._items.clear()
+            self._memory_bytes = self._spill_bytes = 0
+            self._finish()
+            self._cond.notify_all()
+
+    def _finish(self):
+        """Release the spill file once the consumer is done (caller holds the lock)"""
+        if self.consumer_done_at is None:
+            self.consumer_done_at = time.monotonic()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _close_source(self):
+        close = getattr(self._source, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Buffer statistics for this stream
+
+        Returns:
+            Dictionary with high_water_bytes, spilled_bytes, stalls (times
+            the reader waited on a full buffer), stalled_seconds and
+            drain_lead (seconds the upstream finished before the consumer)
+        """
+        drain_lead = None
+        if self.upstream_done_at is not None and self.consumer_done_at is not None:
+            drain_lead = max(0.0, self.consumer_done_at - self.upstream_done_at)
+        return {
+            'high_water_bytes': self.high_water_bytes,
+            'spilled_bytes': self.spilled_bytes,
+            'stalls': self.stalls,
+            'stalled_seconds': self.stalled_seconds,
+            'drain_lead': drain_lead
+        }
+
+
+def checked_stream(source: Iterator[str], on_chunk: Callable[[str], None]) -> Iterator[str]:
+    """
+    Run on_chunk on each chunk of an unbuffered stream, like BufferedStream does
+
+    Args:
+        source: Upstream chunk iterator
+        on_chunk: Called with each chunk before it is passed on; if it
+            raises, the upstream is closed and the error propagates
+
+    Yields:
+        The upstream chunks
+    """
+    try:
+        for chunk in source:
+            on_chunk(chunk)
+            yield chunk
+    finally:
+        close = getattr(source, 'close', None)
+        if callable(close):
+            close()
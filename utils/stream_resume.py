@@ -0,0 +1,86 @@
+from typing import Dict, Any, Iterable, Iterator, List
+
+from utils.token_counter import TokenCounter
+
+CONTINUE_INSTRUCTION = (
+    "Your previous answer was cut off. Continue it exactly where it stopped, "
+    "without repeating any text already written and without any preamble."
+)
+
+
+def build_continuation(
+    messages: List[Dict[str, Any]],
+    partial: str,
+    assistant_prefill: bool
+) -> List[Dict[str, Any]]:
+    """
+    Build messages that make a provider continue a partial answer
+
+    Args:
+        messages: Messages of the original request (ending with the user turn)
+        partial: Answer text already delivered to the client
+        assistant_prefill: Provider continues a trailing assistant message
+            (Anthropic); otherwise an explicit continuation instruction is added
+
+    Returns:
+        New message list (the input list is not modified)
+    """
+    def message(role: str, content: str) -> Dict[str, Any]:
+        return {'role': role, 'content': content, 'tokens': TokenCounter.estimate_tokens(content, 'openai')}
+
+    continued = list(messages)
+    if assistant_prefill:
+        # A prefilled assistant turn may not end with whitespace
+        continued.append(message('assistant', partial.rstrip()))
+    else:
+        continued.append(message('assistant', partial))
+        continued.append(message('user', CONTINUE_INSTRUCTION))
+    return continued
+
+
+def trim_repeated_prefix(
+    chunks: Iterable[str],
+    partial: str,
+    window: int = 200,
+    min_overlap: int = 8
+) -> Iterator[str]:
+    """
+    Drop text at the start of a continuation that repeats the partial answer
+
+    Models asked to continue sometimes restate the last words they were
+    given. The first `window` characters are buffered and the longest
+    overlap between the end of `partial` and the start of the continuation
+    is removed; after that, chunks pass through unchanged.
+
+    Args:
+        chunks: Continuation chunks from the provider
+        partial: Answer text already delivered to the client
+        window: Maximum overlap to look for, in characters
+        min_overlap: Shorter overlaps are treated as coincidence
+
+    Yields:
+        Continuation chunks without the repeated text
+    """
+    buffered = ''
+    iterator = iter(chunks)
+    for chunk in iterator:
+        buffered += chunk
+        if len(buffered) >= window:
+            break
+
+    tail = partial[-window:]
+    overlap = 0
+    for size in range(min(len(tail), len(buffered)), min_overlap - 1, -1):
+        if tail.endswith(buffered[:size]):
+            overlap = size
+            break
+    buffered = buffered[overlap:]
+
+    # A prefilled turn was sent without its trailing whitespace; the model
+    # usually starts by re-adding it
+    if partial != partial.rstrip() and buffered[:1].isspace():
+        buffered = buffered.lstrip()
+
+    if buffered:
+        yield buffered
+    yield from iterator
@@ -1,6 +1,20 @@
 class TokenCounter:
     """Utility for counting tokens across different providers"""
     
+    # Context limits for various models
+    CONTEXT_LIMITS = {
+        'gpt-3.5-turbo': 4096,
+        'gpt-3.5-turbo-16k': 16384,
+        'gpt-4': 8192,
+        'gpt-4-turbo-preview': 128000,
+        'claude-3-opus-20240229': 200000,
+        'claude-3-sonnet-20240229': 200000,
+        'claude-3-haiku-20240307': 200000,
+        'gemini-1.5-pro': 1000000,
+        'gemini-1.5-flash': 1000000,
+        'gemini-pro': 32768,
+    }
+    
     @staticmethod
     def estimate_tokens(text: str, provider: str = 'generic') -> int:
         """
@@ -41,37 +55,21 @@ class TokenCounter:
         Returns:
             True if within limit, False otherwise
         """
-        # Context limits for various models
-        CONTEXT_LIMITS = {
-            'gpt-3.5-turbo': 4096,
-            'gpt-3.5-turbo-16k': 16384,
-            'gpt-4': 8192,
-            'gpt-4-turbo-preview': 128000,
-            'claude-3-opus-20240229': 200000,
-            'claude-3-sonnet-20240229': 200000,
-            'claude-3-haiku-20240307': 200000,
-            'gemini-1.5-pro': 1000000,
-            'gemini-1.5-flash': 1000000,
-            'gemini-pro': 32768,
-        }
-        
-        limit = CONTEXT_LIMITS.get(model, 4096)
+        limit = TokenCounter.CONTEXT_LIMITS.get(model, 4096)
         return token_count <= limit
     
     @staticmethod
     def get_context_limit(model: str) -> int:
         """Get context limit for a model"""
-        CONTEXT_LIMITS = {
-            'gpt-3.5-turbo': 4096,
-            'gpt-3.5-turbo-16k': 16384,
-            'gpt-4': 8192,
-            'gpt-4-turbo-preview': 128000,
-            'claude-3-opus-20240229': 200000,
-            'claude-3-sonnet-20240229': 200000,
-            'claude-3-haiku-20240307': 200000,
-            'gemini-1.5-pro': 1000000,
-            'gemini-1.5-flash': 1000000,
-            'gemini-pro': 32768,
-        }
+        return TokenCounter.CONTEXT_LIMITS.get(model, 4096)
+    
+    @staticmethod
+    def register_context_limit(model: str, limit: int):
+        """
+        Register the context limit of a model configured at runtime
         
-        return CONTEXT_LIMITS.get(model, 4096)
+        Args:
+            model: Model name
+            limit: Context window size in tokens
+        """
+        TokenCounter.CONTEXT_LIMITS[model] = limit
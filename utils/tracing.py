@@ -0,0 +1,375 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+SERVICE_NAME = 'llm-router'
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed phase of a request
+
+    Durations come from the monotonic perf_counter clock; the trace maps
+    them to wall-clock timestamps once, when it starts.
+    """
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        """Set an attribute"""
+        self.attributes[key] = value
+
+    def fail(self, error: Any):
+        """Mark the span (and so the trace) as failed"""
+        self.error = str(error)
+        self.trace.error = True
+
+    def end(self):
+        """End the span; later calls are ignored"""
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and exc_type is not GeneratorExit:
+            self.fail(exc)
+        self.end()
+        return False
+
+
+class Trace:
+    """Spans of one request, exported when the request ends if sampled
+
+    The root span covers the whole request. Child spans name their parent
+    explicitly rather than through a context stack, because the router's
+    generators interleave their phases with the caller's.
+    """
+
+    def __init__(self, tracer: 'Tracer', name: str, trace_id: str, parent_id: Optional[str],
+                 sampled: bool, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.error = False
+        self._anchor_unix_ns = time.time_ns()
+        self._anchor_perf_ns = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self.root = self.start_span(name, parent=None, **attributes)
+        self.root.parent_id = parent_id
+        self._ended = False
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """
+        Start a span; end it with span.end() or use it as a context manager
+
+        Args:
+            name: Phase name
+            parent: Parent span (defaults to the root span)
+            **attributes: Span attributes
+
+        Returns:
+            Started span
+        """
+        if parent is None and self.spans:
+            parent = self.root
+        span = Span(self, name, parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    span = start_span
+
+    def set(self, key: str, value: Any):
+        """Set an attribute on the root span"""
+        self.root.attributes[key] = value
+
+    def end(self):
+        """End the request and hand the trace to the tracer's sampler"""
+        if self._ended:
+            return
+        self._ended = True
+        self.root.end()
+        self.tracer.finish(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end_ns or time.perf_counter_ns()
+        return (end - self.root.start_ns) / 1e6
+
+    def _unix_ns(self, perf_ns: int) -> int:
+        return self._anchor_unix_ns + (perf_ns - self._anchor_perf_ns)
+
+    def to_otlp_spans(self) -> List[Dict[str, Any]]:
+        """Spans in OTLP/JSON form"""
+        spans = []
+        for span in self.spans:
+            end_ns = span.end_ns if span.end_ns is not None else self.root.end_ns
+            encoded = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 2 if span is self.root else 1,
+                'startTimeUnixNano': str(self._unix_ns(span.start_ns)),
+                'endTimeUnixNano': str(self._unix_ns(end_ns)),
+                'attributes': [_otlp_attribute(k, v) for k, v in span.attributes.items() if v is not None],
+                'status': {'code': STATUS_ERROR, 'message': span.error} if span.error else {'code': STATUS_UNSET}
+            }
+            if span.parent_id:
+                encoded['parentSpanId'] = span.parent_id
+            spans.append(encoded)
+        return spans
+
+
+class NoopSpan:
+    """Stand-in span when tracing is off"""
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NoopTrace:
+    """Stand-in trace when tracing is off; every call does nothing"""
+
+    trace_id = None
+    sampled = False
+    _span = NoopSpan()
+    root = _span
+
+    def start_span(self, name, parent=None, **attributes):
+        return self._span
+
+    span = start_span
+
+    def set(self, key, value):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_TRACE = NoopTrace()
+
+
+class PhaseRecorder:
+    """
+    Back-to-back child spans of one span
+
+    Each mark() ends the running phase and starts the next, so code that
+    only knows where a phase begins (a provider generator, say) can still
+    split its parent's time without gaps. Marks may come from a stream's
+    reader thread as well as the request thread.
+    """
+
+    def __init__(self, trace, parent):
+        self.trace = trace
+        self.parent = parent
+        self.current = None
+        self._lock = threading.Lock()
+
+    def mark(self, name: str):
+        """End the running phase and start one called name"""
+        with self._lock:
+            if self.current is not None:
+                self.current.end()
+            self.current = self.trace.start_span(name, parent=self.parent)
+
+    def close(self):
+        """End the running phase"""
+        with self._lock:
+            if self.current is not None:
+                self.current.end()
+                self.current = None
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """(trace id, parent span id, sampled) from a W3C traceparent header"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Tracer:
+    """Per-request phase tracing with head and tail sampling
+
+    Head sampling keeps sample_rate of traces (or follows the caller's
+    traceparent sampled flag). Tail sampling also keeps any trace that
+    failed or took longer than tail_latency_ms. Spans are always recorded,
+    which costs a clock read and a small object per phase, so the tail
+    decision can be made once the request ends. Kept traces are exported as
+    OTLP/JSON by a background thread: appended to export_file (one
+    ExportTraceServiceRequest per line, readable by the collector's
+    otlpjsonfile receiver) and/or POSTed to an OTLP/HTTP endpoint.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        tail_latency_ms: float = 0.0,
+        tail_errors: bool = True,
+        export_file: str = '',
+        otlp_endpoint: str = '',
+        batch_size: int = 64,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000
+    ):
+        """
+        Initialize tracer
+
+        Args:
+            sample_rate: Fraction of traces kept regardless of outcome
+            tail_latency_ms: Also keep traces slower than this (0 disables)
+            tail_errors: Also keep traces with a failed span
+            export_file: JSON lines file to append traces to
+            otlp_endpoint: OTLP/HTTP traces URL (e.g. http://localhost:4318/v1/traces)
+            batch_size: Traces per export batch
+            flush_interval: Seconds to wait for a full batch
+            max_queue: Traces buffered before new ones are dropped
+        """
+        self.sample_rate = sample_rate
+        self.tail_latency_ms = tail_latency_ms
+        self.tail_errors = tail_errors
+        self.export_file = export_file
+        self.otlp_endpoint = otlp_endpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = bool(export_file or otlp_endpoint) and (sample_rate > 0 or tail_latency_ms > 0 or tail_errors)
+        self.exported = 0
+        self.dropped = 0
+        self._queue: 'queue.Queue[Trace]' = queue.Queue(maxsize=max_queue)
+        self._exporter_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def start(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """
+        Start a request trace
+
+        Args:
+            name: Root span name
+            traceparent: Optional W3C traceparent header from the caller
+            **attributes: Root span attributes
+
+        Returns:
+            Trace, or NOOP_TRACE when tracing is off
+        """
+        if not self.enabled:
+            return NOOP_TRACE
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < self.sample_rate
+        return Trace(self, name, trace_id, parent_id, sampled, attributes)
+
+    def finish(self, trace: Trace):
+        """Apply the tail sampling decision and queue a kept trace for export"""
+        keep = (trace.sampled
+                or (self.tail_errors and trace.error)
+                or (self.tail_latency_ms > 0 and trace.duration_ms >= self.tail_latency_ms))
+        if not keep:
+            return
+        if self._exporter_pid != os.getpid():
+            self._start_exporter()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_exporter(self):
+        """Start the export thread once per process (threads do not survive a fork)"""
+        with self._lock:
+            if self._exporter_pid == os.getpid():
+                return
+            self._exporter_pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def _run(self):
+        session = requests.Session()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._export(session, batch)
+                self.exported += len(batch)
+            except Exception as e:
+                print(f"✗ Trace export failed ({len(batch)} traces lost): {e}")
+
+    def _export(self, session: requests.Session, batch: List[Trace]):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    _otlp_attribute('service.name', SERVICE_NAME),
+                    _otlp_attribute('process.pid', os.getpid())
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': 'llm_router'},
+                    'spans': [span for trace in batch for span in trace.to_otlp_spans()]
+                }]
+            }]
+        }
+        if self.export_file:
+            with open(self.export_file, 'a') as f:
+                f.write(json.dumps(payload) + '\n')
+        if self.otlp_endpoint:
+            response = session.post(self.otlp_endpoint, json=payload, timeout=10)
+            response.raise_for_status()
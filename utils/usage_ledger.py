@@ -0,0 +1,344 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+# Rollup granularities and their bucket length in seconds
+GRANULARITIES = {'minute': 60, 'hour': 3600}
+
+# Columns a usage query may group by
+GROUP_COLUMNS = ('tenant', 'provider', 'model')
+
+# Rollup rows summed over all tenants, so queries that do not break usage
+# down by tenant read one row per bucket and model
+ALL_TENANTS = '*'
+
+# Rollup counter each non-ok request status is counted in: provider failures
+# are errors, requests refused by a budget or the queue are rejections
+STATUS_COUNTERS = {
+    'error': 'errors',
+    'cancelled': 'cancelled',
+    'budget_exceeded': 'rejected',
+    'queued': 'rejected'
+}
+COUNTER_COLUMNS = ('errors', 'cancelled', 'rejected')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_events (
+    ts REAL NOT NULL,
+    tenant TEXT NOT NULL,
+    priority TEXT,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    cache_write_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    ttft REAL,
+    latency REAL NOT NULL,
+    fallback_depth INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_events_ts ON usage_events (ts);
+CREATE TABLE IF NOT EXISTS usage_rollup (
+    granularity TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    tenant TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    ttft_sum REAL NOT NULL,
+    ttft_count INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    PRIMARY KEY (granularity, tenant, bucket_start, provider, model)
+) WITHOUT ROWID;
+"""
+
+EVENT_COLUMNS = (
+    'ts', 'tenant', 'priority', 'provider', 'model', 'status',
+    'input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens',
+    'cost', 'ttft', 'latency', 'fallback_depth'
+)
+NULLABLE_COLUMNS = ('priority', 'ttft')
+
+ROLLUP_UPSERT = """
+INSERT INTO usage_rollup
+    (granularity, bucket_start, tenant, provider, model, requests, errors, cancelled, rejected,
+     input_tokens, output_tokens, cost, ttft_sum, ttft_count, latency_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (granularity, tenant, bucket_start, provider, model) DO UPDATE SET
+    requests = requests + excluded.requests,
+    errors = errors + excluded.errors,
+    cancelled = cancelled + excluded.cancelled,
+    rejected = rejected + excluded.rejected,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    cost = cost + excluded.cost,
+    ttft_sum = ttft_sum + excluded.ttft_sum,
+    ttft_count = ttft_count + excluded.ttft_count,
+    latency_sum = latency_sum + excluded.latency_sum
+"""
+
+
+class UsageLedger:
+    """Durable per-request usage records with minute and hour rollups
+
+    record() only puts the entry on an in-memory queue, so the request path
+    never waits for the disk. A background thread writes queued entries to
+    SQLite (WAL mode) in batches, one transaction per batch, and updates
+    the rollup tables in the same transaction. Range queries read the
+    rollups, which hold one row per bucket and tenant/provider/model
+    (plus all-tenant rows), however many requests the bucket contains.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+        retention_days: int = 30,
+        minute_retention_days: int = 7
+    ):
+        """
+        Initialize ledger
+
+        Args:
+            path: SQLite database file
+            batch_size: Maximum entries written per transaction
+            flush_interval: Seconds to wait for more entries before writing
+            max_queue: Entries buffered before new ones are dropped
+            retention_days: Days raw events and hourly rollups are kept
+            minute_retention_days: Days minute rollups are kept
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.minute_retention_days = minute_retention_days
+        self.dropped = 0
+        self.written = 0
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=max_queue)
+        self._writer_pid: Optional[int] = None
+        self._writer_lock = threading.Lock()
+        self._last_prune = 0.0
+        self._readers = threading.local()
+        self._schema_pid: Optional[int] = None
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _create_schema(self):
+        """Create the tables (once per process), adding columns older files lack"""
+        with self._schema_lock:
+            if self._schema_pid == os.getpid():
+                return
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+                existing = {row[1] for row in conn.execute('PRAGMA table_info(usage_rollup)')}
+                for column in COUNTER_COLUMNS:
+                    if column in existing:
+                        continue
+                    try:
+                        conn.execute(f"ALTER TABLE usage_rollup ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+                    except sqlite3.OperationalError as e:
+                        # Another worker added it first
+                        if 'duplicate column' not in str(e):
+                            raise
+            finally:
+                conn.close()
+            self._schema_pid = os.getpid()
+
+    def _reader(self) -> sqlite3.Connection:
+        """Read-only connection reused by the calling thread"""
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None or self._readers.pid != os.getpid():
+            # The file may predate the schema (or this version of it)
+            self._create_schema()
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+            self._readers.conn = conn
+            self._readers.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """
+        Create the schema and start the writer thread
+
+        Safe to call repeatedly; the thread is (re)started once per process,
+        since threads started before a fork do not run in the workers.
+        """
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            # Entries queued in the parent before the fork belong to the parent
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+
+        self._create_schema()
+        threading.Thread(target=self._run, name='usage-ledger', daemon=True).start()
+
+    def record(self, entry: Dict[str, Any]):
+        """
+        Queue one request's usage without blocking
+
+        Args:
+            entry: Values for EVENT_COLUMNS; missing numbers default to 0
+        """
+        if self._writer_pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+                self.written += len(batch)
+                if time.time() - self._last_prune > 3600:
+                    self._prune(conn)
+            except sqlite3.Error as e:
+                print(f"✗ Usage ledger write failed ({len(batch)} entries lost): {e}")
+
+    def _write(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]]):
+        """Insert a batch of events and fold it into the rollups, atomically"""
+        rows = []
+        rollups: Dict[tuple, List[float]] = {}
+        for entry in batch:
+            rows.append(tuple(
+                entry.get(column) if column in NULLABLE_COLUMNS else entry.get(column, 0)
+                for column in EVENT_COLUMNS
+            ))
+            ttft = entry.get('ttft')
+            counter = STATUS_COUNTERS.get(entry['status'])
+            for granularity, seconds in GRANULARITIES.items():
+                bucket_start = int(entry['ts'] // seconds * seconds)
+                for tenant in (entry['tenant'], ALL_TENANTS):
+                    key = (granularity, bucket_start, tenant, entry['provider'], entry['model'])
+                    totals = rollups.setdefault(key, [0, 0, 0, 0, 0, 0, 0.0, 0.0, 0, 0.0])
+                    totals[0] += 1
+                    if counter is not None:
+                        totals[1 + COUNTER_COLUMNS.index(counter)] += 1
+                    totals[4] += (entry.get('input_tokens', 0) + entry.get('cache_read_tokens', 0)
+                                  + entry.get('cache_write_tokens', 0))
+                    totals[5] += entry.get('output_tokens', 0)
+                    totals[6] += entry.get('cost', 0.0)
+                    if ttft is not None:
+                        totals[7] += ttft
+                        totals[8] += 1
+                    totals[9] += entry.get('latency', 0.0)
+
+        placeholders = ', '.join('?' for _ in EVENT_COLUMNS)
+        with conn:
+            conn.executemany(f"INSERT INTO usage_events VALUES ({placeholders})", rows)
+            conn.executemany(ROLLUP_UPSERT, [key + tuple(totals) for key, totals in rollups.items()])
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Delete raw events and rollups past their retention"""
+        now = time.time()
+        self._last_prune = now
+        with conn:
+            conn.execute('DELETE FROM usage_events WHERE ts < ?', (now - self.retention_days * 86400,))
+            conn.execute("DELETE FROM usage_rollup WHERE granularity = 'hour' AND bucket_start < ?",
+                         (now - self.retention_days * 86400,))
+            conn.execute("DELETE FROM usage_rollup WHERE granularity = 'minute' AND bucket_start < ?",
+                         (now - self.minute_retention_days * 86400,))
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        granularity: str = 'hour',
+        group_by: Sequence[str] = ('model',),
+        tenant: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregate usage over a time range from the rollups
+
+        Args:
+            start: Range start (unix seconds)
+            end: Range end (unix seconds)
+            granularity: 'minute' or 'hour'
+            group_by: Columns from GROUP_COLUMNS to break totals down by
+            tenant: Optional tenant filter
+
+        Returns:
+            One dict per bucket and group, ordered by bucket. errors counts
+            requests every provider failed; cancelled and rejected (budget
+            or queue) requests are counted separately
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        unknown = [column for column in group_by if column not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"cannot group by {', '.join(unknown)}")
+
+        seconds = GRANULARITIES[granularity]
+        columns = ''.join(f", {column}" for column in group_by)
+        sql = (
+            f"SELECT bucket_start{columns}, SUM(requests), SUM(errors), SUM(cancelled), SUM(rejected), "
+            f"SUM(input_tokens), "
+            f"SUM(output_tokens), SUM(cost), SUM(ttft_sum), SUM(ttft_count), SUM(latency_sum) "
+            f"FROM usage_rollup WHERE granularity = ? AND bucket_start >= ? AND bucket_start <= ?"
+        )
+        params: List[Any] = [granularity, int(start // seconds * seconds), int(end)]
+        if tenant is not None:
+            sql += " AND tenant = ?"
+            params.append(tenant)
+        elif 'tenant' in group_by:
+            sql += " AND tenant != ?"
+            params.append(ALL_TENANTS)
+        else:
+            sql += " AND tenant = ?"
+            params.append(ALL_TENANTS)
+        sql += f" GROUP BY bucket_start{columns} ORDER BY bucket_start"
+
+        if not os.path.exists(self.path):
+            return []
+        rows = self._reader().execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            groups = dict(zip(group_by, row[1:1 + len(group_by)]))
+            (requests, errors, cancelled, rejected, input_tokens, output_tokens,
+             cost, ttft_sum, ttft_count, latency_sum) = row[1 + len(group_by):]
+            results.append({
+                'bucket_start': row[0],
+                **groups,
+                'requests': requests,
+                'errors': errors,
+                'cancelled': cancelled,
+                'rejected': rejected,
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'cost': round(cost, 6),
+                'avg_ttft': round(ttft_sum / ttft_count, 3) if ttft_count else None,
+                'avg_latency': round(latency_sum / requests, 3) if requests else None
+            })
+        return results